@@ -0,0 +1,106 @@
+"""
+Сравнение стоимости выбора хэндлера для одного сообщения: старая цепочка
+regex-хэндлеров группы 2 против CommandRouter.
+
+    python benchmarks/bench_command_router.py [--repeat 20000]
+
+Хэндлеры-заглушки: меряется только диспетчеризация (check_update), без вызова команд.
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import MessageHandler, filters
+
+from core.command_router import CommandRouter
+
+# Цепочка в порядке регистрации до роутера: (regex, с фильтром TEXT)
+OLD_CHAIN = [
+    (r"^!group", True), (r"^!prefix", True), (r"^!help", True), (r"^!rules", True),
+    (r"^!del-rules", True), (r"^!status", True), (r"^!debug-all", True),
+    (r"^!roulette", True), (r"^!join", True), (r"^!startgame", True), (r"^!endgame", True),
+    (r"^!shootme", True), (r"^!shoot", True), (r"^!export_db(?:\s|$).+", True),
+    (r"^!new-role", True), (r"^!grant\b", True), (r"^!view-admins", True),
+    (r"^!edit-admin\b", False), (r"^!remove-role", True), (r"^!ban\b", True), (r"^!revoke\b", True),
+    (r"^!set-whale-admin", False), (r"^!del-whale-admin", False), (r"^!whale-set", False),
+    (r"^!whale-admins", False), (r"^!whale-name", False), (r"^!whale\b", False),
+    (r"^!feed", False), (r"^!leaders", False), (r"^!profile", False), (r"^!info-whale", False),
+    (r"^!mute-set\b", False),
+]
+
+SAMPLES = {
+    "обычный текст": "привет всем, как дела? кто идёт сегодня вечером",
+    "первая команда": "!group",
+    "средняя команда": "!ban @someone Оскорбления 7d",
+    "последняя команда": "!mute-set chance 5",
+    "неизвестная команда": "!bna @someone",
+}
+
+
+async def _noop(update, context):
+    pass
+
+
+def build_old_chain() -> list:
+    chain = []
+    for pattern, text_only in OLD_CHAIN:
+        flt = filters.TEXT & filters.Regex(pattern) if text_only else filters.Regex(pattern)
+        chain.append(MessageHandler(flt, _noop))
+    return chain
+
+
+def build_router() -> CommandRouter:
+    router = CommandRouter()
+    for pattern, _ in OLD_CHAIN:
+        command = pattern[2:].split("(")[0].replace("\\b", "")
+        router.add(command, _noop, needs_args=command == "export_db")
+    return router
+
+
+def make_update(text: str) -> Update:
+    chat = Chat(-100123, Chat.SUPERGROUP, title="bench")
+    user = User(42, "Bench", False)
+    message = Message(1, datetime.datetime.now(datetime.timezone.utc), chat, from_user=user, text=text)
+    return Update(1, message=message)
+
+
+def dispatch_chain(chain: list, update: Update):
+    # Как Application.process_update внутри одной группы: первый подошедший хэндлер
+    for handler in chain:
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return handler
+    return None
+
+
+def measure(func, repeat: int) -> float:
+    """Наносекунд на вызов."""
+    started = time.perf_counter_ns()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter_ns() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    chain = build_old_chain()
+    router = build_router()
+
+    print(f"{'сообщение':<22}{'цепочка, нс':>14}{'роутер, нс':>14}{'ускорение':>12}")
+    for name, text in SAMPLES.items():
+        update = make_update(text)
+        old = measure(lambda: dispatch_chain(chain, update), args.repeat)
+        new = measure(lambda: router.check_update(update), args.repeat)
+        print(f"{name:<22}{old:>14.0f}{new:>14.0f}{old / new:>11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Разбор сроков: старые парсеры (!ban и кулдаун кита) против utils/durations.py.
+
+    python benchmarks/bench_durations.py [--repeat 20000] [--cases 20000] [--seed 1]
+    python benchmarks/bench_durations.py --fuzz      # только проверки, без замеров
+
+Перед замерами всегда идут проверки: фиксированные случаи (число без единицы,
+лимиты !ban MAX_BAN_MONTHS / MAX_BAN_SECONDS, кулдаун кита по умолчанию) и fuzz —
+случайные строки: новый разбор не падает с чем-либо кроме ValueError и на корректных
+сроках совпадает со старыми парсерами. Любое расхождение — код выхода 1.
+"""
+import argparse
+import datetime
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.durations import (
+    UNITS, tokenize, to_seconds, parse_duration, find_duration, format_tokens, compact_tokens, format_seconds, plural
+)
+from handlers.admin.ban_user import extract_reason_and_duration, MAX_BAN_MONTHS, MAX_BAN_SECONDS
+from handlers.funny.feed_the_pet import get_cooldown, DEFAULT_COOLDOWN
+
+
+# ====== Старые реализации (до utils/durations.py), для сравнения ======
+def legacy_parse_ban(duration_str: str) -> datetime.timedelta:
+    cleaned = duration_str.lower().replace(" ", "")
+    matches = re.compile(r'(\d+(?:r|mo|d|h|m|s))').findall(cleaned)
+    if not matches:
+        raise ValueError("Неверный формат срока бана")
+    total = datetime.timedelta()
+    for item in matches:
+        m = re.match(r'^(\d+)(r|mo|d|h|m|s)$', item)
+        amount, unit = int(m.group(1)), m.group(2)
+        if unit == 'mo' and amount > 12:
+            raise ValueError("Неверное число месяцев (максимум 12)")
+        if unit == 's' and amount >= 60:
+            raise ValueError("Неверное число секунд (максимум 59)")
+        total += datetime.timedelta(seconds=amount * UNITS[unit][0])
+    return total
+
+
+def legacy_format_ban(formatted: str) -> str:
+    mapping = {
+        'r': lambda n: f"{n} " + ("год" if n == 1 else ("года" if 2 <= n <= 4 else "лет")),
+        'mo': lambda n: f"{n} " + ("месяц" if n == 1 else ("месяца" if 2 <= n <= 4 else "месяцев")),
+        'd': lambda n: f"{n} " + ("день" if n == 1 else ("дня" if 2 <= n <= 4 else "дней")),
+        'h': lambda n: f"{n} " + ("час" if n == 1 else ("часа" if 2 <= n <= 4 else "часов")),
+        'm': lambda n: f"{n} " + ("минута" if n == 1 else ("минуты" if 2 <= n <= 4 else "минут")),
+        's': lambda n: f"{n} " + ("секунда" if n == 1 else ("секунды" if 2 <= n <= 4 else "секунд")),
+    }
+    parts = []
+    for token in formatted.split():
+        m = re.match(r'^(\d+)(r|mo|d|h|m|s)$', token)
+        if m:
+            parts.append(mapping[m.group(2)](int(m.group(1))))
+    return ' '.join(parts)
+
+
+def legacy_extract_ban(text: str):
+    matches = list(re.compile(r'(\d+(?:r|mo|d|h|m|s))', re.IGNORECASE).finditer(text.replace('\n', ' ')))
+    if not matches:
+        raise ValueError("Не указан корректный срок бана")
+    units = [m.group(1) for m in matches]
+    reason = text
+    for u in units:
+        reason = reason.replace(u, '')
+    delta = legacy_parse_ban(''.join(units))
+    return reason.strip() or 'Без причины', legacy_format_ban(' '.join(units)), delta
+
+
+def legacy_whale_cooldown(raw: str) -> datetime.timedelta:
+    total_sec = 0
+    for token in raw.split():
+        if token.endswith('h') and token[:-1].isdigit():
+            total_sec += int(token[:-1]) * 3600
+        elif token.endswith('m') and token[:-1].isdigit():
+            total_sec += int(token[:-1]) * 60
+        elif token.endswith('s') and token[:-1].isdigit():
+            total_sec += int(token[:-1])
+        elif token.isdigit():
+            total_sec += int(token) * 3600
+    return datetime.timedelta(seconds=total_sec)
+
+
+def new_extract_ban(text: str):
+    reason, tokens = find_duration(text)
+    if not tokens:
+        raise ValueError("Не указан корректный срок бана")
+    return reason or 'Без причины', format_tokens(tokens), datetime.timedelta(seconds=to_seconds(tokens))
+
+
+# ====== Бенчмарк ======
+def measure(func, arg, repeat: int) -> float:
+    """Микросекунд на вызов."""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(arg)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def run_bench(repeat: int):
+    cases = [
+        ("!ban: причина и срок", legacy_extract_ban, new_extract_ban, "Оскорбления участников 1r2mo 3h30m"),
+        ("!ban: длинная причина", legacy_extract_ban, new_extract_ban, "Флуд и спам в чате, предупреждали трижды " * 4 + "7d"),
+        ("кулдаун кита", legacy_whale_cooldown, lambda raw: parse_duration(raw, "h"), "10h 45m 30s"),
+        ("кулдаун кита без кэша", legacy_whale_cooldown, lambda raw: parse_duration.__wrapped__(raw, "h"), "10h 45m 30s"),
+    ]
+    print(f"{'случай':<26}{'старый, мкс':>14}{'новый, мкс':>14}{'ускорение':>12}")
+    for name, old, new, arg in cases:
+        old_us = measure(old, arg, repeat)
+        new_us = measure(new, arg, repeat)
+        print(f"{name:<26}{old_us:>14.2f}{new_us:>14.2f}{old_us / new_us:>11.1f}x")
+
+
+# ====== Фиксированные случаи ======
+def _raises(func, *args) -> bool:
+    try:
+        func(*args)
+    except ValueError:
+        return True
+    return False
+
+
+def run_cases() -> int:
+    """Поведение, на которое опираются !ban, !mute-set и !whale-set. Возвращает число ошибок."""
+    td = datetime.timedelta
+    cases = [
+        # Число без единицы: только с bare_unit (!mute-set duration — секунды, кулдаун кита — часы)
+        ("'90' с bare_unit='s'", lambda: parse_duration("90", "s") == td(seconds=90)),
+        ("'10' с bare_unit='h'", lambda: parse_duration("10", "h") == td(hours=10)),
+        ("'1h 30' с bare_unit='s'", lambda: parse_duration("1h 30", "s") == td(hours=1, seconds=30)),
+        ("'90' без bare_unit — ошибка", lambda: _raises(parse_duration, "90")),
+        ("'5x' — ошибка", lambda: _raises(parse_duration, "5x", "s")),
+        ("пустая строка — ошибка", lambda: _raises(parse_duration, "  ", "s")),
+        # Лимиты !ban
+        (f"!ban {MAX_BAN_MONTHS}mo допустимо", lambda: extract_reason_and_duration(f"спам {MAX_BAN_MONTHS}mo")[2] == td(days=32 * MAX_BAN_MONTHS)),
+        (f"!ban {MAX_BAN_MONTHS + 1}mo — ошибка", lambda: _raises(extract_reason_and_duration, f"спам {MAX_BAN_MONTHS + 1}mo")),
+        (f"!ban {MAX_BAN_SECONDS}s допустимо", lambda: extract_reason_and_duration(f"спам {MAX_BAN_SECONDS}s")[2] == td(seconds=MAX_BAN_SECONDS)),
+        (f"!ban {MAX_BAN_SECONDS + 1}s — ошибка", lambda: _raises(extract_reason_and_duration, f"спам {MAX_BAN_SECONDS + 1}s")),
+        ("!ban без срока — ошибка", lambda: _raises(extract_reason_and_duration, "просто текст")),
+        ("!ban причина и срок", lambda: extract_reason_and_duration("Флуд 1d2h") == ("Флуд", "1 день 2 часа", td(days=1, hours=2))),
+        ("!ban без причины", lambda: extract_reason_and_duration("7d")[0] == "Без причины"),
+        # Кулдаун кита: число без единицы — часы, мусор — кулдаун по умолчанию
+        ("кулдаун '12'", lambda: get_cooldown({"cooldown": "12"}) == td(hours=12)),
+        ("кулдаун не задан", lambda: get_cooldown({}) == parse_duration(DEFAULT_COOLDOWN)),
+        ("кулдаун с мусором", lambda: get_cooldown({"cooldown": "abc"}) == parse_duration(DEFAULT_COOLDOWN)),
+        # format_seconds
+        ("format_seconds(0)", lambda: format_seconds(0) == "0 секунд"),
+        ("format_seconds(90061)", lambda: format_seconds(90061) == "1 день 1 час 1 минута 1 секунда"),
+    ]
+    failures = 0
+    for name, case in cases:
+        try:
+            ok = case()
+        except Exception as e:
+            ok = False
+            name += f" (упал: {type(e).__name__}: {e})"
+        if not ok:
+            failures += 1
+            print(f"❌ {name}")
+    print(f"{'✅' if not failures else '❌'} случаи: {len(cases)}, ошибок: {failures}")
+    return failures
+
+
+# ====== Fuzz ======
+_PLURAL_CASES = {
+    0: "дней", 1: "день", 2: "дня", 4: "дня", 5: "дней", 11: "дней", 12: "дней", 14: "дней",
+    21: "день", 22: "дня", 25: "дней", 101: "день", 111: "дней", 112: "дней", 1004: "дня",
+}
+_ALPHABET = "0123456789" * 3 + "rmodhs" * 2 + "  " + "xRMDHS.,!-\n"
+
+
+def random_tokens(rnd: random.Random, units) -> list[tuple]:
+    return [(rnd.randint(0, 400), rnd.choice(units)) for _ in range(rnd.randint(1, 4))]
+
+
+def run_fuzz(cases: int, seed: int):
+    rnd = random.Random(seed)
+    failures = 0
+
+    def check(ok: bool, what: str):
+        nonlocal failures
+        if not ok:
+            failures += 1
+            if failures <= 20:
+                print(f"❌ {what}")
+
+    for n, form in _PLURAL_CASES.items():
+        check(plural(n, UNITS["d"][1]) == form, f"plural({n}) -> {plural(n, UNITS['d'][1])}, ждали {form}")
+
+    for _ in range(cases):
+        # 1. Произвольный мусор: только ValueError, и разобранное переживает круг через compact_tokens
+        junk = "".join(rnd.choice(_ALPHABET) for _ in range(rnd.randint(0, 16)))
+        try:
+            tokens = tokenize(junk, bare_unit=rnd.choice([None, "h", "s"]))
+            check(tokenize(compact_tokens(tokens)) == tokens, f"круг через compact_tokens: {junk!r}")
+        except ValueError:
+            pass
+        except Exception as e:
+            check(False, f"tokenize({junk!r}) упал: {type(e).__name__}: {e}")
+        try:
+            find_duration(junk)
+        except Exception as e:
+            check(False, f"find_duration({junk!r}) упал: {type(e).__name__}: {e}")
+
+        # 2. Корректный срок бана совпадает со старым разбором
+        tokens = random_tokens(rnd, list(UNITS))
+        sep = rnd.choice(["", " "])
+        text = sep.join(f"{a}{u.upper() if rnd.random() < 0.2 else u}" for a, u in tokens)
+        try:
+            expected = legacy_parse_ban(text)
+        except ValueError:
+            expected = None
+        if expected is not None:
+            check(parse_duration(text) == expected, f"срок бана {text!r}: {parse_duration(text)} != {expected}")
+
+        # 3. Причина и срок выделяются из текста без потерь
+        words = ["Оскорбления", "флуд", "спам,", "реклама"]
+        reason = " ".join(rnd.sample(words, rnd.randint(0, len(words))))
+        dur = " ".join(f"{a}{u}" for a, u in tokens)
+        got_reason, got_tokens = find_duration(f"{reason} {dur}".strip())
+        check(got_tokens == tokens and got_reason == reason, f"find_duration({reason!r} + {dur!r}) -> {got_reason!r}, {got_tokens}")
+
+        # 4. Кулдаун кита совпадает со старым разбором (h/m/s и числа без единицы — часы)
+        whale = " ".join(f"{a}{u}" for a, u in random_tokens(rnd, ["h", "m", "s", ""]))
+        check(parse_duration(whale, "h") == legacy_whale_cooldown(whale), f"кулдаун {whale!r}")
+
+        # 5. Срок !ban (с лимитами месяцев и секунд) совпадает со старым разбором
+        ban_text = f"Оскорбления {text}"
+        if expected is None:
+            check(_raises(extract_reason_and_duration, ban_text), f"!ban {ban_text!r}: старый разбор отклонял срок")
+        else:
+            check(extract_reason_and_duration(ban_text)[2] == expected, f"!ban {ban_text!r}")
+
+        # 6. format_seconds раскладывает длительность без потерь
+        seconds = rnd.randint(0, 10 ** 7)
+        by_form = {form: UNITS[unit][0] for unit in ("d", "h", "m", "s") for form in UNITS[unit][1]}
+        words = format_seconds(seconds).split()
+        total = sum(int(words[i]) * by_form[words[i + 1]] for i in range(0, len(words), 2))
+        check(total == seconds, f"format_seconds({seconds}) -> {format_seconds(seconds)!r}")
+
+    print(f"{'✅' if not failures else '❌'} fuzz: {cases} случаев, ошибок: {failures}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    parser.add_argument("--fuzz", action="store_true", help="только проверки, без замеров")
+    parser.add_argument("--cases", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    failures = run_cases() + run_fuzz(args.cases, args.seed)
+    if failures:
+        sys.exit(1)
+    if not args.fuzz:
+        run_bench(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
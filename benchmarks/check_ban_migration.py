@@ -0,0 +1,62 @@
+"""
+Перенос сроков банов в pending_unbans (handlers/admin/ban_scheduler.py, init_unban_db).
+
+    python benchmarks/check_ban_migration.py
+
+Во временном каталоге баз (BOT_DB_DIR) создаётся таблица bans со сроками в прошлом,
+в будущем и с мусором, затем выполняется init_unban_db. В очередь разбанов должны попасть
+только будущие сроки: истёкшие не разбаниваются пачкой при первом запуске (участника
+могли забанить вручную, пока старый таймер в памяти был потерян). Любое расхождение — код выхода 1.
+"""
+import datetime
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    with tempfile.TemporaryDirectory(prefix="check_ban_migration_") as tmp:
+        # До импорта utils.db: каталог баз читается при импорте
+        os.environ["BOT_DB_DIR"] = tmp
+        from utils.db import BANS_DB, execute, fetchall, close_all
+        from handlers.admin.ban_user import init_bans_db
+        from handlers.admin.ban_scheduler import init_unban_db
+
+        gmt2 = datetime.timezone(datetime.timedelta(hours=2))
+        now = datetime.datetime.now(gmt2)
+        bans = {
+            1: (now - datetime.timedelta(days=400)).isoformat(),   # давно истёк
+            2: (now - datetime.timedelta(seconds=5)).isoformat(),  # только что истёк
+            3: (now + datetime.timedelta(hours=3)).isoformat(),    # ещё действует
+            4: (now + datetime.timedelta(days=30)).isoformat(),    # ещё действует
+            5: "не дата",
+        }
+        init_bans_db()
+        for user_id, unban_time in bans.items():
+            execute(BANS_DB, "INSERT INTO bans (chat_id, banned_user_id, unban_time) VALUES (?, ?, ?)",
+                    (-100, user_id, unban_time))
+
+        init_unban_db()
+        # Повторный запуск ничего не переносит заново
+        init_unban_db()
+        rows = fetchall(BANS_DB, "SELECT user_id, unban_at FROM pending_unbans ORDER BY user_id")
+        close_all()
+
+    failures = 0
+    got = [user_id for user_id, _ in rows]
+    if got != [3, 4]:
+        failures += 1
+        print(f"❌ в очереди разбанов {got}, ждали [3, 4] (только неистёкшие сроки)")
+    if any(unban_at <= time.time() for _, unban_at in rows):
+        failures += 1
+        print("❌ в очереди есть уже истёкший срок")
+    print(f"{'✅' if not failures else '❌'} перенос сроков банов: ошибок {failures}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
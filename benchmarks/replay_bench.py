@@ -0,0 +1,401 @@
+"""
+Прогон потока апдейтов через настоящий Application (все хэндлеры из core/setup_handlers.py)
+с поддельным Bot API в процессе: канонические ответы и имитация задержки сети.
+
+    python benchmarks/replay_bench.py                         # синтетический поток, сравнение с базовой линией
+    python benchmarks/replay_bench.py --updates 5000 --latency 50
+    python benchmarks/replay_bench.py --mix chatter=50,ban=10,feed=20,roulette=10,panel=10
+    python benchmarks/replay_bench.py --record updates.jsonl  # записанный поток: по Update JSON на строку
+    python benchmarks/replay_bench.py --save-stream s.jsonl   # сохранить синтетический поток
+    python benchmarks/replay_bench.py --save-baseline         # записать результат как базовую линию
+
+Отчёт: апдейтов в секунду, время хэндлеров (p50/p95, как в !perf), пиковый RSS.
+При сравнении с базовой линией (benchmarks/replay_baseline.json) ухудшение больше
+--tolerance считается регрессией — код выхода 1. Сравниваются только прогоны с теми же
+параметрами, что у базовой линии (поток, число апдейтов, чаты, задержка...), иначе — код
+выхода 2. Базовая линия записывается с параметрами по умолчанию и зависит от машины:
+после смены железа её нужно записать заново.
+
+Базы создаются во временном каталоге (BOT_DB_DIR), рабочие файлы бота не трогаются.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_FILE = os.path.join(ROOT, "benchmarks", "replay_baseline.json")
+DEFAULT_MIX = "chatter=70,ban=5,feed=10,roulette=10,panel=5"
+
+FAKE_TOKEN = "123456:replay-bench"
+BOT_ID = 123456
+OWNER_ID = 1000          # владелец всех групп (может банить)
+FIRST_USER_ID = 1001
+
+# Рост p95 хэндлера меньше этого (в мс) не считается регрессией — шум таймеров
+P95_NOISE_MS = 5.0
+
+CHATTER = [
+    "привет всем", "кто сегодня вечером?", "ахаха", "ну да", "скинь ссылку",
+    "а что за бот тут", "лол", "согласен", "завтра в 8", "🔥🔥🔥",
+]
+
+
+# ====== Синтетический поток ======
+class StreamBuilder:
+    """Update JSON в формате Bot API — такой же поток можно записать с webhook."""
+
+    def __init__(self, chats: int, users: int, seed: int):
+        self.rnd = random.Random(seed)
+        self.chats = [-1001000000000 - i for i in range(chats)]
+        self.users = list(range(FIRST_USER_ID, FIRST_USER_ID + users))
+        self.update_id = 0
+        self.message_id = 0
+        self.whales = set()
+        self.updates = []
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    def _chat(self, chat_id: int) -> dict:
+        return {"id": chat_id, "type": "supergroup", "title": f"Group {chat_id}"}
+
+    def message(self, chat_id: int, user_id: int, text: str):
+        self.update_id += 1
+        self.message_id += 1
+        self.updates.append({
+            "update_id": self.update_id,
+            "message": {
+                "message_id": self.message_id, "date": int(time.time()),
+                "chat": self._chat(chat_id), "from": self._user(user_id), "text": text,
+            },
+        })
+
+    def callback(self, chat_id: int, user_id: int, data: str, message_id: int):
+        self.update_id += 1
+        self.updates.append({
+            "update_id": self.update_id,
+            "callback_query": {
+                "id": str(self.update_id), "chat_instance": str(chat_id), "data": data,
+                "from": self._user(user_id),
+                "message": {
+                    "message_id": message_id, "date": int(time.time()),
+                    "chat": self._chat(chat_id), "from": {"id": BOT_ID, "is_bot": True, "first_name": "bot"},
+                    "text": "panel",
+                },
+            },
+        })
+
+    # --- Сценарии ---
+    def chatter(self, chat_id: int):
+        self.message(chat_id, self.rnd.choice(self.users), self.rnd.choice(CHATTER))
+
+    def ban(self, chat_id: int):
+        target = self.rnd.choice(self.users)
+        self.message(chat_id, OWNER_ID, f"!ban {target} Спам {self.rnd.randint(1, 48)}h")
+
+    def feed(self, chat_id: int):
+        user_id = self.rnd.choice(self.users)
+        if (chat_id, user_id) not in self.whales:
+            self.whales.add((chat_id, user_id))
+            self.message(chat_id, user_id, f"!whale Кит{user_id}")
+        self.message(chat_id, user_id, "!feed")
+
+    def roulette(self, chat_id: int):
+        players = self.rnd.sample(self.users, 3)
+        self.message(chat_id, players[0], "!roulette")
+        for user_id in players[1:]:
+            self.message(chat_id, user_id, "!join")
+        self.message(chat_id, players[0], "!startgame")
+        # Чей ход — решает случай, поэтому стреляют все по кругу (лишние получают «не ваш ход»)
+        for _ in range(4):
+            for user_id in players:
+                self.message(chat_id, user_id, "!shootme")
+        self.message(chat_id, players[0], "!endgame")
+
+    def panel(self, chat_id: int):
+        user_id = self.rnd.choice(self.users)
+        command, prefix = self.rnd.choice([("!group", "group"), ("!help", "help")])
+        self.message(chat_id, user_id, command)
+        panel_id = self.message_id
+        page = "page1"
+        for _ in range(3):
+            self.callback(chat_id, user_id, f"{prefix}_next|{user_id}|{page}", panel_id)
+            page = f"page{int(page[-1]) % 3 + 1}"
+
+    def build(self, count: int, mix: dict) -> list[dict]:
+        scenarios = list(mix)
+        weights = [mix[name] for name in scenarios]
+        while len(self.updates) < count:
+            name = self.rnd.choices(scenarios, weights)[0]
+            getattr(self, name)(self.rnd.choice(self.chats))
+        return self.updates[:count]
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not hasattr(StreamBuilder, name) or name in ("message", "callback", "build"):
+            raise SystemExit(f"Неизвестный сценарий в --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def load_stream(path: str) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def save_stream(path: str, updates: list[dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        for update in updates:
+            f.write(json.dumps(update, ensure_ascii=False) + "\n")
+
+
+# ====== Поддельный Bot API ======
+def make_fake_request(latency: float, seed: int):
+    from telegram.request import BaseRequest
+
+    class FakeRequest(BaseRequest):
+        """Отвечает на запросы Bot API без сети, с задержкой latency ± 50%."""
+
+        def __init__(self):
+            self.rnd = random.Random(seed)
+            self.message_id = 10 ** 6
+            self.calls: dict[str, int] = {}
+
+        @property
+        def read_timeout(self):
+            return None
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        def _message(self, params: dict) -> dict:
+            self.message_id += 1
+            chat_id = int(params.get("chat_id", 0))
+            chat = {"id": chat_id, "type": "private" if chat_id > 0 else "supergroup", "title": "g"}
+            return {
+                "message_id": int(params.get("message_id") or self.message_id), "date": int(time.time()),
+                "chat": chat, "from": {"id": BOT_ID, "is_bot": True, "first_name": "bot"},
+                "text": params.get("text", ""),
+            }
+
+        def _result(self, endpoint: str, params: dict):
+            if endpoint == "getMe":
+                return {"id": BOT_ID, "is_bot": True, "first_name": "bot", "username": "replay_bot"}
+            if endpoint.startswith(("send", "edit")):
+                return self._message(params)
+            if endpoint == "getChatMember":
+                user_id = int(params["user_id"])
+                user = {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+                if user_id == OWNER_ID:
+                    return {"status": "creator", "user": user, "is_anonymous": False}
+                return {"status": "member", "user": user}
+            if endpoint == "getChatMemberCount":
+                return 100
+            if endpoint == "getChat":
+                return {"id": int(params["chat_id"]), "type": "supergroup", "title": "g",
+                        "accent_color_id": 0, "max_reaction_count": 11}
+            return True
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None,
+                             write_timeout=None, connect_timeout=None, pool_timeout=None):
+            endpoint = url.rsplit("/", 1)[-1]
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+            if latency:
+                await asyncio.sleep(latency * self.rnd.uniform(0.5, 1.5))
+            params = request_data.parameters if request_data else {}
+            return 200, json.dumps({"ok": True, "result": self._result(endpoint, params)}).encode()
+
+    return FakeRequest()
+
+
+# ====== Прогон ======
+async def replay(stream: list[dict], latency: float, rate_limiter: bool, seed: int) -> dict:
+    # Модули бота импортируются здесь: BOT_DB_DIR и рабочий каталог уже подменены в main()
+    from telegram import Update
+    from telegram.ext import Application
+    from core.setup_handlers import setup_all_handlers
+    from core.update_processor import ChatOrderedUpdateProcessor
+    from utils.rate_limiter import PriorityRateLimiter
+    from utils.metrics import slowest_handlers
+    from main import post_init, post_shutdown
+    # main.py включает INFO-логи, отчёту они мешают
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("telegram.ext").setLevel(logging.WARNING)
+
+    request = make_fake_request(latency, seed)
+    builder = (
+        Application.builder()
+        .token(FAKE_TOKEN)
+        .request(request)
+        .get_updates_request(make_fake_request(0, seed))
+        .concurrent_updates(ChatOrderedUpdateProcessor())
+    )
+    if rate_limiter:
+        builder = builder.rate_limiter(PriorityRateLimiter())
+    app = builder.build()
+    setup_all_handlers(app)
+
+    errors = []
+
+    async def count_error(update, context):
+        errors.append(f"{type(context.error).__name__}: {context.error}")
+
+    app.add_error_handler(count_error)
+
+    await app.initialize()
+    await post_init(app)
+    await app.start()
+
+    updates = [Update.de_json(data, app.bot) for data in stream]
+    started = time.perf_counter()
+    # Как Application при concurrent_updates: задача на апдейт, порядок внутри чата держит процессор
+    await asyncio.gather(*(
+        asyncio.create_task(app.update_processor.process_update(update, app.process_update(update)))
+        for update in updates
+    ))
+    # Неблокирующие хэндлеры (панели) дорабатывают в задачах — stop() их дожидается
+    await app.stop()
+    elapsed = time.perf_counter() - started
+
+    await post_shutdown(app)
+    await app.shutdown()
+
+    return {
+        "updates": len(updates),
+        "seconds": elapsed,
+        "updates_per_sec": len(updates) / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "api_calls": dict(sorted(request.calls.items())),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "handlers": {
+            h["name"]: {"calls": h["calls"], "p50_ms": h["p50_ms"], "p95_ms": h["p95_ms"]}
+            for h in slowest_handlers(limit=100)
+        },
+    }
+
+
+# ====== Отчёт и базовая линия ======
+def print_report(result: dict):
+    print(f"\n📦 Апдейтов: {result['updates']} за {result['seconds']:.2f} с — "
+          f"{result['updates_per_sec']:.0f} апд/с, пиковый RSS {result['peak_rss_mb']:.0f} MB")
+    print(f"🌐 Запросы к API: {sum(result['api_calls'].values())} "
+          + ", ".join(f"{name}={count}" for name, count in result["api_calls"].items()))
+    if result["errors"]:
+        print(f"⚠️ Ошибок в хэндлерах: {result['errors']}")
+        for sample in result["error_samples"]:
+            print(f"   {sample}")
+    print(f"\n{'хэндлер':<34}{'вызовов':>9}{'p50, мс':>10}{'p95, мс':>10}")
+    for name, h in sorted(result["handlers"].items(), key=lambda item: item[1]["p95_ms"], reverse=True)[:15]:
+        print(f"{name:<34}{h['calls']:>9}{h['p50_ms']:>10.1f}{h['p95_ms']:>10.1f}")
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Список регрессий относительно базовой линии."""
+    regressions = []
+    base_ups = baseline["updates_per_sec"]
+    if result["updates_per_sec"] < base_ups * (1 - tolerance):
+        regressions.append(f"пропускная способность {result['updates_per_sec']:.0f} апд/с (было {base_ups:.0f})")
+    base_rss = baseline["peak_rss_mb"]
+    if result["peak_rss_mb"] > base_rss * (1 + tolerance):
+        regressions.append(f"пиковый RSS {result['peak_rss_mb']:.0f} MB (было {base_rss:.0f})")
+    for name, h in result["handlers"].items():
+        base = baseline["handlers"].get(name)
+        if base and h["p95_ms"] > base["p95_ms"] * (1 + tolerance) and h["p95_ms"] - base["p95_ms"] > P95_NOISE_MS:
+            regressions.append(f"{name}: p95 {h['p95_ms']:.1f} мс (было {base['p95_ms']:.1f})")
+    if result["errors"] > baseline.get("errors", 0):
+        regressions.append(f"ошибок в хэндлерах {result['errors']} (было {baseline.get('errors', 0)})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=3000, help="размер синтетического потока")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="веса сценариев: chatter, ban, feed, roulette, panel")
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=30, help="задержка ответа API, мс")
+    parser.add_argument("--rate-limiter", action="store_true",
+                        help="с лимитами Telegram (PriorityRateLimiter) — тогда меряется в основном ожидание")
+    parser.add_argument("--record", help="записанный поток (JSONL) вместо синтетического")
+    parser.add_argument("--save-stream", help="сохранить поток в JSONL и выйти")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    if args.record:
+        stream = load_stream(args.record)
+    else:
+        stream = StreamBuilder(args.chats, args.users, args.seed).build(args.updates, parse_mix(args.mix))
+    if args.save_stream:
+        save_stream(args.save_stream, stream)
+        print(f"Сохранено апдейтов: {len(stream)} → {args.save_stream}")
+        return
+
+    config = {
+        "stream": os.path.basename(args.record) if args.record else args.mix,
+        "updates": len(stream), "chats": args.chats, "users": args.users, "seed": args.seed,
+        "latency_ms": args.latency, "rate_limiter": args.rate_limiter,
+    }
+
+    # Базы и JSON-файлы бота — во временном каталоге (часть модулей пишет в database/ от рабочего каталога)
+    baseline_path = os.path.abspath(args.baseline)
+    with tempfile.TemporaryDirectory(prefix="replay_bench_") as tmp:
+        os.makedirs(os.path.join(tmp, "database"))
+        os.environ["BOT_DB_DIR"] = os.path.join(tmp, "database")
+        os.chdir(tmp)
+        # Отладочные print() хэндлеров не смешиваются с отчётом
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = asyncio.run(replay(stream, args.latency / 1000, args.rate_limiter, args.seed))
+        os.chdir(ROOT)
+    result["config"] = config
+    print_report(result)
+
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({k: v for k, v in result.items() if k != "error_samples"}, f, ensure_ascii=False, indent=1)
+        print(f"\n💾 Базовая линия сохранена: {baseline_path}")
+        return
+
+    if not os.path.exists(baseline_path):
+        print("\nБазовой линии нет — запишите её: --save-baseline")
+        return
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    # Время хэндлеров и RSS зависят от размера и состава потока — сравнивать можно только одинаковые прогоны
+    if baseline.get("config") != config:
+        print(f"\n⚠️ Параметры прогона отличаются от базовой линии, сравнение пропущено.\n"
+              f"   базовая линия: {baseline.get('config')}\n   этот прогон:   {config}\n"
+              f"   Запустите с теми же параметрами или запишите базовую линию: --save-baseline")
+        sys.exit(2)
+    regressions = compare(result, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ Регрессии (допуск {args.tolerance:.0%}):")
+        for line in regressions:
+            print(f"   {line}")
+        sys.exit(1)
+    print(f"\n✅ Без регрессий относительно базовой линии (допуск {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import difflib
+import logging
+import re
+
+from telegram import Update
+from telegram.ext import BaseHandler
+
+from utils.rate_limiter import send_priority, PRIORITY_GAME
+
+# Слово после префикса похоже на команду (а не на «!!!» или «!да»)
+_COMMAND_WORD = re.compile(r"^[a-z][a-z0-9_-]*$")
+
+
+class CommandRouter(BaseHandler):
+    """
+    Один хэндлер на все !-команды: команда выделяется из текста один раз
+    и ищется в словаре, вместо проверки цепочки regex-фильтров по очереди.
+    Неизвестные команды получают подсказку.
+    """
+
+    def __init__(self, prefix: str = "!"):
+        super().__init__(self._unknown_command)
+        self.prefix = prefix
+        # команда -> (callback, нужны ли аргументы)
+        self.routes: dict[str, tuple] = {}
+        # Команды, которые обрабатывают другие хэндлеры (ConversationHandler'ы)
+        self.reserved: set[str] = set()
+        # Команды только для Администраторов Бота — не предлагаются в подсказке
+        self.hidden: set[str] = set()
+
+    def add(self, command: str, callback, needs_args: bool = False, hidden: bool = False):
+        """
+        needs_args — без аргументов команда не принимается роутером и достаётся
+        следующим хэндлерам группы (например, ConversationHandler с тем же словом).
+        hidden — команда не попадает в подсказку «Возможно, вы имели в виду».
+        """
+        self.routes[command] = (callback, needs_args)
+        if hidden:
+            self.hidden.add(command)
+
+    def reserve(self, *commands: str):
+        self.reserved.update(commands)
+
+    def wrap_callbacks(self, wrap):
+        """wrap(имя, callback) -> callback для каждой команды (замер времени, см. utils/metrics.py)."""
+        for command, (callback, needs_args) in self.routes.items():
+            self.routes[command] = (wrap(self.prefix + command, callback), needs_args)
+        self.callback = wrap("unknown_command", self.callback)
+
+    @property
+    def commands(self) -> list[str]:
+        return sorted(self.routes.keys() | self.reserved)
+
+    def split_command(self, text: str):
+        """
+        '!ban @user 7d' -> ('ban', True). None — текст не команда.
+        """
+        if not text.startswith(self.prefix):
+            return None
+        parts = text[len(self.prefix):].split(maxsplit=1)
+        if not parts:
+            return None
+        return parts[0].lower(), len(parts) > 1
+
+    def check_update(self, update: object):
+        # Только новые сообщения: хэндлеры команд работают с update.message
+        if not isinstance(update, Update) or not update.message or not update.message.text:
+            return None
+        split = self.split_command(update.message.text)
+        if split is None:
+            return None
+        command, has_args = split
+
+        route = self.routes.get(command)
+        if route is not None:
+            callback, needs_args = route
+            if needs_args and not has_args:
+                return None
+            return callback
+        if command in self.reserved or not _COMMAND_WORD.match(command):
+            return None
+        # В ЛС текст уходит Администраторам Бота (private_message_handler), подсказка там не нужна
+        if update.effective_chat.type == "private":
+            return None
+        return self.callback
+
+    async def handle_update(self, update, application, check_result, context):
+        self.collect_additional_context(context, update, application, check_result)
+        return await check_result(update, context)
+
+    @send_priority(PRIORITY_GAME)
+    async def _unknown_command(self, update, context):
+        command, _ = self.split_command(update.message.text)
+        logging.debug(f"[command_router] Неизвестная команда {self.prefix}{command} в чате {update.effective_chat.id}")
+        suggestions = [c for c in self.commands if c not in self.hidden]
+        close = difflib.get_close_matches(command, suggestions, n=1)
+        hint = f"Возможно, вы имели в виду {self.prefix}{close[0]}?" if close else f"Список команд — {self.prefix}help"
+        await update.message.reply_text(f"❓ Неизвестная команда {self.prefix}{command}. {hint}")
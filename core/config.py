@@ -14,3 +14,13 @@ logging.basicConfig(
     level=logging.INFO
 )
 logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Режим получения апдейтов: "polling" (по умолчанию) или "webhook" (см. core/webhook.py)
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# Настройки webhook-сервера
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')   # за reverse proxy слушаем только локально
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')            # 1–256 символов: A-Z, a-z, 0-9, _ и -
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')                  # публичный адрес; если пуст — setWebhook не вызывается
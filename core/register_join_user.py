@@ -1,6 +1,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from utils.users import register_user
+from utils.chat_members import remember_chat_member, invalidate_chat_member
 
 
 async def on_user_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -10,6 +11,10 @@ async def on_user_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
     new_status = chat_member.new_chat_member.status
     user = chat_member.new_chat_member.user
 
+    # Telegram прислал актуальный статус — обновляем кэш участников, чтобы проверки прав не ходили в сеть
+    invalidate_chat_member(chat_member.chat.id, user.id)
+    remember_chat_member(chat_member.chat.id, chat_member.new_chat_member)
+
     print(f"👀 Изменение статуса: {user.full_name} ({user.id}) {old_status} → {new_status}")
 
     if new_status in ['member', 'restricted'] and old_status in ['left', 'kicked']:
@@ -3,6 +3,7 @@
 # Хэндлер регистрации пользователей в Базу Данных
 from core.register_join_user import on_user_join
 from utils.users import register_user
+from handlers.group_stats_updater import update_message_stat
 
 from core.check_group_chat import only_group_chats
 
@@ -19,7 +20,7 @@ from handlers.public.prefix import prefix_handler
 from handlers.public.group import group_handler, group_callback_handler
 
 # Мини игра, которая с 1% шанса выдает рандомному участнику чата блокировку на 1 минуту
-from handlers.funny.mute_random import mute_random_handler
+from handlers.funny.mute_random import mute_random_handler, mute_set_handler
 
 from handlers.public.help_bot import help_handler, help_callback_handler
 
@@ -30,21 +31,21 @@ from handlers.public.welcome_join import welcome_join
 
 # ========== 2. Импорты кастомных команд (админ-команды) ==========
 
-from handlers.admin.revoke_role import revoke_role_handler_obj
+from handlers.admin.revoke_role import revoke_role_handler
 
 # Хэндлер команды !new-role — создание кастомной роли
-from handlers.admin.new_admin_handler import new_admin_handler_obj
+from handlers.admin.new_admin_handler import new_admin_handler
 
 # Хэндлер команды !grant — назначение кастомной роли участнику
-from handlers.admin.grant import grant_admin_handler_obj
+from handlers.admin.grant import grant_admin_handler
 
 # Хэндлер команды !ban - блокирует определенного пользователя в Группе
-from handlers.admin.ban_user import ban_handler_obj
+from handlers.admin.ban_user import ban_handler
 
 
 # Хэндлер команды !edit-admin — настройка прав роли, и переключение прав через inline
 from handlers.admin.edit_admin import (
-    edit_admin_handler_obj,
+    edit_admin_handler,
     edit_admin_toggle_cb_obj,
     edit_admin_option_cb_obj,
     edit_admin_text_handler_obj,
@@ -54,9 +55,9 @@ from handlers.admin.edit_admin import (
 )
 
 # Хэндлер команды !view-admins — просмотр списка кастомных ролей и назначенных админов
-from handlers.public.view_admins import view_admins_handler_obj, view_admins_callback_obj
+from handlers.public.view_admins import view_admins_handler, view_admins_callback_obj
 
-from handlers.admin.remove_role import remove_admin_role_handler_obj, confirm_remove_role_cb_obj, cancel_remove_role_cb_obj
+from handlers.admin.remove_role import remove_admin_role_handler, confirm_remove_role_cb_obj, cancel_remove_role_cb_obj
 
 from handlers.public.rules_bot import (
     rules_handler, rules_callback_handler, set_rules_start,
@@ -81,7 +82,8 @@ from handlers.funny.feed_the_pet import (
 
 # !status — Показать краткую информацию о нагрузке системы
 # !debug-all — Вывести расширенную статистику системы
-from handlers.bot_administrators.status import status_command, debugall_command
+# !perf — Самые медленные хэндлеры (время в SQLite и Telegram API)
+from handlers.bot_administrators.status import status_command, debugall_command, perf_command
 
 from handlers.bot_administrators.chat_bot import (
     private_message_handler, reply_handler,
@@ -89,6 +91,12 @@ from handlers.bot_administrators.chat_bot import (
     export_users_handler, export_chat_handler
 )
 
+# Роутер !-команд: одна проверка словаря вместо цепочки regex-хэндлеров
+from core.command_router import CommandRouter
+
+# Замер времени каждого хэндлера (!perf)
+from utils.metrics import instrument_handlers
+
 
 # этот хэндлер выстрелит сразу, как только кто‑то вошёл в чат (Но он не рабочий)
 async def welcome_new_members(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -108,15 +116,76 @@ async def welcome_new_members(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
 
 
-# 👤 Регистрация пользователей с логированием
+# 👤 Регистрация пользователей с логированием (и учёт сообщений для статистики групп)
 async def register_user_handler(update, context):
     if update.effective_user:
         user = update.effective_user
         register_user(user)
 
+        chat = update.effective_chat
+        if update.message and chat and chat.type in ("group", "supergroup"):
+            update_message_stat(chat.id, user.id, user.username)
+
         # print(f"🟢 [{datetime.now().strftime('%H:%M:%S')}] Зарегистрирован пользователь @{user.username} (ID: {user.id})")
 
 
+# 🧭 Таблица !-команд
+def build_command_router() -> CommandRouter:
+    router = CommandRouter()
+
+    router.add("group", group_handler)
+    router.add("prefix", prefix_handler)
+    router.add("help", help_handler)
+    router.add("rules", rules_handler)
+    router.add("del-rules", delete_rules_handler)
+    # Команды Администраторов Бота — без подсказок остальным участникам
+    router.add("status", status_command, hidden=True)
+    router.add("debug-all", debugall_command, hidden=True)
+    router.add("perf", perf_command, hidden=True)
+
+    router.add("roulette", roulette_handler)
+    router.add("join", join_handler)
+    router.add("startgame", start_game_handler)
+    router.add("endgame", endgame_handler)
+    router.add("shootme", shootme_handler)
+    router.add("shoot", shoot_handler)
+
+    # !export_db <файл> — сразу, без аргументов — через export_db_conv_handler
+    router.add("export_db", export_db_handler_immediate, needs_args=True, hidden=True)
+
+    # Команда !new-role
+    router.add("new-role", new_admin_handler)
+    # Команда !grant - для назначения Админом в Группе (Админы - кастомные)
+    router.add("grant", grant_admin_handler)
+    # Команда !view-admins - для просмотра всех кастомных ролей в Группе
+    router.add("view-admins", view_admins_handler)
+    # Команда !edit-admin - Вызывает inline с управлением Роли
+    router.add("edit-admin", edit_admin_handler)
+    # Команда !remove-role - Удаляет роль полностью
+    router.add("remove-role", remove_admin_role_handler)
+    # Команда !ban - блокирует определенного пользователя в Группе
+    router.add("ban", ban_handler)
+    # Команда !revoke - Снимает кастомную роль с участника
+    router.add("revoke", revoke_role_handler)
+
+    # Игра кормёжки Кита
+    router.add("set-whale-admin", whale_admin_handler)
+    router.add("del-whale-admin", whale_admin_remove)
+    router.add("whale-set", set_game_setting)
+    router.add("whale-admins", whale_admins_list)
+    router.add("whale-name", set_whale_name)
+    router.add("whale", register_whale)
+    router.add("feed", feed_handler)
+    router.add("leaders", leaders_handler)
+    router.add("profile", profile_handler)
+    router.add("info-whale", info_whale)
+    router.add("mute-set", mute_set_handler)
+
+    # Команды диалогов — их обрабатывают ConversationHandler'ы, роутер их не считает неизвестными
+    router.reserve("set-rules", "export_db")
+    return router
+
+
 # ========== 2. Основная функция регистрации всех хэндлеров ==========
 def setup_all_handlers(app: Application):
 
@@ -144,67 +213,18 @@ def setup_all_handlers(app: Application):
     )
     app.add_handler(set_rules_conv, group=1)
 
-    # 2. Обработчики команд
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!group"), group_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!prefix"), prefix_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!help"), help_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!rules"), rules_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!del-rules"), delete_rules_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!status"), status_command), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!debug-all"), debugall_command), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!roulette"), roulette_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!join"), join_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!startgame"), start_game_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!endgame"), endgame_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!shootme"), shootme_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!shoot"), shoot_handler), group=2)
-
-    app.add_handler(MessageHandler(filters.TEXT & filters.Regex(r"^!export_db(?:\s|$).+"), export_db_handler_immediate), group=2)
+    # 2. Обработчики команд (все !-команды — один роутер, см. build_command_router)
+    app.add_handler(build_command_router(), group=2)
+    # !export_db без аргументов — диалог выбора файла (роутер пропускает его дальше)
     app.add_handler(export_db_conv_handler, group=2)
-    # Команда !new-role
-    app.add_handler(new_admin_handler_obj, group=2)
-    # Команда !grant - для назначения Админом в Группе (Админы - кастомные)
-    app.add_handler(grant_admin_handler_obj, group=2)
-    # Команда !view-admins - для просмотра всех кастомных ролей в Группе
-    app.add_handler(view_admins_handler_obj, group=2)
     app.add_handler(view_admins_callback_obj, group=2)
-    # Команда !edit-admin - Вызывает inline с управлением Роли
-    app.add_handler(edit_admin_handler_obj, group=2)
-    # Команда !remove-role - Удаляет роль полностью
-    app.add_handler(remove_admin_role_handler_obj, group=2)
-    # Команда !ban - блокирует определенного пользователя в Группе
-    app.add_handler(ban_handler_obj, group=2)
-    # Команда !revoke - Снимает кастомную роль с участника
-    app.add_handler(revoke_role_handler_obj, group=2)
-
-    # Register handlers про игру кормёжки Кита
-    app.add_handler(MessageHandler(filters.Regex(r'^!set-whale-admin'), whale_admin_handler), group=2)
-    app.add_handler(MessageHandler(filters.Regex(r'^!del-whale-admin'), whale_admin_remove), group=2)
-    app.add_handler(MessageHandler(filters.Regex(r'^!whale-set'), set_game_setting), group=2)
-    app.add_handler(MessageHandler(filters.Regex(r'^!whale-admins'), whale_admins_list), group=2)
-    app.add_handler(MessageHandler(filters.Regex(r'^!whale-name'), set_whale_name), group=2)
-    app.add_handler(MessageHandler(filters.Regex(r'^!whale\b'), register_whale), group=2)
-    app.add_handler(MessageHandler(filters.Regex(r'^!feed'), feed_handler), group=2)
-    app.add_handler(MessageHandler(filters.Regex(r'^!leaders'), leaders_handler), group=2)
-    app.add_handler(MessageHandler(filters.Regex(r'^!profile'), profile_handler), group=2)
-    app.add_handler(MessageHandler(filters.Regex(r'^!info-whale'), info_whale), group=2)
 
     # 3. Callback кнопки
-    app.add_handler(CallbackQueryHandler(group_callback_handler, pattern="^group_"), group=3)
-    app.add_handler(CallbackQueryHandler(help_callback_handler, pattern="^help_"), group=3)
-    app.add_handler(CallbackQueryHandler(rules_callback_handler, pattern="^rules_"), group=3)
+    # Панели со страницами не блокируют очередь апдейтов: быстрые повторные клики
+    # схлопываются в одну отрисовку (utils/panel_cache.py, coalesce_clicks)
+    app.add_handler(CallbackQueryHandler(group_callback_handler, pattern="^group_", block=False), group=3)
+    app.add_handler(CallbackQueryHandler(help_callback_handler, pattern="^help_", block=False), group=3)
+    app.add_handler(CallbackQueryHandler(rules_callback_handler, pattern="^rules_", block=False), group=3)
     # Callback — переключение прав ✅/❌
     app.add_handler(edit_admin_toggle_cb_obj, group=3)
     # Callback — Название / Уровень
@@ -236,4 +256,7 @@ def setup_all_handlers(app: Application):
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, private_message_handler), group=5)
 
     # 7. Прочее в группах
-    app.add_handler(MessageHandler(filters.TEXT & ~filters.Regex(r"^!"), mute_random_handler), group=6)
\ No newline at end of file
+    app.add_handler(MessageHandler(filters.TEXT & ~filters.Regex(r"^!"), mute_random_handler), group=6)
+
+    # Все хэндлеры выше — с замером времени (регистрировать новые до этой строки)
+    instrument_handlers(app)
\ No newline at end of file
@@ -0,0 +1,67 @@
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from utils.startup_profile import first_update_done
+
+# Сколько апдейтов обрабатывается одновременно (во всех чатах вместе)
+MAX_CONCURRENT_UPDATES = 256
+
+
+def _ordering_key(update: object):
+    """
+    Ключ очереди апдейта: чат, а для апдейтов без чата (inline-запросы и т.п.) — пользователь.
+    None — апдейт ни с кем не упорядочивается.
+    """
+    if not isinstance(update, Update):
+        return None
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return ("user", update.effective_user.id)
+    return None
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Апдейты разных чатов обрабатываются параллельно, апдейты одного чата — строго по очереди
+    в порядке поступления. Так ConversationHandler, лобби рулетки и прочее состояние в chat_data
+    видят события чата последовательно, а медленный хэндлер в одном чате не задерживает остальные.
+
+    Ожидание лимита отправки (utils/rate_limiter.py) идёт внутри хэндлера, то есть под очередью чата:
+    ответ, ждущий токен группы (20 сообщений в минуту), задерживает и следующие апдейты этого чата.
+    Правки панелей токены чата не тратят, поэтому клики по кнопкам так не тормозят.
+    """
+
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        # ключ -> [asyncio.Lock, сколько апдейтов его ждут или держат]
+        self._locks: dict = {}
+
+    async def do_process_update(self, update, coroutine):
+        key = _ordering_key(update)
+        if key is None:
+            await coroutine
+            first_update_done()
+            return
+
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            # asyncio.Lock отдаёт блокировку ожидающим в порядке очереди — порядок апдейтов сохраняется
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+        first_update_done()
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,85 @@
+import asyncio
+import hmac
+import logging
+import signal
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+from core.config import WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_URL
+
+# Заголовок, в котором Telegram присылает secret_token из setWebhook
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def build_webhook_app(app: Application, secret: str = WEBHOOK_SECRET, path: str = WEBHOOK_PATH) -> web.Application:
+    """
+    aiohttp-приложение, которое принимает апдейты и кладёт их в update_queue того же Application.
+    Запросы без верного секретного заголовка отклоняются (403), битый JSON — 400.
+    """
+    async def handle_update(request: web.Request) -> web.Response:
+        # Сравнение за постоянное время, чтобы секрет нельзя было подобрать по задержке ответа
+        if not hmac.compare_digest(request.headers.get(SECRET_HEADER, ""), secret):
+            return web.Response(status=403)
+        try:
+            update = Update.de_json(await request.json(), app.bot)
+        except Exception:
+            logging.warning("Webhook: получен некорректный апдейт", exc_info=True)
+            return web.Response(status=400)
+
+        # Telegram ждёт только подтверждения приёма — обработка идёт в очереди Application
+        await app.update_queue.put(update)
+        return web.Response()
+
+    webhook_app = web.Application()
+    webhook_app.router.add_post(path, handle_update)
+    return webhook_app
+
+
+async def run_webhook(app: Application):
+    """
+    Аналог app.run_polling() для режима BOT_MODE=webhook: запускает Application
+    (с post_init / post_shutdown) и HTTP-сервер на WEBHOOK_LISTEN:WEBHOOK_PORT до SIGINT/SIGTERM.
+
+    Проверка без Telegram — отправить записанный апдейт:
+        curl -X POST http://127.0.0.1:8443/telegram \\
+             -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \\
+             -H "Content-Type: application/json" -d @update.json
+    """
+    if not WEBHOOK_SECRET:
+        raise RuntimeError("Для BOT_MODE=webhook нужно задать WEBHOOK_SECRET")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    runner = web.AppRunner(build_webhook_app(app))
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        if WEBHOOK_URL:
+            await app.bot.set_webhook(
+                url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES
+            )
+        await app.start()
+
+        await runner.setup()
+        await web.TCPSite(runner, WEBHOOK_LISTEN, WEBHOOK_PORT).start()
+        logging.info(f"Webhook-сервер слушает {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        await stop.wait()
+    finally:
+        # Сначала перестаём принимать апдейты, затем дорабатываем очередь
+        await runner.cleanup()
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        if app.post_shutdown:
+            await app.post_shutdown(app)
@@ -1,6 +1,4 @@
-import sqlite3
-
-DB_PATH = "database/moderation.db"
+from handlers.admin import permission_cache
 
 
 # Проверка на доступ к созданию кастомных ролей
@@ -10,30 +8,7 @@ def has_permission_to_create_admin(chat_id: int, user_id: int) -> bool:
 
 # Проверка: есть ли у пользователя доступ к конкретной команде
 def has_access(chat_id: int, user_id: int, command: str) -> bool:
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Получаем роли пользователя
-    cursor.execute("SELECT role FROM user_roles WHERE chat_id = ? AND user_id = ?", (chat_id, user_id))
-    roles = [row[0] for row in cursor.fetchall()]
-
-    # Проверка владельца
-    try:
-        cursor.execute("SELECT status FROM chat_members WHERE chat_id = ? AND user_id = ?", (chat_id, user_id))
-        status = cursor.fetchone()
-        if status and status[0] == "creator":
-            conn.close()
-            return True
-    except:
-        pass
-
-    # Проверка наличия разрешения хотя бы у одной из ролей
-    for role in roles:
-        cursor.execute("SELECT 1 FROM admin_permissions WHERE chat_id = ? AND role = ? AND command = ?",
-                       (chat_id, role, command))
-        if cursor.fetchone():
-            conn.close()
-            return True
-
-    conn.close()
-    return False
+    # Владелец группы проверяется в хэндлерах через get_chat_member (status == OWNER).
+    # Маска прав пользователя собирается из снимка ролей группы в памяти (permission_cache),
+    # поэтому повторные проверки не обращаются к базе
+    return permission_cache.user_has_command(chat_id, user_id, command)
@@ -0,0 +1,172 @@
+import datetime
+import heapq
+import logging
+import math
+import time
+
+from telegram.ext import ContextTypes
+
+from utils.db import BANS_DB, transaction, fetchall, execute, executemany, run_db
+from utils.chat_members import invalidate_chat_member
+
+# Сколько ближайших разбанов держать в памяти — остальные ждут своей очереди только в bans.db
+HEAP_WINDOW = 1000
+
+JOB_NAME = "ban_scheduler"
+
+# Куча ближайших разбанов: (unban_at, chat_id, user_id)
+_heap: list[tuple] = []
+# (chat_id, user_id) -> актуальный unban_at записи в куче (устаревшие записи кучи пропускаются)
+_due: dict[tuple, int] = {}
+# Всё, что позже этого момента, лежит только в базе (inf — в куче все разбаны)
+_window_end = math.inf
+
+
+# 📌 Таблица запланированных разбанов
+def init_unban_db():
+    """
+    Создаёт pending_unbans. При первом создании переносит в неё ещё не истёкшие сроки из таблицы bans —
+    разбаны, которые раньше жили только в памяти и терялись при перезапуске.
+    Вызывается после init_bans_db: тогда в bans уже влиты баны из старого handlers/database/bans.db.
+    """
+    with transaction(BANS_DB) as conn:
+        exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pending_unbans'"
+        ).fetchone()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_unbans (
+                chat_id INTEGER,
+                user_id INTEGER,
+                unban_at INTEGER,
+                PRIMARY KEY (chat_id, user_id)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_unbans_time ON pending_unbans (unban_at)")
+        if exists:
+            return
+
+        now = time.time()
+        legacy = []
+        expired = 0
+        for chat_id, user_id, unban_time in conn.execute(
+            "SELECT chat_id, banned_user_id, unban_time FROM bans WHERE unban_time != ''"
+        ):
+            try:
+                unban_at = int(datetime.datetime.fromisoformat(unban_time).timestamp())
+            except (TypeError, ValueError):
+                continue
+            # Истёкшие сроки не переносятся: их таймер потерялся при старом перезапуске, и с тех пор
+            # админ мог забанить участника вручную — поздний разбан снял бы этот бан
+            if unban_at <= now:
+                expired += 1
+                continue
+            legacy.append((chat_id, user_id, unban_at))
+        conn.executemany("INSERT OR IGNORE INTO pending_unbans (chat_id, user_id, unban_at) VALUES (?, ?, ?)", legacy)
+        if legacy or expired:
+            logging.info(
+                f"[ban_scheduler] Перенесено разбанов из bans: {len(legacy)}, "
+                f"пропущено истёкших: {expired} (снимаются вручную при необходимости)"
+            )
+
+
+def _save_unban(chat_id: int, user_id: int, unban_at: int):
+    execute(BANS_DB, "REPLACE INTO pending_unbans (chat_id, user_id, unban_at) VALUES (?, ?, ?)",
+            (chat_id, user_id, unban_at))
+
+
+def _delete_unbans(rows: list[tuple]):
+    # Удаляем только если срок не переназначили, пока шёл разбан
+    executemany(BANS_DB, "DELETE FROM pending_unbans WHERE chat_id = ? AND user_id = ? AND unban_at = ?", rows)
+
+
+def _load_window() -> list[tuple]:
+    return fetchall(
+        BANS_DB,
+        "SELECT unban_at, chat_id, user_id FROM pending_unbans ORDER BY unban_at LIMIT ?",
+        (HEAP_WINDOW,)
+    )
+
+
+async def _reload():
+    """
+    Заполняет кучу ближайшими HEAP_WINDOW разбанами из базы.
+    """
+    global _heap, _window_end
+    rows = await run_db(_load_window)
+    _heap = list(rows)
+    heapq.heapify(_heap)
+    _due.clear()
+    _due.update({(chat_id, user_id): unban_at for unban_at, chat_id, user_id in rows})
+    _window_end = rows[-1][0] if len(rows) == HEAP_WINDOW else math.inf
+
+
+def _arm(job_queue):
+    """
+    Один таймер на все разбаны: срабатывает к ближайшему сроку из кучи.
+    """
+    for job in job_queue.get_jobs_by_name(JOB_NAME):
+        job.schedule_removal()
+    # Устаревшие записи на вершине кучи таймер не заводят
+    while _heap and _due.get((_heap[0][1], _heap[0][2])) != _heap[0][0]:
+        heapq.heappop(_heap)
+    if _heap:
+        job_queue.run_once(_unban_due_job, when=max(0.0, _heap[0][0] - time.time()), name=JOB_NAME)
+
+
+async def _unban_due_job(context: ContextTypes.DEFAULT_TYPE):
+    now = time.time()
+    done = []
+    while _heap and _heap[0][0] <= now:
+        unban_at, chat_id, user_id = heapq.heappop(_heap)
+        if _due.get((chat_id, user_id)) != unban_at:
+            continue
+        del _due[(chat_id, user_id)]
+        try:
+            await context.bot.unban_chat_member(chat_id, user_id, only_if_banned=True)
+            invalidate_chat_member(chat_id, user_id)
+        except Exception as e:
+            logging.warning(f"[ban_scheduler] Ошибка при автоматическом разбане {user_id} в {chat_id}: {e}")
+        done.append((chat_id, user_id, unban_at))
+
+    if done:
+        await run_db(_delete_unbans, done)
+        logging.info(f"[ban_scheduler] Автоматически разбанено: {len(done)}")
+
+    # Окно кончилось, а в базе есть более поздние разбаны — подгружаем следующее
+    if not _due and _window_end != math.inf:
+        await _reload()
+    _arm(context.job_queue)
+
+
+async def schedule_unban(job_queue, chat_id: int, user_id: int, unban_at: int):
+    """
+    Сохраняет срок разбана в bans.db и ставит его в очередь (повторный бан переносит срок).
+    """
+    global _window_end
+    await run_db(_save_unban, chat_id, user_id, unban_at)
+    if job_queue is None:
+        logging.warning(
+            f"[ban_scheduler] JobQueue недоступна — пользователь {user_id} в чате {chat_id} "
+            f"не будет разбанен автоматически (срок сохранён в bans.db)"
+        )
+        return
+
+    if unban_at <= _window_end:
+        _due[(chat_id, user_id)] = unban_at
+        heapq.heappush(_heap, (unban_at, chat_id, user_id))
+        # Куча не растёт бесконечно: при переполнении оставляем в памяти только ближайшие
+        if len(_due) > 2 * HEAP_WINDOW:
+            await _reload()
+    else:
+        _due.pop((chat_id, user_id), None)
+    _arm(job_queue)
+
+
+async def start_ban_scheduler(job_queue) -> int:
+    """
+    Загружает ближайшие разбаны и заводит таймер. Истёкшие, пока бот был выключен,
+    выполняются сразу. Возвращает число разбанов в памяти.
+    """
+    await _reload()
+    _arm(job_queue)
+    return len(_due)
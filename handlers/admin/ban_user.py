@@ -1,95 +1,31 @@
-import re
 import datetime
-import sqlite3
 import os
-from asyncio import get_running_loop, create_task, sleep
 from telegram import Update, ChatMember
 from telegram.constants import ParseMode
-from telegram.ext import ContextTypes, MessageHandler, filters
+from telegram.ext import ContextTypes
 from telegram.helpers import mention_html
 
 from handlers.admin.admin_access import has_access
 from handlers.admin.moderation_db import get_user_max_role_level
+from handlers.admin.ban_scheduler import schedule_unban
 from utils.users import get_user_id_by_username
 from core.check_group_chat import only_group_chats
+from handlers.group_stats_updater import update_ban_stat
+from utils.db import BANS_DB, DB_DIR, PROJECT_ROOT, execute, transaction, run_db
+from utils.chat_members import get_chat_member, invalidate_chat_member
+from utils.rate_limiter import send_priority, PRIORITY_MODERATION
+from utils.durations import find_duration, format_tokens, to_seconds
 
 # Флаг отладки
 DEBUG = True
 
+# До перехода на utils/db.py баны писались в handlers/database/bans.db (путь считался от handlers/admin/)
+LEGACY_BANS_DB = os.path.join(PROJECT_ROOT, "handlers", "database", "bans.db")
 
-# Функция для парсинга строкового срока бана.
-def parse_duration_string(duration_str: str) -> datetime.timedelta:
-    """Парсинг строкового срока бана в timedelta."""
-    cleaned = duration_str.lower().replace(" ", "")
-    time_pattern = re.compile(r'(\d+(?:r|mo|d|h|m|s))')
-    matches = time_pattern.findall(cleaned)
-    if not matches:
-        raise ValueError("Неверный формат срока бана")
-    total_delta = datetime.timedelta()
-    for item in matches:
-        m = re.match(r'^(\d+)(r|mo|d|h|m|s)$', item)
-        if not m:
-            raise ValueError("Неверная единица времени")
-        amount, unit = int(m.group(1)), m.group(2)
-        if unit == 'r':  # год = 365 дней
-            delta = datetime.timedelta(days=365 * amount)
-        elif unit == 'mo':  # месяц = 32 дня
-            if amount > 12:
-                raise ValueError("Неверное число месяцев (максимум 12)")
-            delta = datetime.timedelta(days=32 * amount)
-        elif unit == 'd':
-            delta = datetime.timedelta(days=amount)
-        elif unit == 'h':
-            delta = datetime.timedelta(hours=amount)
-        elif unit == 'm':
-            delta = datetime.timedelta(minutes=amount)
-        elif unit == 's':
-            if amount >= 60:
-                raise ValueError("Неверное число секунд (максимум 59)")
-            delta = datetime.timedelta(seconds=amount)
-        else:
-            raise ValueError("Неверная единица времени")
-        total_delta += delta
-    return total_delta
-
-
-# Функция для объединения списка единиц в строку с пробелами.
-def format_duration(units: list) -> str:
-    return ' '.join(units)
-
-
-# Функция для преобразования единиц в читаемый формат (полный текст на русском).
-def format_duration_full(formatted: str) -> str:
-    """Преобразование к читаемому виду (русский язык)."""
-    tokens = formatted.split()
-    mapping = {
-        'r': lambda n: f"{n} " + ("год" if n == 1 else ("года" if 2 <= n <= 4 else "лет")),
-        'mo': lambda n: f"{n} " + ("месяц" if n == 1 else ("месяца" if 2 <= n <= 4 else "месяцев")),
-        'd': lambda n: f"{n} " + ("день" if n == 1 else ("дня" if 2 <= n <= 4 else "дней")),
-        'h': lambda n: f"{n} " + ("час" if n == 1 else ("часа" if 2 <= n <= 4 else "часов")),
-        'm': lambda n: f"{n} " + ("минута" if n == 1 else ("минуты" if 2 <= n <= 4 else "минут")),
-        's': lambda n: f"{n} " + ("секунда" if n == 1 else ("секунды" if 2 <= n <= 4 else "секунд")),
-    }
-    parts = []
-    for token in tokens:
-        m = re.match(r'^(\d+)(r|mo|d|h|m|s)$', token)
-        if m:
-            n, u = int(m.group(1)), m.group(2)
-            parts.append(mapping[u](n))
-    return ' '.join(parts)
 
-
-# Функция для автоматического разбана через задержку.
-async def unban_after_delay(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int, delay: int):
-    await sleep(delay)
-    try:
-        await context.bot.unban_chat_member(chat_id, user_id, only_if_banned=True)
-        if DEBUG:
-            print(f"[DEBUG] Пользователь {user_id} разблокирован автоматически через {delay} секунд.")
-    except Exception as e:
-        if DEBUG:
-            print(f"[DEBUG] Ошибка при автоматическом разбане {user_id}: {e}")
-    # Здесь можно также удалить запись из таблицы банов, если потребуется.
+# Ограничения срока бана по единицам (остальные — без ограничений)
+MAX_BAN_MONTHS = 12
+MAX_BAN_SECONDS = 59
 
 
 # Функции для работы с базой банов (bans.db).
@@ -99,30 +35,60 @@ async def unban_after_delay(context: ContextTypes.DEFAULT_TYPE, chat_id: int, us
 #   - Данных забаненного
 #   - Причины и срока бана (в человекочитаемом виде)
 def init_bans_db():
-    """Инициализация SQLite для банов."""
-    db_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database')
-    os.makedirs(db_dir, exist_ok=True)
-    db_path = os.path.join(db_dir, 'bans.db')
-    with sqlite3.connect(db_path) as conn:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS bans (
-                chat_id INTEGER,
-                group_name TEXT,
-                admin_user_id INTEGER,
-                admin_username TEXT,
-                admin_first_name TEXT,
-                admin_last_name TEXT,
-                banned_user_id INTEGER,
-                banned_username TEXT,
-                banned_first_name TEXT,
-                banned_last_name TEXT,
-                reason TEXT,
-                duration TEXT,
-                unban_time TEXT,
-                PRIMARY KEY (chat_id, banned_user_id)
-            )
-        ''')
-        conn.commit()
+    """Инициализация SQLite для банов (database/bans.db)."""
+    execute(BANS_DB, '''
+        CREATE TABLE IF NOT EXISTS bans (
+            chat_id INTEGER,
+            group_name TEXT,
+            admin_user_id INTEGER,
+            admin_username TEXT,
+            admin_first_name TEXT,
+            admin_last_name TEXT,
+            banned_user_id INTEGER,
+            banned_username TEXT,
+            banned_first_name TEXT,
+            banned_last_name TEXT,
+            reason TEXT,
+            duration TEXT,
+            unban_time TEXT,
+            PRIMARY KEY (chat_id, banned_user_id)
+        )
+    ''')
+    _merge_legacy_bans()
+
+
+def _merge_legacy_bans():
+    """
+    Один раз переносит баны из старого файла handlers/database/bans.db.
+    Отметка о переносе — PRAGMA user_version базы банов, старый файл не трогается.
+    """
+    with transaction(BANS_DB) as conn:
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= 1:
+            return
+        # Старый файл относится только к рабочему каталогу баз (не к BOT_DB_DIR, например, в benchmarks/)
+        is_default_dir = os.path.abspath(DB_DIR) == os.path.join(PROJECT_ROOT, "database")
+        if is_default_dir and os.path.exists(LEGACY_BANS_DB):
+            conn.execute("ATTACH DATABASE ? AS legacy", (LEGACY_BANS_DB,))
+            try:
+                has_table = conn.execute(
+                    "SELECT 1 FROM legacy.sqlite_master WHERE type = 'table' AND name = 'bans'"
+                ).fetchone()
+                if has_table:
+                    conn.execute("INSERT OR IGNORE INTO bans SELECT * FROM legacy.bans")
+                    # Тот же участник в том же чате есть в обоих файлах: старый файл был рабочим,
+                    # поэтому его бан заменяет строку, если заканчивается позже (сроки — ISO-строки в GMT+2)
+                    conn.execute("""
+                        REPLACE INTO bans
+                        SELECT l.* FROM legacy.bans l
+                        JOIN bans b ON b.chat_id = l.chat_id AND b.banned_user_id = l.banned_user_id
+                        WHERE l.unban_time > b.unban_time
+                    """)
+                conn.execute("PRAGMA user_version = 1")
+                conn.commit()
+            finally:
+                conn.execute("DETACH DATABASE legacy")
+        else:
+            conn.execute("PRAGMA user_version = 1")
 
 
 def save_ban(
@@ -132,19 +98,17 @@ def save_ban(
     reason: str, duration: str, unban_time: str
 ):
     """Сохранение инфо о бане."""
-    db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'bans.db')
-    with sqlite3.connect(db_path) as conn:
-        conn.execute(
-            '''INSERT OR REPLACE INTO bans(
-                chat_id, group_name, admin_user_id, admin_username, admin_first_name, admin_last_name,
-                banned_user_id, banned_username, banned_first_name, banned_last_name, reason, duration, unban_time
-            ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-            (
-                chat_id, group_name, admin_user_id, admin_username, admin_first_name, admin_last_name,
-                banned_user_id, banned_username, banned_first_name, banned_last_name, reason, duration, unban_time
-            )
+    execute(
+        BANS_DB,
+        '''INSERT OR REPLACE INTO bans(
+            chat_id, group_name, admin_user_id, admin_username, admin_first_name, admin_last_name,
+            banned_user_id, banned_username, banned_first_name, banned_last_name, reason, duration, unban_time
+        ) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (
+            chat_id, group_name, admin_user_id, admin_username, admin_first_name, admin_last_name,
+            banned_user_id, banned_username, banned_first_name, banned_last_name, reason, duration, unban_time
         )
-        conn.commit()
+    )
 
 
 # Функция для определения цели бана.
@@ -162,13 +126,12 @@ async def resolve_target(message: Update.message, context: ContextTypes.DEFAULT_
         if DEBUG:
             print(f"[DEBUG] Обнаружено имя с '@': '{potential_target}', очищенное: '{username_clean}'")
         try:
-            loop = get_running_loop()
-            target_id = await loop.run_in_executor(None, get_user_id_by_username, username_clean)
+            target_id = await run_db(get_user_id_by_username, username_clean)
             if DEBUG:
                 print(f"[DEBUG] Результат get_user_id_by_username: {target_id}")
             if not target_id:
                 return None
-            member_obj = await context.bot.get_chat_member(chat.id, target_id)
+            member_obj = await get_chat_member(context.bot, chat.id, target_id)
             return member_obj.user
         except Exception as e:
             if DEBUG:
@@ -179,7 +142,7 @@ async def resolve_target(message: Update.message, context: ContextTypes.DEFAULT_
             target_id = int(potential_target)
             if DEBUG:
                 print(f"[DEBUG] Принят числовой ID: {target_id}")
-            member_obj = await context.bot.get_chat_member(chat.id, target_id)
+            member_obj = await get_chat_member(context.bot, chat.id, target_id)
             return member_obj.user
         except Exception as e:
             if DEBUG:
@@ -189,23 +152,22 @@ async def resolve_target(message: Update.message, context: ContextTypes.DEFAULT_
 
 # Функция для извлечения причины и срока бана.
 def extract_reason_and_duration(text: str):
-    """Извлечение причины и сроков из текста команды."""
-    time_pattern = re.compile(r'(\d+(?:r|mo|d|h|m|s))', re.IGNORECASE)
-    matches = list(time_pattern.finditer(text.replace('\n', ' ')))
-    if not matches:
+    """Извлечение причины и сроков из текста команды: (причина, срок по-русски, timedelta)."""
+    reason, tokens = find_duration(text)
+    if not tokens:
         raise ValueError("Не указан корректный срок бана (например: 7d, 1r2mo, 3h30m)")
-    units = [m.group(1) for m in matches]
-    reason = text
-    for u in units:
-        reason = reason.replace(u, '')
-    reason = reason.strip() or 'Без причины'
-    delta = parse_duration_string(''.join(units))
-    formatted_units = ' '.join(units)
-    return reason, formatted_units, delta
+    for amount, unit in tokens:
+        if unit == "mo" and amount > MAX_BAN_MONTHS:
+            raise ValueError(f"Неверное число месяцев (максимум {MAX_BAN_MONTHS})")
+        if unit == "s" and amount > MAX_BAN_SECONDS:
+            raise ValueError(f"Неверное число секунд (максимум {MAX_BAN_SECONDS})")
+    delta = datetime.timedelta(seconds=to_seconds(tokens))
+    return reason or 'Без причины', format_tokens(tokens), delta
 
 
 # Основная функция обработки команды !ban.
 @only_group_chats
+@send_priority(PRIORITY_MODERATION)
 async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if not message:
@@ -215,12 +177,12 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # 0. Проверка права бана
     try:
-        member = await context.bot.get_chat_member(chat.id, invoker.id)
+        member = await get_chat_member(context.bot, chat.id, invoker.id)
         is_owner = (member.status == ChatMember.OWNER)
     except Exception as e:
         await message.reply_text(f"❌ Не удалось проверить ваши права: {e}")
         return
-    if not is_owner and not has_access(chat.id, invoker.id, "!ban"):
+    if not is_owner and not await run_db(has_access, chat.id, invoker.id, "!ban"):
         await message.reply_text("⛔ У вас нет прав для бана.")
         return
 
@@ -235,8 +197,11 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if len(parts) < 3:
         await message.reply_text("❌ Укажите причину и срок бана. Пример: !ban @user Оскорбления 7d")
         return
-    reason, formatted_units, delta = extract_reason_and_duration(parts[2])
-    human_readable = format_duration_full(formatted_units)
+    try:
+        reason, human_readable, delta = extract_reason_and_duration(parts[2])
+    except ValueError as e:
+        await message.reply_text(f"❌ {e}")
+        return
 
     # 3. Вычисляем время окончания бана
     ban_until = datetime.datetime.now(datetime.timezone.utc) + delta
@@ -247,7 +212,7 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # 4. Проверяем уровни доступа
     try:
-        target_member = await context.bot.get_chat_member(chat.id, target_user.id)
+        target_member = await get_chat_member(context.bot, chat.id, target_user.id)
     except Exception as e:
         await message.reply_text(f"❌ Не удалось получить данные о пользователе: {e}")
         return
@@ -255,8 +220,8 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await message.reply_text("⛔ Нельзя забанить владельца группы.")
         return
 
-    inv_level = float('inf') if is_owner else get_user_max_role_level(chat.id, invoker.id)
-    tgt_level = get_user_max_role_level(chat.id, target_user.id)
+    inv_level = float('inf') if is_owner else await run_db(get_user_max_role_level, chat.id, invoker.id)
+    tgt_level = await run_db(get_user_max_role_level, chat.id, target_user.id)
     if not is_owner and inv_level >= tgt_level:
         await message.reply_text("⛔ Нельзя забанить пользователя с равным или более высоким уровнем доступа.")
         return
@@ -264,14 +229,15 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # 5. Выполняем бан
     try:
         await context.bot.ban_chat_member(chat.id, target_user.id, until_date=ban_until_ts)
+        invalidate_chat_member(chat.id, target_user.id)
     except Exception as e:
         await message.reply_text(f"❌ Не удалось забанить пользователя: {e}")
         return
 
     # 6. Сохраняем
     try:
-        init_bans_db()
-        save_ban(
+        await run_db(
+            save_ban,
             chat.id, chat.title,
             invoker.id, invoker.username or '', invoker.first_name or '', invoker.last_name or '',
             target_user.id, target_user.username or '', target_user.first_name or '', target_user.last_name or '',
@@ -280,9 +246,10 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception as e:
         if DEBUG:
             print(f"[DEBUG] Ошибка сохранения бана: {e}")
+    update_ban_stat(chat.id, invoker.id, invoker.username)
 
-    # 7. Планируем автоматический разбан
-    create_task(unban_after_delay(context, chat.id, target_user.id, int(delta.total_seconds())))
+    # 7. Планируем автоматический разбан (переживает перезапуск, см. ban_scheduler.py)
+    await schedule_unban(context.job_queue, chat.id, target_user.id, ban_until_ts)
 
     # 8. Уведомления
     inv_mention = f"@{invoker.username}" if invoker.username else mention_html(invoker.id, invoker.first_name)
@@ -305,6 +272,3 @@ async def ban_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except Exception:
         if DEBUG:
             print(f"[DEBUG] Не удалось отправить ЛС бана пользователю {target_user.id}")
-
-# Регистрация хэндлера
-ban_handler_obj = MessageHandler(filters.TEXT & filters.Regex(r"^!ban\b"), ban_handler)
@@ -2,6 +2,7 @@ from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatMem
 from telegram.ext import ContextTypes, MessageHandler, CallbackQueryHandler, filters
 
 from core.check_group_chat import only_group_chats
+from utils.db import run_db
 from handlers.admin.admin_access import has_access
 from handlers.admin.moderation_db import (
     role_exists,
@@ -15,10 +16,14 @@ from handlers.admin.moderation_db import (
     delete_custom_admin_role,
     remove_role_from_all_users
 )
+from utils.chat_members import get_chat_member
+from utils.rate_limiter import send_priority, PRIORITY_MODERATION
+from utils.panel_cache import PANEL_EDIT_ADMIN, render_cached, edit_panel, remember_shown
 
 
 # ХЭНДЛЕР: !edit-admin <роль> — Открывает меню редактирования прав
 @only_group_chats
+@send_priority(PRIORITY_MODERATION)
 async def edit_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if not message:
@@ -35,21 +40,21 @@ async def edit_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
     role = parts[1].strip().title()
 
     try:
-        member = await context.bot.get_chat_member(chat_id, user_id)
+        member = await get_chat_member(context.bot, chat_id, user_id)
         is_owner = member.status == ChatMember.OWNER
 
         if not is_owner:
-            if not has_access(chat_id, user_id, "!edit-admin"):
+            if not await run_db(has_access, chat_id, user_id, "!edit-admin"):
                 await message.reply_text("⛔ У вас нет доступа к редактированию ролей.")
                 return
 
-            user_roles = [r for _, r in get_all_user_roles(chat_id) if _ == user_id]
+            user_roles = [r for _, r in await run_db(get_all_user_roles, chat_id) if _ == user_id]
             if role in user_roles:
                 await message.reply_text("⛔ Вы не можете редактировать свою собственную роль.")
                 return
 
-            role_level = get_role_level(chat_id, role)
-            user_level = get_user_max_role_level(chat_id, user_id)
+            role_level = await run_db(get_role_level, chat_id, role)
+            user_level = await run_db(get_user_max_role_level, chat_id, user_id)
             if role_level <= user_level:
                 await message.reply_text("⛔ Вы не можете редактировать роли с таким же или более высоким уровнем доступа.")
                 return
@@ -58,7 +63,7 @@ async def edit_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await message.reply_text("❌ Не удалось проверить ваши права.")
         return
 
-    if not role_exists(chat_id, role):
+    if not await run_db(role_exists, chat_id, role):
         await message.reply_text(f"❌ Роль <b>{role}</b> не существует!", parse_mode="HTML")
         return
 
@@ -77,9 +82,29 @@ async def send_admin_permissions_message(
     per_row_cmds=4,      # Количество команд в ряд (до 8 кнопок в 1-м ряду)
     per_row_options=2    # Количество опций в ряд (до 8 кнопок в 1-м ряду)
 ):
+    # Панель перестраивается только после изменения ролей или прав в этой группе
+    header_text, keyboard = await render_cached(
+        PANEL_EDIT_ADMIN, chat_id, (role, panel_owner_id, per_row_cmds, per_row_options),
+        lambda: _build_admin_permissions_panel(chat_id, role, panel_owner_id, per_row_cmds, per_row_options)
+    )
+
+    # Отправка или обновление сообщения
+    if query:
+        await edit_panel(query, header_text, keyboard)
+    else:
+        message = await context.bot.send_message(
+            chat_id=chat_id,
+            text=header_text,
+            parse_mode="HTML",
+            reply_markup=keyboard
+        )
+        remember_shown(message, header_text, keyboard)
+
+
+async def _build_admin_permissions_panel(chat_id, role, panel_owner_id, per_row_cmds, per_row_options):
     # Не забываем про group.py
     ALL_COMMANDS = ["!ban", "!grant", "!edit-admin", "!new-role", "!remove-role", "!revoke", "!set-rules", "!del-rules", "!prefix"]
-    allowed = get_admin_permissions_for_role(chat_id, role)
+    allowed = await run_db(get_admin_permissions_for_role, chat_id, role)
 
     # 🧾 Формирование таблицы прав
     max_len = max(len(cmd) for cmd in ALL_COMMANDS) + 2
@@ -119,28 +144,16 @@ async def send_admin_permissions_message(
     keyboard = InlineKeyboardMarkup(command_buttons)
 
     # Получаем уровень доступа роли
-    lvl = get_role_level(chat_id, role)
+    lvl = await run_db(get_role_level, chat_id, role)
 
     # Формируем текст с отображением уровня, как в view_admins.py
     header_text = f"📋 Права роли <b>{role}</b> (lvl {lvl}):\n\n{table}"
 
-    # Отправка или обновление сообщения
-    if query:
-        await query.edit_message_text(
-            text=header_text,
-            parse_mode="HTML",
-            reply_markup=keyboard
-        )
-    else:
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=header_text,
-            parse_mode="HTML",
-            reply_markup=keyboard
-        )
+    return header_text, keyboard
 
 
 # ✅ Callback: Переключение прав
+@send_priority(PRIORITY_MODERATION)
 async def toggle_permission_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     if not query:
@@ -169,25 +182,25 @@ async def toggle_permission_callback(update: Update, context: ContextTypes.DEFAU
         return
 
     try:
-        member = await context.bot.get_chat_member(chat_id, user_id)
+        member = await get_chat_member(context.bot, chat_id, user_id)
         is_owner = member.status == ChatMember.OWNER
 
         if not is_owner:
-            if not has_access(chat_id, user_id, "!edit-admin"):
+            if not await run_db(has_access, chat_id, user_id, "!edit-admin"):
                 await query.answer("⛔ Нет доступа", show_alert=True)
                 return
 
-            if not has_access(chat_id, user_id, command):
+            if not await run_db(has_access, chat_id, user_id, command):
                 await query.answer(f"⛔ Нет доступа к {command}", show_alert=True)
                 return
 
-            user_roles = [r for _, r in get_all_user_roles(chat_id) if _ == user_id]
+            user_roles = [r for _, r in await run_db(get_all_user_roles, chat_id) if _ == user_id]
             if role in user_roles:
                 await query.answer("⛔ Нельзя редактировать свою роль", show_alert=True)
                 return
 
-            role_level = get_role_level(chat_id, role)
-            user_level = get_user_max_role_level(chat_id, user_id)
+            role_level = await run_db(get_role_level, chat_id, role)
+            user_level = await run_db(get_user_max_role_level, chat_id, user_id)
             if role_level <= user_level:
                 await query.answer("⛔ Недостаточно уровня доступа", show_alert=True)
                 return
@@ -197,7 +210,7 @@ async def toggle_permission_callback(update: Update, context: ContextTypes.DEFAU
         return
 
     # ✅ Меняем разрешение в базе
-    toggle_admin_permission(chat_id, role, command)
+    await run_db(toggle_admin_permission, chat_id, role, command)
 
     # ✅ Обновляем UI как в edit_admin_handler — через ту же функцию
     await send_admin_permissions_message(
@@ -211,6 +224,7 @@ async def toggle_permission_callback(update: Update, context: ContextTypes.DEFAU
 
 
 # 📥 Callback: выбор ✏ Название / 🔢 Уровень
+@send_priority(PRIORITY_MODERATION)
 async def edit_admin_option_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = query.from_user.id
@@ -242,6 +256,7 @@ async def edit_admin_option_callback(update: Update, context: ContextTypes.DEFAU
 
 # 📤 Обработка текстового ответа
 # Обработка текстового ответа при редактировании (имени или уровня)
+@send_priority(PRIORITY_MODERATION)
 async def edit_admin_text_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     user_id = update.effective_user.id
@@ -268,10 +283,10 @@ async def edit_admin_text_handler(update: Update, context: ContextTypes.DEFAULT_
         return
 
     # 2) Проверка прав администратора
-    member = await context.bot.get_chat_member(chat_id, user_id)
+    member = await get_chat_member(context.bot, chat_id, user_id)
     is_owner = (member.status == ChatMember.OWNER)
     if not is_owner:
-        admin_level = get_user_max_role_level(chat_id, user_id)
+        admin_level = await run_db(get_user_max_role_level, chat_id, user_id)
         # Блокируем, если админ пытается назначить уровень
         # **меньше или равный** своему (численно ≤)
         if level <= admin_level:
@@ -281,7 +296,7 @@ async def edit_admin_text_handler(update: Update, context: ContextTypes.DEFAULT_
             return
 
     # 3) Собственно обновляем уровень
-    update_role_level(chat_id, role, level)
+    await run_db(update_role_level, chat_id, role, level)
     await message.reply_text(
         f"✅ Уровень роли <b>{role}</b> обновлён до <b>{level}</b>.",
         parse_mode="HTML"
@@ -293,6 +308,7 @@ async def edit_admin_text_handler(update: Update, context: ContextTypes.DEFAULT_
     context.user_data.pop("edit_admin_owner", None)
 
 
+@send_priority(PRIORITY_MODERATION)
 async def delete_role_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     if not query:
@@ -310,13 +326,13 @@ async def delete_role_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         return
 
     # Проверяем существование роли
-    if not role_exists(chat_id, role):
+    if not await run_db(role_exists, chat_id, role):
         await query.answer("❌ Роль не существует.", show_alert=True)
         return
 
     # Получаем статус и уровни
     try:
-        member = await context.bot.get_chat_member(chat_id, user_id)
+        member = await get_chat_member(context.bot, chat_id, user_id)
         is_owner = member.status == ChatMember.OWNER
     except Exception:
         await query.answer("❌ Не удалось проверить ваши права.", show_alert=True)
@@ -324,18 +340,18 @@ async def delete_role_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 
     # Если не владелец, применяем проверку уровней как в remove_role.py
     if not is_owner:
-        if not has_access(chat_id, user_id, "!remove-role"):
+        if not await run_db(has_access, chat_id, user_id, "!remove-role"):
             await query.answer("⛔ У вас нет прав для удаления ролей.", show_alert=True)
             return
 
         # Нельзя удалять собственную роль
-        user_roles = [r for uid, r in get_all_user_roles(chat_id) if uid == user_id]
+        user_roles = [r for uid, r in await run_db(get_all_user_roles, chat_id) if uid == user_id]
         if role in user_roles:
             await query.answer("⛔ Вы не можете удалить свою собственную роль.", show_alert=True)
             return
 
-        target_level = get_role_level(chat_id, role)
-        user_level = get_user_max_role_level(chat_id, user_id)
+        target_level = await run_db(get_role_level, chat_id, role)
+        user_level = await run_db(get_user_max_role_level, chat_id, user_id)
         # Блокируем, если уровень пользователя не выше цели
         if user_level >= target_level:
             await query.answer(
@@ -356,6 +372,7 @@ async def delete_role_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 
 
 # Callback: Подтверждение удаления
+@send_priority(PRIORITY_MODERATION)
 async def confirm_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     if not query:
@@ -373,18 +390,19 @@ async def confirm_delete_callback(update: Update, context: ContextTypes.DEFAULT_
         return
 
     # Проверяем, что роль ещё существует
-    if not role_exists(chat_id, role):
+    if not await run_db(role_exists, chat_id, role):
         await query.edit_message_text(f"❌ Роль <b>{role}</b> уже не существует.", parse_mode="HTML")
         return
 
     # Удаляем роль и все назначения
-    delete_custom_admin_role(chat_id, role)
-    remove_role_from_all_users(chat_id, role)
+    await run_db(delete_custom_admin_role, chat_id, role)
+    await run_db(remove_role_from_all_users, chat_id, role)
 
     await query.edit_message_text(f"🗑️ Роль <b>{role}</b> успешно удалена.", parse_mode="HTML")
 
 
 # Callback для отмены удаления
+@send_priority(PRIORITY_MODERATION)
 async def cancel_delete_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     if not query:
@@ -406,5 +424,4 @@ confirm_delete_cb_obj = CallbackQueryHandler(confirm_delete_callback, pattern=r"
 # Регистрируем обработчик для отмены удаления
 cancel_delete_cb_obj = CallbackQueryHandler(cancel_delete_callback, pattern=r"^cancel_del\|")
 
-edit_admin_handler_obj = MessageHandler(filters.Regex(r"^!edit-admin\b"), edit_admin_handler)
 edit_admin_toggle_cb_obj = CallbackQueryHandler(toggle_permission_callback, pattern=r"^toggle\|")
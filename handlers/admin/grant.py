@@ -1,7 +1,7 @@
 from telegram import Update, ChatMember
-from telegram.ext import ContextTypes, MessageHandler, filters
+from telegram.ext import ContextTypes
 from handlers.admin.moderation_db import (
-    assign_user_to_role, role_exists, init_user_roles_db,
+    assign_user_to_role, role_exists,
     get_user_roles, get_role_level, get_user_max_role_level
 )
 from handlers.admin.admin_access import has_access
@@ -9,12 +9,14 @@ from telegram.helpers import mention_html
 import re
 
 from utils.users import get_user_id_by_username
+from utils.db import run_db
 from core.check_group_chat import only_group_chats
-
-init_user_roles_db()
+from utils.chat_members import get_chat_member
+from utils.rate_limiter import send_priority, PRIORITY_MODERATION
 
 
 @only_group_chats
+@send_priority(PRIORITY_MODERATION)
 async def grant_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if not message:
@@ -24,9 +26,9 @@ async def grant_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     user = update.effective_user
 
     try:
-        member = await context.bot.get_chat_member(chat.id, user.id)
+        member = await get_chat_member(context.bot, chat.id, user.id)
         is_owner = member.status == ChatMember.OWNER
-        if not is_owner and not has_access(chat.id, user.id, "!grant"):
+        if not is_owner and not await run_db(has_access, chat.id, user.id, "!grant"):
             await message.reply_text("⛔ У вас нет доступа к этой команде.")
             return
     except Exception:
@@ -51,18 +53,18 @@ async def grant_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
         if target.startswith("@"):
             username = target[1:]
-            target_user_id = get_user_id_by_username(username)
+            target_user_id = await run_db(get_user_id_by_username, username)
             if not target_user_id:
                 await message.reply_text("❌ Пользователь не найден.")
                 return
             try:
-                target_user = (await context.bot.get_chat_member(chat.id, target_user_id)).user
+                target_user = (await get_chat_member(context.bot, chat.id, target_user_id)).user
             except Exception:
                 await message.reply_text("❌ Пользователь не найден в чате.")
                 return
         elif target.isdigit():
             try:
-                target_user = (await context.bot.get_chat_member(chat.id, int(target))).user
+                target_user = (await get_chat_member(context.bot, chat.id, int(target))).user
             except Exception:
                 await message.reply_text("❌ Пользователь не найден в чате.")
                 return
@@ -70,30 +72,26 @@ async def grant_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             await message.reply_text("Неверный формат идентификатора пользователя. Укажите @username или числовой ID.")
             return
 
-    if not role_exists(chat.id, role):
+    if not await run_db(role_exists, chat.id, role):
         await message.reply_text(f"❌ Роль <b>{role}</b> не существует!", parse_mode="HTML")
         return
 
     # Проверяем, назначена ли уже данная роль у целевого пользователя
-    target_roles = get_user_roles(chat.id, target_user.id)
+    target_roles = await run_db(get_user_roles, chat.id, target_user.id)
     if role in target_roles:
         await message.reply_text("❌ Данный пользователь уже имеет эту роль.")
         return
 
     # Проверка прав на выдачу: если вызывающий не владелец,
     # его эффективный уровень определяется как минимальный из всех его ролей.
-    my_level = get_user_max_role_level(chat.id, user.id)
-    role_level = get_role_level(chat.id, role)
+    my_level = await run_db(get_user_max_role_level, chat.id, user.id)
+    role_level = await run_db(get_role_level, chat.id, role)
     if not is_owner and role_level <= my_level:
         await message.reply_text("⛔ Вы не можете выдать роль с таким же или более высоким уровнем доступа.")
         return
 
     # Выдаем роль: добавляем новую запись в таблицу user_roles
-    assign_user_to_role(chat.id, target_user.id, role)
+    await run_db(assign_user_to_role, chat.id, target_user.id, role)
     await message.reply_html(
         f"✅ Роль <b>{role}</b> успешно выдана пользователю {mention_html(target_user.id, target_user.full_name)}!"
     )
-
-grant_admin_handler_obj = MessageHandler(
-    filters.TEXT & filters.Regex(r"^!grant\b"), grant_admin_handler
-)
@@ -1,11 +1,13 @@
 from telegram import Update, ChatMember
-from telegram.ext import ContextTypes, MessageHandler, filters
-from handlers.admin.moderation_db import create_custom_admin, init_moderation_db, get_user_max_role_level
+from telegram.ext import ContextTypes
+from handlers.admin.moderation_db import create_custom_admin, get_user_max_role_level
 from handlers.admin.admin_access import has_permission_to_create_admin
-
-init_moderation_db()  # Вызов при импорте
+from utils.db import run_db
+from utils.chat_members import get_chat_member
+from utils.rate_limiter import send_priority, PRIORITY_MODERATION
 
 
+@send_priority(PRIORITY_MODERATION)
 async def new_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if not message:
@@ -16,9 +18,9 @@ async def new_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Проверка: является ли user владельцем или имеет право
     try:
-        member = await context.bot.get_chat_member(chat.id, user.id)
+        member = await get_chat_member(context.bot, chat.id, user.id)
         is_owner = member.status == ChatMember.OWNER
-        if not is_owner and not has_permission_to_create_admin(chat.id, user.id):
+        if not is_owner and not await run_db(has_permission_to_create_admin, chat.id, user.id):
             await message.reply_text("⛔ У вас нет доступа к созданию кастомных ролей.")
             return
     except Exception:
@@ -43,18 +45,13 @@ async def new_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Проверка: пользователь не может создать роль с уровнем равным или выше своего
     if not is_owner:
-        user_level = get_user_max_role_level(chat.id, user.id)
+        user_level = await run_db(get_user_max_role_level, chat.id, user.id)
         if level <= user_level:
             await message.reply_text(f"⛔ Вы не можете создать роль с уровнем {level}, уровни которые вы можете создать: {user_level + 1} и ниже.")
             return
 
-    success = create_custom_admin(chat.id, role_title, user.id, level)
+    success = await run_db(create_custom_admin, chat.id, role_title, user.id, level)
     if success:
         await message.reply_text(f"✅ Роль <b>{role_title}</b> (lvl {level}) создана!", parse_mode="HTML")
     else:
         await message.reply_text(f"❌ Роль <b>{role_title}</b> уже существует!", parse_mode="HTML")
-
-
-new_admin_handler_obj = MessageHandler(
-    filters.TEXT & filters.Regex(r"^!new-role"), new_admin_handler
-)
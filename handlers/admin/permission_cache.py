@@ -0,0 +1,163 @@
+import threading
+
+from utils.db import MODERATION_DB, fetchall
+
+# Уровни по умолчанию (совпадают с прежними SQL-запросами moderation_db)
+NO_ROLE_LEVEL = 100       # get_user_max_role_level: у пользователя нет ролей
+UNKNOWN_ROLE_LEVEL = 99   # get_role_level / get_highest_admin_level: роль не найдена
+
+# Глобальная нумерация команд: команда -> номер бита в маске прав
+_command_bits: dict[str, int] = {}
+
+# Снимки прав по группам: chat_id -> _ChatSnapshot
+_snapshots: dict[int, "_ChatSnapshot"] = {}
+_lock = threading.RLock()
+
+
+def _command_bit(command: str) -> int:
+    bit = _command_bits.get(command)
+    if bit is None:
+        bit = _command_bits[command] = len(_command_bits)
+    return bit
+
+
+class _ChatSnapshot:
+    """
+    Права и уровни ролей одной группы в памяти.
+    Для каждого пользователя лениво собирается (компилируется) запись:
+    маска разрешённых команд + минимальные уровни его ролей.
+    """
+
+    def __init__(self, role_levels: dict, role_masks: dict, user_roles: dict):
+        self.role_levels = role_levels   # роль -> уровень (custom_admins)
+        self.role_masks = role_masks     # роль -> маска команд (admin_permissions)
+        self.user_roles = user_roles     # user_id -> set ролей (user_roles)
+        self.compiled: dict[int, tuple] = {}
+
+    def compile(self, user_id: int) -> tuple:
+        """
+        (маска прав, максимальный уровень роли, наивысший уровень админа) пользователя.
+        """
+        entry = self.compiled.get(user_id)
+        if entry is not None:
+            return entry
+
+        mask = 0
+        max_role_level = NO_ROLE_LEVEL
+        highest_level = UNKNOWN_ROLE_LEVEL
+        for role in self.user_roles.get(user_id, ()):
+            mask |= self.role_masks.get(role, 0)
+            level = self.role_levels.get(role)
+            if level is not None:
+                max_role_level = min(max_role_level, level)
+            highest_level = min(highest_level, UNKNOWN_ROLE_LEVEL if level is None else level)
+
+        entry = self.compiled[user_id] = (mask, max_role_level, highest_level)
+        return entry
+
+
+def _load_snapshot(chat_id: int) -> _ChatSnapshot:
+    role_levels = dict(fetchall(MODERATION_DB, "SELECT title, level FROM custom_admins WHERE group_id = ?", (chat_id,)))
+
+    role_masks = {}
+    for role, command in fetchall(MODERATION_DB, "SELECT role, command FROM admin_permissions WHERE chat_id = ?", (chat_id,)):
+        role_masks[role] = role_masks.get(role, 0) | (1 << _command_bit(command))
+
+    user_roles = {}
+    for user_id, role in fetchall(MODERATION_DB, "SELECT user_id, role FROM user_roles WHERE chat_id = ?", (chat_id,)):
+        user_roles.setdefault(user_id, set()).add(role)
+
+    return _ChatSnapshot(role_levels, role_masks, user_roles)
+
+
+def _get_snapshot(chat_id: int) -> _ChatSnapshot:
+    snapshot = _snapshots.get(chat_id)
+    if snapshot is None:
+        snapshot = _snapshots[chat_id] = _load_snapshot(chat_id)
+    return snapshot
+
+
+# 📌 Чтение из снимка
+
+def user_has_command(chat_id: int, user_id: int, command: str) -> bool:
+    bit = _command_bits.get(command)
+    with _lock:
+        snapshot = _get_snapshot(chat_id)
+        if bit is None:
+            # Команда могла впервые встретиться только что при загрузке снимка
+            bit = _command_bits.get(command)
+            if bit is None:
+                return False
+        return bool(snapshot.compile(user_id)[0] >> bit & 1)
+
+
+def user_max_role_level(chat_id: int, user_id: int) -> int:
+    with _lock:
+        return _get_snapshot(chat_id).compile(user_id)[1]
+
+
+def user_highest_admin_level(chat_id: int, user_id: int) -> int:
+    with _lock:
+        return _get_snapshot(chat_id).compile(user_id)[2]
+
+
+def user_roles(chat_id: int, user_id: int) -> list[str]:
+    with _lock:
+        return list(_get_snapshot(chat_id).user_roles.get(user_id, ()))
+
+
+def role_level(chat_id: int, role: str) -> int:
+    with _lock:
+        return _get_snapshot(chat_id).role_levels.get(role, UNKNOWN_ROLE_LEVEL)
+
+
+# 📌 Точечная инвалидация (вызывается из moderation_db после записи в базу)
+
+def on_user_role_changed(chat_id: int, user_id: int, role: str, granted: bool):
+    """
+    Роль выдана или снята у одного пользователя: правим его набор ролей и
+    перекомпилируем только его запись.
+    """
+    with _lock:
+        snapshot = _snapshots.get(chat_id)
+        if snapshot is None:
+            return
+        roles = snapshot.user_roles.setdefault(user_id, set())
+        if granted:
+            roles.add(role)
+        else:
+            roles.discard(role)
+            if not roles:
+                del snapshot.user_roles[user_id]
+        snapshot.compiled.pop(user_id, None)
+
+
+def on_permission_toggled(chat_id: int, role: str, command: str, allowed: bool):
+    """
+    У роли включили/выключили команду: меняем маску роли и сбрасываем
+    скомпилированные записи только у держателей этой роли.
+    """
+    with _lock:
+        snapshot = _snapshots.get(chat_id)
+        if snapshot is None:
+            return
+        bit = 1 << _command_bit(command)
+        mask = snapshot.role_masks.get(role, 0)
+        snapshot.role_masks[role] = mask | bit if allowed else mask & ~bit
+        for user_id, roles in snapshot.user_roles.items():
+            if role in roles:
+                snapshot.compiled.pop(user_id, None)
+
+
+def invalidate_chat(chat_id: int):
+    """
+    Структурные изменения ролей (создание, удаление, переименование, смена уровня):
+    снимок группы перечитывается при следующем обращении.
+    """
+    with _lock:
+        _snapshots.pop(chat_id, None)
+
+
+def clear():
+    with _lock:
+        _snapshots.clear()
@@ -1,5 +1,5 @@
 from telegram import Update, ChatMember, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import ContextTypes, MessageHandler, CallbackQueryHandler, filters
+from telegram.ext import ContextTypes, CallbackQueryHandler
 from telegram.helpers import mention_html
 
 from core.check_group_chat import only_group_chats
@@ -12,9 +12,13 @@ from handlers.admin.moderation_db import (
     get_user_max_role_level
 )
 from handlers.admin.admin_access import has_access
+from utils.db import run_db
+from utils.chat_members import get_chat_member
+from utils.rate_limiter import send_priority, PRIORITY_MODERATION
 
 
 @only_group_chats
+@send_priority(PRIORITY_MODERATION)
 async def remove_admin_role_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if not message:
@@ -25,14 +29,14 @@ async def remove_admin_role_handler(update: Update, context: ContextTypes.DEFAUL
 
     # Сначала проверим права пользователя (даже до разбора команды)
     try:
-        member = await context.bot.get_chat_member(chat.id, user.id)
+        member = await get_chat_member(context.bot, chat.id, user.id)
     except Exception:
         await message.reply_text("❌ Не удалось проверить ваши права.")
         return
 
     is_owner = member.status == ChatMember.OWNER
     if not is_owner:
-        if not has_access(chat.id, user.id, "!remove-role"):
+        if not await run_db(has_access, chat.id, user.id, "!remove-role"):
             await message.reply_text("⛔ У вас нет прав для удаления ролей.")
             return
 
@@ -48,13 +52,13 @@ async def remove_admin_role_handler(update: Update, context: ContextTypes.DEFAUL
     try:
         if not is_owner:
             # Нельзя удалять собственную роль
-            user_roles = [r for uid, r in get_all_user_roles(chat.id) if uid == user.id]
+            user_roles = [r for uid, r in await run_db(get_all_user_roles, chat.id) if uid == user.id]
             if role in user_roles:
                 await message.reply_text("⛔ Вы не можете удалить свою собственную роль.")
                 return
 
-            target_level = get_role_level(chat.id, role)
-            user_level = get_user_max_role_level(chat.id, user.id)
+            target_level = await run_db(get_role_level, chat.id, role)
+            user_level = await run_db(get_user_max_role_level, chat.id, user.id)
 
             # Блокируем, если пользователь не выше цели (правильная проверка уровней)
             if user_level >= target_level:
@@ -66,7 +70,7 @@ async def remove_admin_role_handler(update: Update, context: ContextTypes.DEFAUL
         await message.reply_text("❌ Не удалось проверить ваши права.")
         return
 
-    if not role_exists(chat.id, role):
+    if not await run_db(role_exists, chat.id, role):
         await message.reply_text(f"❌ Роль <b>{role}</b> не найдена.", parse_mode="HTML")
         return
 
@@ -85,6 +89,7 @@ async def remove_admin_role_handler(update: Update, context: ContextTypes.DEFAUL
     await message.reply_text(confirmation_text, parse_mode="HTML", reply_markup=keyboard)
 
 
+@send_priority(PRIORITY_MODERATION)
 async def confirm_remove_role_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     if not query:
@@ -105,16 +110,17 @@ async def confirm_remove_role_callback(update: Update, context: ContextTypes.DEF
         await query.answer("⛔ Только вызывающий может подтвердить удаление.", show_alert=True)
         return
 
-    if not role_exists(chat_id, role):
+    if not await run_db(role_exists, chat_id, role):
         await query.edit_message_text(f"❌ Роль <b>{role}</b> уже не существует.", parse_mode="HTML")
         return
 
-    delete_custom_admin_role(chat_id, role)
-    remove_role_from_all_users(chat_id, role)
+    await run_db(delete_custom_admin_role, chat_id, role)
+    await run_db(remove_role_from_all_users, chat_id, role)
 
     await query.edit_message_text(f"🗑 Роль <b>{role}</b> успешно удалена.", parse_mode="HTML")
 
 
+@send_priority(PRIORITY_MODERATION)
 async def cancel_remove_role_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     if not query:
@@ -123,9 +129,5 @@ async def cancel_remove_role_callback(update: Update, context: ContextTypes.DEFA
     await query.edit_message_text("❌ Удаление отменено.")
 
 
-remove_admin_role_handler_obj = MessageHandler(
-    filters.TEXT & filters.Regex(r"^!remove-role"), remove_admin_role_handler
-)
-
 confirm_remove_role_cb_obj = CallbackQueryHandler(confirm_remove_role_callback, pattern=r"^confirm_del_role\|")
 cancel_remove_role_cb_obj = CallbackQueryHandler(cancel_remove_role_callback, pattern=r"^cancel_del_role\|")
@@ -1,27 +1,19 @@
-import sqlite3
-import os
 from telegram import Update, ChatMember
-from telegram.ext import ContextTypes, MessageHandler, filters
+from telegram.ext import ContextTypes
 from telegram.helpers import mention_html
 from utils.users import get_user_id_by_username
+from utils.db import run_db
 
-from handlers.admin.moderation_db import get_user_roles, get_role_level, get_user_max_role_level
+from handlers.admin.moderation_db import (
+    get_user_roles, get_role_level, get_user_max_role_level, remove_role_from_user
+)
 from handlers.admin.admin_access import has_access
-
-
-# Функция для удаления роли у конкретного пользователя
-def remove_role_from_user(chat_id: int, user_id: int, role: str):
-    # Используем фиксированный путь, как в других модулях
-    DB_PATH = os.path.join("database", "moderation.db")
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.execute(
-            "DELETE FROM user_roles WHERE chat_id=? AND user_id=? AND role=?",
-            (chat_id, user_id, role)
-        )
-        conn.commit()
+from utils.chat_members import get_chat_member
+from utils.rate_limiter import send_priority, PRIORITY_MODERATION
 
 
 # Основной обработчик команды !revoke
+@send_priority(PRIORITY_MODERATION)
 async def revoke_role_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if not message:
@@ -32,14 +24,14 @@ async def revoke_role_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     # 1) Проверяем статус в чате
     try:
-        invoker_member = await context.bot.get_chat_member(chat.id, invoker.id)
+        invoker_member = await get_chat_member(context.bot, chat.id, invoker.id)
     except Exception:
         await message.reply_text("❌ Не удалось проверить ваши права.")
         return
     is_owner = invoker_member.status == ChatMember.OWNER
 
     # 2) Если не владелец — проверяем через has_access
-    if not is_owner and not has_access(chat.id, invoker.id, "!revoke"):
+    if not is_owner and not await run_db(has_access, chat.id, invoker.id, "!revoke"):
         await message.reply_text("⛔ У вас нет прав для снятия ролей.")
         return
 
@@ -62,19 +54,19 @@ async def revoke_role_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         # Определяем целевого пользователя по @username или ID
         if target.startswith("@"):
             username = target[1:]
-            target_user_id = get_user_id_by_username(username)
+            target_user_id = await run_db(get_user_id_by_username, username)
             if not target_user_id:
                 await message.reply_text("❌ Пользователь не найден в базе. Он ещё не писал в чат.")
                 return
             try:
-                target_user = (await context.bot.get_chat_member(chat.id, target_user_id)).user
+                target_user = (await get_chat_member(context.bot, chat.id, target_user_id)).user
             except Exception:
                 await message.reply_text("❌ Пользователь не найден в чате.")
                 return
         elif target.isdigit():
             target_user_id = int(target)
             try:
-                target_user = (await context.bot.get_chat_member(chat.id, target_user_id)).user
+                target_user = (await get_chat_member(context.bot, chat.id, target_user_id)).user
             except Exception:
                 await message.reply_text("❌ Пользователь не найден в чате.")
                 return
@@ -83,25 +75,22 @@ async def revoke_role_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
             return
 
     # Проверяем, назначена ли указанная роль у целевого пользователя
-    target_roles = get_user_roles(chat.id, target_user.id)
+    target_roles = await run_db(get_user_roles, chat.id, target_user.id)
     if role not in target_roles:
         await message.reply_text("❌ У данного пользователя нет такой роли.")
         return
 
     # Проверка прав на снятие: если вызывающий не владелец,
     # то его максимальный уровень должен быть выше (т.е. числово меньше) уровня удаляемой роли
-    target_role_level = get_role_level(chat.id, role)
-    invoker_max_level = get_user_max_role_level(chat.id, invoker.id)
+    target_role_level = await run_db(get_role_level, chat.id, role)
+    invoker_max_level = await run_db(get_user_max_role_level, chat.id, invoker.id)
     if not is_owner and target_role_level <= invoker_max_level:
         await message.reply_text("⛔ Вы не можете снять роль с таким же или более высоким уровнем доступа.")
         return
 
     # Снимаем роль: удаляем запись из таблицы user_roles для данного пользователя и роли
-    remove_role_from_user(chat.id, target_user.id, role)
+    await run_db(remove_role_from_user, chat.id, target_user.id, role)
 
     invoker_mention = f"@{invoker.username}" if invoker.username else mention_html(invoker.id, invoker.first_name)
     target_mention = f"@{target_user.username}" if target_user.username else mention_html(target_user.id, target_user.first_name)
     await message.reply_html(f"✅ Роль <b>{role}</b> была снята у {target_mention} Администратором {invoker_mention}!")
-
-# Регистрация хэндлера для команды !revoke
-revoke_role_handler_obj = MessageHandler(filters.TEXT & filters.Regex(r"^!revoke\b"), revoke_role_handler)
@@ -1,46 +1,109 @@
 import re
 import json
+import os
 from datetime import datetime
 from telegram import Update
 from telegram.ext import (
     ContextTypes
 )
 
+from utils.db import CHAT_HISTORY_DB, DB_DIR, transaction, fetchall, execute, run_db
+
 import logging
 logger = logging.getLogger(__name__)
 
 ADMIN_ID = 5403794760  # Замените на ваш реальный ID
-CHAT_HISTORY_FILE = "database/chat_history.json"
+# Старый формат истории: один JSON-массив, переписывался целиком на каждое сообщение
+CHAT_HISTORY_FILE = os.path.join(DB_DIR, "chat_history.json")
+
+
+def init_chat_history_db():
+    """
+    Создаёт таблицу истории ЛС (только добавление строк, индекс по пользователю и времени).
+    При первом запуске переносит в неё записи из chat_history.json.
+    """
+    with transaction(CHAT_HISTORY_DB) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS chat_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                sender_id TEXT,
+                sender_name TEXT,
+                timestamp TEXT,
+                message_type TEXT,
+                content TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_history_user ON chat_history(user_id, timestamp)")
+
+        if conn.execute("SELECT 1 FROM chat_history LIMIT 1").fetchone() is None:
+            conn.executemany("""
+                INSERT INTO chat_history (user_id, sender_id, sender_name, timestamp, message_type, content)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, _load_legacy_history())
+
+
+def _load_legacy_history() -> list:
+    try:
+        with open(CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
+            logs = json.load(f)
+    except Exception:
+        return []
+
+    rows = []
+    for entry in logs:
+        try:
+            user_id = int(entry.get("user_id"))
+        except (TypeError, ValueError):
+            continue
+        # Самые ранние записи хранили username/full_name вместо sender_id/sender_name
+        rows.append((
+            user_id,
+            str(entry.get("sender_id", user_id)),
+            entry.get("sender_name") or entry.get("full_name") or entry.get("username") or "",
+            entry.get("timestamp"),
+            entry.get("message_type"),
+            entry.get("content")
+        ))
+    return rows
 
 
 def log_message(user_id: int, sender_id: str, sender_name: str, message_type: str, content: str):
     """
-    Записывает сообщение в chat_history.json.
+    Добавляет сообщение в историю ЛС (одна вставка, без перечитывания истории).
     - user_id: ID пользователя, чей диалог с ботом ведётся
     - sender_id: 'BOT' (или 'ADMIN'), либо реальный ID пользователя, который отправил сообщение
     - sender_name: имя отправителя (для бота можно указать 'BOT')
     - message_type: тип сообщения ('text', 'photo', 'video', 'document', 'other')
     - content: текст сообщения или краткое описание (например '[Фото]')
     """
-    log_entry = {
-        "user_id": str(user_id),
-        "sender_id": str(sender_id),
-        "sender_name": sender_name,
-        "timestamp": datetime.utcnow().isoformat(),
-        "message_type": message_type,
-        "content": content
-    }
+    execute(CHAT_HISTORY_DB, """
+        INSERT INTO chat_history (user_id, sender_id, sender_name, timestamp, message_type, content)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (int(user_id), str(sender_id), sender_name, datetime.utcnow().isoformat(), message_type, content))
 
-    try:
-        with open(CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except Exception:
-        logs = []
 
-    logs.append(log_entry)
+def get_chat_history(user_id: int) -> list:
+    """
+    Переписка с одним пользователем по времени: [(timestamp, sender_name, message_type, content), ...]
+    Читаются только строки этого пользователя (по индексу).
+    """
+    return fetchall(CHAT_HISTORY_DB, """
+        SELECT timestamp, sender_name, message_type, content
+        FROM chat_history WHERE user_id = ?
+        ORDER BY timestamp, id
+    """, (user_id,))
+
 
-    with open(CHAT_HISTORY_FILE, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2, ensure_ascii=False)
+def get_chat_users() -> list:
+    """
+    Все пользователи из истории ЛС с именем отправителя из их первой записи: [(user_id, sender_name), ...]
+    """
+    return fetchall(CHAT_HISTORY_DB, """
+        SELECT user_id, sender_name FROM chat_history
+        WHERE id IN (SELECT MIN(id) FROM chat_history GROUP BY user_id)
+        ORDER BY id
+    """)
 
 
 async def private_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -73,7 +136,8 @@ async def private_message_handler(update: Update, context: ContextTypes.DEFAULT_
             content = "[Другое]"
 
         # 1) Логируем входящее сообщение от пользователя
-        log_message(
+        await run_db(
+            log_message,
             user_id=user.id,
             sender_id=user.id,
             sender_name=user.full_name,
@@ -96,7 +160,8 @@ async def private_message_handler(update: Update, context: ContextTypes.DEFAULT_
         sent_msg = await update.message.reply_text(auto_reply_text)
 
         # Логируем автоответ бота
-        log_message(
+        await run_db(
+            log_message,
             user_id=user.id,
             sender_id="BOT",
             sender_name="BOT",
@@ -134,7 +199,8 @@ async def reply_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         target_name = getattr(target_chat, "full_name", None) or target_chat.title or "Неизвестно"
         await update.message.reply_text(f"Сообщение отправлено пользователю {target_name} (ID: {user_id})!")
         # Логируем отправленное сообщение от бота пользователю
-        log_message(
+        await run_db(
+            log_message,
             user_id=user_id,
             sender_id="BOT",
             sender_name="BOT",
@@ -185,8 +251,9 @@ async def send_photo_caption_handler(update: Update, context: ContextTypes.DEFAU
         target_chat = await context.bot.get_chat(user_id)
         target_name = getattr(target_chat, "full_name", None) or target_chat.title or "Неизвестно"
         await update.message.reply_text(f"Фото отправлено пользователю {target_name} (ID: {user_id})!")
-        # Логирование (функция log_message должна быть определена)
-        log_message(
+        # Логирование
+        await run_db(
+            log_message,
             user_id=user_id,
             sender_id="BOT",
             sender_name="BOT",
@@ -239,8 +306,9 @@ async def send_video_caption_handler(update: Update, context: ContextTypes.DEFAU
         target_chat = await context.bot.get_chat(user_id)
         target_name = getattr(target_chat, "full_name", None) or target_chat.title or "Неизвестно"
         await update.message.reply_text(f"Видео отправлено пользователю {target_name} (ID: {user_id})!")
-        # Логирование (функция log_message должна быть определена)
-        log_message(
+        # Логирование
+        await run_db(
+            log_message,
             user_id=user_id,
             sender_id="BOT",
             sender_name="BOT",
@@ -264,23 +332,11 @@ async def export_users_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("У вас нет прав для использования этой команды.")
         return
 
-    try:
-        with open(CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except Exception:
-        logs = []
-
-    users = {}
-    for entry in logs:
-        uid = entry.get("user_id")
-        sender_name = entry.get("sender_name")
-        # Просто запомним последнего sender_name, связанного с этим user_id
-        # (обычно это будет имя пользователя, но если sender_id="BOT", это не затронет user_id)
-        if uid not in users:
-            users[uid] = sender_name
+    # Один проход по индексу: пользователь и имя из его первой записи
+    users = await run_db(get_chat_users)
 
     lines = []
-    for uid, name in users.items():
+    for uid, name in users:
         lines.append(f"ID: {uid}, Имя: {name}")
 
     output_text = "\n".join(lines) if lines else "Нет пользователей."
@@ -314,24 +370,18 @@ async def export_chat_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     target_user_id = args[0]
-    try:
-        with open(CHAT_HISTORY_FILE, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except Exception:
-        logs = []
+    if not target_user_id.isdigit():
+        await update.message.reply_text("Использование: /export_chat <user_id>")
+        return
 
-    # Фильтруем все записи, где user_id совпадает с target_user_id
-    filtered = [entry for entry in logs if entry.get("user_id") == str(target_user_id)]
+    # Читаем только записи этого пользователя (по индексу user_id, timestamp)
+    filtered = await run_db(get_chat_history, int(target_user_id))
     if not filtered:
         await update.message.reply_text("Нет сообщений для этого пользователя.")
         return
 
     lines = []
-    for entry in filtered:
-        timestamp = entry.get("timestamp")
-        sender_name = entry.get("sender_name")
-        message_type = entry.get("message_type")
-        content = entry.get("content")
+    for timestamp, sender_name, message_type, content in filtered:
         lines.append(f"{timestamp} | {sender_name} [{message_type}]: {content}")
 
     output_text = "\n".join(lines)
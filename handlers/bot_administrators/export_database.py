@@ -1,6 +1,7 @@
 import os
 from telegram import Update, InputFile
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters
+from utils.db import run_db, checkpoint_all
 
 # Пользователи по ID которые имеют права использовать команду !export_db (Проще говоря - Администраторы Бота)
 TRUSTED_USERS = [5403794760]
@@ -9,11 +10,14 @@ DATABASE_PATH = "database"
 
 DB_DESCRIPTIONS = {
     "admin_db.json": "Информация о администраторах группы и уровнях доступа.",
-    "chat_history.json": "История личных сообщений Пользователей с Ботом",
+    "chat_history.json": "История личных сообщений Пользователей с Ботом (старый формат, перенесена в chat_history.db)",
+    "chat_history.db": "История личных сообщений Пользователей с Ботом",
+    "group_stats.db": "Статистика групп: сообщения, активные участники, баны.",
     "cooldowns.json": "Время повторного использования Административных Команд бота в разных Группах",
     "users.json": "Связка username и ID пользователей.",
     "roulette_lobbies.json": "Активные лобби игры 'Русская рулетка'.",
     "roulette_settings.json": "Настройки игры 'Русская рулетка' по группам.",
+    "metrics.json": "Время работы хэндлеров (то же, что !perf), обновляется раз в минуту.",
 }
 
 WAITING_FOR_CHOICE = 0
@@ -69,6 +73,9 @@ async def export_db_choice_handler(update: Update, context: ContextTypes.DEFAULT
         await message.reply_text("Пожалуйста, ответьте на сообщение со списком файлов или напишите заново !export_db.")
         return WAITING_FOR_CHOICE
 
+    # Базы открыты в WAL-режиме: свежие записи лежат в -wal, пока их не перенести в основной файл
+    await run_db(checkpoint_all)
+
     if choice == "all":
         for file in files:
             path = os.path.join(DATABASE_PATH, file)
@@ -123,6 +130,9 @@ async def export_db_handler_immediate(update: Update, context: ContextTypes.DEFA
     arg = parts[1]
     files = os.listdir(DATABASE_PATH)
 
+    # Базы открыты в WAL-режиме: свежие записи лежат в -wal, пока их не перенести в основной файл
+    await run_db(checkpoint_all)
+
     if arg == "all":
         for file in files:
             path = os.path.join(DATABASE_PATH, file)
@@ -1,11 +1,14 @@
-import psutil
+import asyncio
 import platform
 import time
 import io
-import matplotlib.pyplot as plt
+from html import escape
 from datetime import datetime, timedelta, timezone
 from telegram import Update, InputFile
 from telegram.ext import ContextTypes
+from utils.setup_jobqueue import get_job_stats
+from utils.metrics import slowest_handlers, slowest_chats
+from utils import startup_profile
 
 # Пользователи с доступом к !status
 ALLOWED_USER_IDS = [5403794760, 5742749531]
@@ -13,8 +16,11 @@ ALLOWED_USER_IDS = [5403794760, 5742749531]
 # Пользователи с доступом к !debug-all
 SUPER_ADMIN_IDS = [5403794760, 5742749531]
 
-# Время запуска бота
-start_time = time.time()
+
+# 📌 psutil и matplotlib (~0.8 с импорта) загружаются при первом !status / !debug-all, а не при запуске бота
+def _load_pyplot():
+    import matplotlib.pyplot as plt
+    return plt
 
 
 async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -23,7 +29,11 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⛔ Вы не являетесь Администратором этого Бота ⛔")
         return
 
-    uptime = timedelta(seconds=int(time.time() - start_time))
+    import psutil
+    # Первый импорт — в отдельном потоке, чтобы не останавливать обработку апдейтов других чатов
+    plt = await asyncio.to_thread(_load_pyplot)
+
+    uptime = timedelta(seconds=int(time.time() - startup_profile.STARTED_AT))
     boot_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(psutil.boot_time()))
     cpu_percent = psutil.cpu_percent(interval=1)
     cpu_cores = psutil.cpu_percent(interval=1, percpu=True)
@@ -67,6 +77,9 @@ async def debugall_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🚫 Вы не являетесь Администратором этого Бота 🚫")
         return
 
+    import psutil
+    plt = await asyncio.to_thread(_load_pyplot)
+
     # Системные данные
     boot_time = datetime.fromtimestamp(psutil.boot_time(), tz=timezone.utc).astimezone(timezone(timedelta(hours=2)))
     uptime = timedelta(seconds=int(time.time() - psutil.boot_time()))
@@ -126,5 +139,44 @@ async def debugall_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     for proc in top_mem:
         text += f"🟦 {proc['name']} (PID {proc['pid']}): {proc['memory_percent']:.1f}%\n"
 
+    text += f"\n<b>⚡ Запуск бота:</b> {startup_profile.report()}\n"
+
+    text += "\n<b>⏲ Фоновые задачи:</b>\n"
+    for job in get_job_stats():
+        last = f"{job.last_duration * 1000:.0f} мс" if job.last_duration is not None else "ещё не запускалась"
+        text += f"🔸 {job.name} (каждые {job.interval} с): {job.runs} запусков, ошибок {job.failures}, последний — {last}\n"
+        if job.last_error:
+            text += f"   ⚠️ <code>{escape(job.last_error[:200])}</code>\n"
+
+    await update.message.reply_text(text, parse_mode="HTML")
+    await update.message.reply_photo(InputFile(cpu_img), caption="📊 График загрузки CPU по ядрам")
+
+
+async def perf_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    user_id = update.effective_user.id
+    if user_id not in ALLOWED_USER_IDS:
+        await update.message.reply_text("⛔ Вы не являетесь Администратором этого Бота ⛔")
+        return
+
+    handlers = slowest_handlers(limit=10)
+    if not handlers:
+        await update.message.reply_text("🐢 Пока нет замеров.")
+        return
+
+    text = "<b>🐢 Самые медленные хэндлеры</b> (p50 / p95 / p99, доля SQLite / API)\n\n"
+    for h in handlers:
+        errors = f", ошибок {h['errors']}" if h['errors'] else ""
+        text += (
+            f"🔹 <code>{escape(h['name'])}</code> — {h['calls']} вызовов{errors}\n"
+            f"   {h['p50_ms']:.0f} / {h['p95_ms']:.0f} / {h['p99_ms']:.0f} мс, "
+            f"SQLite {h['db_share']:.0%}, API {h['api_share']:.0%}\n"
+        )
+
+    text += "\n<b>💬 Самые медленные чаты</b> (среднее время вызова)\n"
+    for chat_id, chat in slowest_chats(limit=5):
+        text += (
+            f"🔸 <code>{chat_id}</code>: {chat.total / chat.calls * 1000:.0f} мс за {chat.calls} вызовов, "
+            f"максимум {chat.slowest * 1000:.0f} мс ({escape(chat.slowest_handler)})\n"
+        )
+
     await update.message.reply_text(text, parse_mode="HTML")
-    await update.message.reply_photo(InputFile(cpu_img), caption="📊 График загрузки CPU по ядрам")
\ No newline at end of file
@@ -1,4 +1,4 @@
-import sqlite3
+import math
 import random
 import logging
 from datetime import datetime, timedelta
@@ -10,79 +10,169 @@ from handlers.admin.admin_access import has_access
 from handlers.admin.moderation_db import get_user_max_role_level
 from telegram.helpers import mention_html
 from telegram.constants import ParseMode
+from utils.db import WHALE_DB, transaction, fetchone, fetchall, execute, run_db
+from utils.chat_members import get_chat_member, resolve_names
+from utils.rate_limiter import send_priority, PRIORITY_GAME
+from utils.durations import parse_duration, tokenize, compact_tokens, format_seconds
 
-DB_PATH = 'database/whale_game.db'
+DEFAULT_COOLDOWN = '24h'
+# Старые настройки кулдауна могли быть просто числом — это часы
+COOLDOWN_BARE_UNIT = 'h'
 
 
 # ====== Database Initialization ======
 def init_whale_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS players (
-            chat_id INTEGER,
-            user_id INTEGER,
-            pet_name TEXT,
-            weight REAL DEFAULT 0,
-            balance REAL DEFAULT 0,
-            last_feed TEXT,
-            PRIMARY KEY(chat_id, user_id)
+    with transaction(WHALE_DB) as c:
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS players (
+                chat_id INTEGER,
+                user_id INTEGER,
+                pet_name TEXT,
+                weight REAL DEFAULT 0,
+                balance REAL DEFAULT 0,
+                last_feed TEXT,
+                PRIMARY KEY(chat_id, user_id)
+            )
+        """
         )
-    """
-    )
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS settings (
-            chat_id INTEGER,
-            key TEXT,
-            value TEXT,
-            PRIMARY KEY(chat_id, key)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                chat_id INTEGER,
+                key TEXT,
+                value TEXT,
+                PRIMARY KEY(chat_id, key)
+            )
+        """
         )
-    """
-    )
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS game_admins (
-            chat_id INTEGER,
-            user_id INTEGER,
-            PRIMARY KEY(chat_id, user_id)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS game_admins (
+                chat_id INTEGER,
+                user_id INTEGER,
+                PRIMARY KEY(chat_id, user_id)
+            )
+        """
         )
-    """
-    )
-    conn.commit()
-    conn.close()
-
-
-init_whale_db()
 
 
 # ====== Helper Functions ======
 def get_setting(chat_id: int, key: str, default=None):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT value FROM settings WHERE chat_id=? AND key=?", (chat_id, key))
-    row = c.fetchone()
-    conn.close()
+    row = fetchone(WHALE_DB, "SELECT value FROM settings WHERE chat_id=? AND key=?", (chat_id, key))
     return row[0] if row else default
 
 
+def get_settings(chat_id: int) -> dict:
+    """Все настройки игры в группе одним запросом: {ключ: значение}."""
+    return dict(fetchall(WHALE_DB, "SELECT key, value FROM settings WHERE chat_id=?", (chat_id,)))
+
+
 def set_setting(chat_id: int, key: str, value: str):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("REPLACE INTO settings(chat_id, key, value) VALUES(?,?,?)", (chat_id, key, value))
-    conn.commit()
-    conn.close()
+    execute(WHALE_DB, "REPLACE INTO settings(chat_id, key, value) VALUES(?,?,?)", (chat_id, key, value))
 
 
 def is_game_admin(chat_id: int, user_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM game_admins WHERE chat_id=? AND user_id=?", (chat_id, user_id))
-    ok = c.fetchone() is not None
-    conn.close()
-    return ok
+    return fetchone(WHALE_DB, "SELECT 1 FROM game_admins WHERE chat_id=? AND user_id=?", (chat_id, user_id)) is not None
+
+
+def add_game_admin(chat_id: int, user_id: int):
+    execute(WHALE_DB, "REPLACE INTO game_admins(chat_id, user_id) VALUES(?,?)", (chat_id, user_id))
+
+
+def remove_game_admin(chat_id: int, user_id: int):
+    execute(WHALE_DB, "DELETE FROM game_admins WHERE chat_id=? AND user_id=?", (chat_id, user_id))
+
+
+def get_game_admins(chat_id: int) -> list[int]:
+    return [uid for (uid,) in fetchall(WHALE_DB, "SELECT user_id FROM game_admins WHERE chat_id=?", (chat_id,))]
+
+
+def create_pet(chat_id: int, user_id: int, name: str) -> bool:
+    """Регистрирует питомца. False — если у пользователя он уже есть."""
+    return execute(WHALE_DB, "INSERT OR IGNORE INTO players(chat_id,user_id,pet_name,weight,balance,last_feed) VALUES(?,?,?,?,?,?)",
+                   (chat_id, user_id, name, 0, 0, None)) > 0
+
+
+def rename_pet(chat_id: int, user_id: int, name: str) -> bool:
+    """Переименовывает питомца. False — если питомец не зарегистрирован."""
+    return execute(WHALE_DB, "UPDATE players SET pet_name=? WHERE chat_id=? AND user_id=?", (name, chat_id, user_id)) > 0
+
+
+def get_leaders(chat_id: int, limit: int = 10) -> list:
+    return fetchall(WHALE_DB, "SELECT user_id, pet_name, weight FROM players WHERE chat_id=? ORDER BY weight DESC LIMIT ?", (chat_id, limit))
+
+
+def get_profile(chat_id: int, user_id: int):
+    """(имя питомца, вес, сердца, место в рейтинге) или None, если питомца нет."""
+    row = fetchone(WHALE_DB, "SELECT pet_name,weight,balance FROM players WHERE chat_id=? AND user_id=?", (chat_id, user_id))
+    if not row:
+        return None
+    name, weight, balance = row
+    rank = fetchone(WHALE_DB, "SELECT COUNT(*)+1 FROM players WHERE chat_id=? AND weight>?", (chat_id, weight))[0]
+    return name, weight, balance, rank
+
+
+def get_cooldown(cfg: dict) -> timedelta:
+    """Кулдаун кормёжки из настроек группы; нераспознанное значение — кулдаун по умолчанию."""
+    try:
+        return parse_duration(cfg.get('cooldown') or DEFAULT_COOLDOWN, COOLDOWN_BARE_UNIT)
+    except ValueError:
+        return parse_duration(DEFAULT_COOLDOWN)
+
+
+def feed_pet(chat_id: int, uid: int) -> str:
+    """
+    Одна кормёжка питомца: проверка кулдауна, бросок исхода и сохранение результата.
+    Выполняется целиком в потоке базы (через run_db) и возвращает текст ответа.
+    """
+    row = fetchone(WHALE_DB, "SELECT pet_name,weight,balance,last_feed FROM players WHERE chat_id=? AND user_id=?", (chat_id, uid))
+    if not row:
+        return "❗ У вас нет питомца. Зарегистрируйте через !whale 'Имя питомца'"
+    name, weight, balance, last_feed = row
+    now = datetime.utcnow()
+    cfg = get_settings(chat_id)
+
+    cd_delta = get_cooldown(cfg)
+
+    if last_feed:
+        last = datetime.fromisoformat(last_feed)
+        if now < last + cd_delta:
+            rem = last + cd_delta - now
+            return f"⏳ Ждите ещё: {format_seconds(math.ceil(rem.total_seconds()))}."
+
+    # Settings
+    gain_min = int(cfg.get('gain_min', '1'))
+    gain_max = int(cfg.get('gain_max', '10'))
+    loss_min = int(cfg.get('loss_min', '1'))
+    loss_max = int(cfg.get('loss_max', '5'))
+    chance = int(cfg.get('chance', '50'))
+    coeff = int(cfg.get('coeff', '2'))
+
+    # Outcome
+    if random.randint(1,100) <= chance:
+        delta = random.randint(gain_min, gain_max)
+        weight += delta
+        balance += delta//coeff
+
+        if delta > gain_max * 0.7:
+            text = f"😲 Ого, {name} сел роскошную еду, и поправился на {delta} кг и вы получили {delta // coeff} сердечек ❤️"
+        else:
+            text = f"😋 Отлично! {name} поправился на {delta} кг и вы заработали {delta // coeff} сердечек ❤️"
+    else:
+        delta = random.randint(loss_min, loss_max)
+        weight = max(0, weight-delta)
+
+        if delta > loss_max * 0.7:
+            text = f"🥴 Упс, {name} сел отвратительную еду, и похудел на {delta} кг."
+        else:
+            text = f"🫤 Упс, {name} сел плохую еду, и похудел на {delta} кг."
+
+    execute(WHALE_DB, "UPDATE players SET weight=?,balance=?,last_feed=? WHERE chat_id=? AND user_id=?",
+            (weight, balance, now.isoformat(), chat_id, uid))
+    return text
 
 
 # ====== Commands ======
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def whale_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Назначить игрового администратора: !whale-admin @user/ID"""
     msg = update.message
@@ -90,48 +180,43 @@ async def whale_admin_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
     if len(parts) < 2:
         return await msg.reply_text("❔ Использование: !whale-admin '@username или ID'")
     arg = parts[1]
-    owner = await context.bot.get_chat_member(update.effective_chat.id, update.effective_user.id)
+    owner = await get_chat_member(context.bot, update.effective_chat.id, update.effective_user.id)
     if owner.status != 'creator':
         return await msg.reply_text("⛔ Только владелец может назначать админов игры.")
     if arg.startswith('@'):
-        uid = get_user_id_by_username(arg[1:])
+        uid = await run_db(get_user_id_by_username, arg[1:])
         if not uid:
             return await msg.reply_text("❌ Пользователь не найден.")
     elif arg.isdigit():
         uid = int(arg)
     else:
         return await msg.reply_text("❌ Неверный формат. Укажите @username или ID.")
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("REPLACE INTO game_admins(chat_id, user_id) VALUES(?,?)", (update.effective_chat.id, uid))
-    conn.commit()
-    conn.close()
+    await run_db(add_game_admin, update.effective_chat.id, uid)
     await msg.reply_text(f"✅ Игровой админ назначен: {arg}")
 
 
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def whale_admins_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Вывести список игровых администраторов: !whale-admins"""
     msg = update.message
     chat_id = update.effective_chat.id
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT user_id FROM game_admins WHERE chat_id=?", (chat_id,))
-    rows = c.fetchall()
-    conn.close()
-    if not rows:
+    admin_ids = await run_db(get_game_admins, chat_id)
+    if not admin_ids:
         return await msg.reply_text("❌ Пока нет админов игры.")
+    names = await resolve_names(context.bot, chat_id, admin_ids)
     mentions = []
-    for (uid,) in rows:
-        try:
-            member = await context.bot.get_chat_member(chat_id, uid)
-            mentions.append(mention_html(uid, member.user.first_name))
-        except:
+    for uid in admin_ids:
+        first_name = names.get(uid, (None, None))[1]
+        if first_name:
+            mentions.append(mention_html(uid, first_name))
+        else:
             mentions.append(f"ID {uid}")
     await msg.reply_text("👑 Игровые админы: " + ', '.join(mentions), parse_mode=ParseMode.HTML)
 
 
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def whale_admin_remove(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Снять игрового админа: !whale-admin-remove @user/ID"""
     msg = update.message
@@ -139,26 +224,23 @@ async def whale_admin_remove(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if len(parts) < 2:
         return await msg.reply_text("❔ Использование: !whale-admin-remove '@username или ID'")
     arg = parts[1]
-    owner = await context.bot.get_chat_member(update.effective_chat.id, update.effective_user.id)
+    owner = await get_chat_member(context.bot, update.effective_chat.id, update.effective_user.id)
     if owner.status != 'creator':
         return await msg.reply_text("⛔ Только владелец может снимать админов игры.")
     if arg.startswith('@'):
-        uid = get_user_id_by_username(arg[1:])
+        uid = await run_db(get_user_id_by_username, arg[1:])
         if not uid:
             return await msg.reply_text("❌ Пользователь не найден.")
     elif arg.isdigit():
         uid = int(arg)
     else:
         return await msg.reply_text("❌ Неверный формат аргумента.")
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("DELETE FROM game_admins WHERE chat_id=? AND user_id=?", (update.effective_chat.id, uid))
-    conn.commit()
-    conn.close()
+    await run_db(remove_game_admin, update.effective_chat.id, uid)
     await msg.reply_text(f"🗑️ Игровой админ удалён: {arg}")
 
 
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def set_game_setting(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """!whale-set <key> <value>"""
     msg = update.message
@@ -168,8 +250,8 @@ async def set_game_setting(update: Update, context: ContextTypes.DEFAULT_TYPE):
     key, value = parts[1], parts[2]
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
-    member = await context.bot.get_chat_member(chat_id, user_id)
-    if member.status != 'creator' and not is_game_admin(chat_id, user_id):
+    member = await get_chat_member(context.bot, chat_id, user_id)
+    if member.status != 'creator' and not await run_db(is_game_admin, chat_id, user_id):
         return await msg.reply_text("⛔ Нет прав менять настройки игры.")
 
     valid_keys = {'cooldown','gain_min','gain_max','loss_min','loss_max','chance','coeff','object_name'}
@@ -185,19 +267,19 @@ async def set_game_setting(update: Update, context: ContextTypes.DEFAULT_TYPE):
         prefix = ''
         # For relational keys, fetch counterpart
         if key == 'gain_min':
-            gm = int(get_setting(chat_id,'gain_max','10'))
+            gm = int(await run_db(get_setting, chat_id, 'gain_max', '10'))
             if num > gm:
                 return await msg.reply_text(f"❌ gain_min ({num}) не может быть больше gain_max ({gm}).")
         if key == 'gain_max':
-            gn = int(get_setting(chat_id,'gain_min','1'))
+            gn = int(await run_db(get_setting, chat_id, 'gain_min', '1'))
             if num < gn:
                 return await msg.reply_text(f"❌ gain_max ({num}) не может быть меньше gain_min ({gn}).")
         if key == 'loss_min':
-            lm = int(get_setting(chat_id,'loss_max','5'))
+            lm = int(await run_db(get_setting, chat_id, 'loss_max', '5'))
             if num > lm:
                 return await msg.reply_text(f"❌ loss_min ({num}) не может быть больше loss_max ({lm}).")
         if key == 'loss_max':
-            ln = int(get_setting(chat_id,'loss_min','1'))
+            ln = int(await run_db(get_setting, chat_id, 'loss_min', '1'))
             if num < ln:
                 return await msg.reply_text(f"❌ loss_max ({num}) не может быть меньше loss_min ({ln}).")
         if key == 'chance' and not (0 <= num <= 100):
@@ -205,12 +287,20 @@ async def set_game_setting(update: Update, context: ContextTypes.DEFAULT_TYPE):
     except ValueError:
         return await msg.reply_text("❗ Значение должно быть целым числом.")
 
+    # Кулдаун хранится в канонической записи: '10h 45m 30s'
+    if key == 'cooldown':
+        try:
+            value = compact_tokens(tokenize(value, bare_unit=COOLDOWN_BARE_UNIT))
+        except ValueError:
+            return await msg.reply_text("❗ Неверный кулдаун. Пример: 10h 45m 30s (единицы: r, mo, d, h, m, s)")
+
     # Save setting
-    set_setting(chat_id, key, value)
+    await run_db(set_setting, chat_id, key, value)
     await msg.reply_text(f"⚙️ Настройка <b>{key}</b> установлена в <b>{value}</b>", parse_mode=ParseMode.HTML)
 
 
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def set_whale_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
     parts = msg.text.strip().split(maxsplit=2)
@@ -224,7 +314,7 @@ async def set_whale_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         arg, new_name = parts[1], parts[2].strip()
         if arg.startswith('@'):
-            target_id = get_user_id_by_username(arg[1:])
+            target_id = await run_db(get_user_id_by_username, arg[1:])
             if not target_id:
                 return await msg.reply_text("❌ Пользователь не найден.")
         elif arg.isdigit():
@@ -234,18 +324,11 @@ async def set_whale_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not 1 <= len(new_name) <= 16 or '\n' in new_name:
         return await msg.reply_text("❗ Имя питомца должно быть 1–16 символов без переносов.")
     if target_id != caller_id:
-        member = await context.bot.get_chat_member(chat_id, caller_id)
-        if member.status != 'creator' and not is_game_admin(chat_id, caller_id):
+        member = await get_chat_member(context.bot, chat_id, caller_id)
+        if member.status != 'creator' and not await run_db(is_game_admin, chat_id, caller_id):
             return await msg.reply_text("⛔ Нет прав менять имя другого питомца.")
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM players WHERE chat_id=? AND user_id=?", (chat_id, target_id))
-    if not c.fetchone():
-        conn.close()
+    if not await run_db(rename_pet, chat_id, target_id, new_name):
         return await msg.reply_text("❗ Питомец не зарегистрирован. Используйте !whale 'Имя питомца'.")
-    c.execute("UPDATE players SET pet_name=? WHERE chat_id=? AND user_id=?", (new_name, chat_id, target_id))
-    conn.commit()
-    conn.close()
     await msg.reply_text(
         f"{'✅ Ваш питомец' if target_id==caller_id else f'✅ Питомец пользователя'} успешно переименован в <b>{new_name}</b>",
         parse_mode=ParseMode.HTML
@@ -253,6 +336,7 @@ async def set_whale_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def register_whale(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
     parts = msg.text.strip().split(maxsplit=1)
@@ -263,111 +347,35 @@ async def register_whale(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await msg.reply_text("❗ Имя питомца должно быть от 1 до 16 символов без переносов.")
     chat_id = update.effective_chat.id
     uid = update.effective_user.id
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM players WHERE chat_id=? AND user_id=?", (chat_id, uid))
-    if c.fetchone():
-        conn.close()
+    if not await run_db(create_pet, chat_id, uid, name):
         return await msg.reply_text("❗ У вас уже есть питомец. Используйте !whale-name для переименования.")
-    c.execute("INSERT INTO players(chat_id,user_id,pet_name,weight,balance,last_feed) VALUES(?,?,?,?,?,?)",
-              (chat_id, uid, name, 0, 0, None))
-    conn.commit()
-    conn.close()
     await msg.reply_text(f"❗ Ваш питомец '{name}' зарегистрирован! Используйте !feed для кормёжки.")
 
 
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def feed_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
     chat_id = update.effective_chat.id
     uid = update.effective_user.id
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT pet_name,weight,balance,last_feed FROM players WHERE chat_id=? AND user_id=?", (chat_id, uid))
-    row = c.fetchone()
-    if not row:
-        conn.close()
-        return await msg.reply_text("❗ У вас нет питомца. Зарегистрируйте через !whale 'Имя питомца'")
-    name, weight, balance, last_feed = row
-    now = datetime.utcnow()
-
-    # Parse cooldown combination
-    raw_cd = get_setting(chat_id, 'cooldown', '24h') or '24h'
-    total_sec = 0
-    for token in raw_cd.split():
-        if token.endswith('h') and token[:-1].isdigit():
-            total_sec += int(token[:-1])*3600
-        elif token.endswith('m') and token[:-1].isdigit():
-            total_sec += int(token[:-1])*60
-        elif token.endswith('s') and token[:-1].isdigit():
-            total_sec += int(token[:-1])
-        elif token.isdigit():
-            total_sec += int(token)*3600
-    cd_delta = timedelta(seconds=total_sec)
-
-    if last_feed:
-        last = datetime.fromisoformat(last_feed)
-        if now < last + cd_delta:
-            rem = last + cd_delta - now
-            hrs = rem.seconds//3600
-            mins = (rem.seconds%3600)//60
-            secs = rem.seconds%60
-            conn.close()
-            return await msg.reply_text(f"⏳ Ждите ещё: {hrs} ч {mins} мин {secs} сек.")
-
-    # Settings
-    gain_min = int(get_setting(chat_id,'gain_min','1'))
-    gain_max = int(get_setting(chat_id,'gain_max','10'))
-    loss_min = int(get_setting(chat_id,'loss_min','1'))
-    loss_max = int(get_setting(chat_id,'loss_max','5'))
-    chance = int(get_setting(chat_id,'chance','50'))
-    coeff = int(get_setting(chat_id,'coeff','2'))
-
-    # Outcome
-    if random.randint(1,100) <= chance:
-        delta = random.randint(gain_min, gain_max)
-        weight += delta
-        balance += delta//coeff
-
-        if delta > gain_max * 0.7:
-            text = f"😲 Ого, {name} сел роскошную еду, и поправился на {delta} кг и вы получили {delta // coeff} сердечек ❤️"
-        else:
-            text = f"😋 Отлично! {name} поправился на {delta} кг и вы заработали {delta // coeff} сердечек ❤️"
-    else:
-        delta = random.randint(loss_min, loss_max)
-        weight = max(0, weight-delta)
-
-        if delta > loss_max * 0.7:
-            text = f"🥴 Упс, {name} сел отвратительную еду, и похудел на {delta} кг."
-        else:
-            text = f"🫤 Упс, {name} сел плохую еду, и похудел на {delta} кг."
-
-    c.execute("UPDATE players SET weight=?,balance=?,last_feed=? WHERE chat_id=? AND user_id=?",
-              (weight, balance, now.isoformat(), chat_id, uid))
-    conn.commit()
-    conn.close()
+    text = await run_db(feed_pet, chat_id, uid)
     await msg.reply_text(text)
 
 
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def leaders_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # !leaders
     msg = update.message
     chat_id = update.effective_chat.id
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT user_id, pet_name, weight FROM players WHERE chat_id=? ORDER BY weight DESC LIMIT 10", (chat_id,))
-    rows = c.fetchall()
-    conn.close()
+    rows = await run_db(get_leaders, chat_id)
     if not rows:
         return await msg.reply_text("👤 Нет игроков.")
+    names = await resolve_names(context.bot, chat_id, [uid for uid, _, _ in rows])
     lines = []
     for idx, (uid, name, wt) in enumerate(rows, 1):
-        try:
-            member = await context.bot.get_chat_member(chat_id, uid)
-            mention = mention_html(uid, member.user.first_name)
-        except:
-            mention = mention_html(uid, f"id{uid}")
+        first_name = names.get(uid, (None, None))[1]
+        mention = mention_html(uid, first_name or f"id{uid}")
         if idx == 1:
             lines.append(f"🏆 Место в рейтинге 1: <b>{name}</b>")
             lines.append(f"⚖️ Вес: {wt} кг")
@@ -380,32 +388,23 @@ async def leaders_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def info_whale(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показать текущие настройки игры: !info-whale"""
     chat_id = update.effective_chat.id
     # Default values
     defaults = {
-        'cooldown': '24h',
+        'cooldown': DEFAULT_COOLDOWN,
         'gain_min': '1', 'gain_max': '10',
         'loss_min': '1', 'loss_max': '5',
         'chance': '50', 'coeff': '2',
         'object_name': 'Кит'
     }
     # Fetch settings
-    cfg = {}
-    for key, defval in defaults.items():
-        cfg[key] = get_setting(chat_id, key, defval)
+    stored = await run_db(get_settings, chat_id)
+    cfg = {key: stored.get(key, defval) for key, defval in defaults.items()}
     # Human-readable cooldown
-    total_sec = 0
-    for token in cfg['cooldown'].split():
-        if token.endswith('h') and token[:-1].isdigit(): total_sec += int(token[:-1]) * 3600
-        elif token.endswith('m') and token[:-1].isdigit(): total_sec += int(token[:-1]) * 60
-        elif token.endswith('s') and token[:-1].isdigit(): total_sec += int(token[:-1])
-        elif token.isdigit(): total_sec += int(token) * 3600
-    cd = timedelta(seconds=total_sec)
-    hrs, rem = divmod(cd.seconds, 3600)
-    mins, secs = divmod(rem, 60)
-    cooldown_str = f"{hrs}ч {mins}м {secs}с"
+    cooldown_str = format_seconds(get_cooldown(cfg).total_seconds())
     # Build message
     text = (
         f"🏷 <b>Параметры игры '{cfg['object_name']}'</b> 🏷\n"
@@ -420,21 +419,15 @@ async def info_whale(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def profile_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
     chat_id = update.effective_chat.id
     uid = update.effective_user.id
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT pet_name,weight,balance FROM players WHERE chat_id=? AND user_id=?", (chat_id, uid))
-    row = c.fetchone()
-    if not row:
-        conn.close()
+    profile = await run_db(get_profile, chat_id, uid)
+    if not profile:
         return await msg.reply_text("❗ У вас нет питомца. Зарегистрируйте через !whale 'Имя питомца'")
-    name, weight, balance = row
-    c.execute("SELECT COUNT(*)+1 FROM players WHERE chat_id=? AND weight>?", (chat_id, weight))
-    rank = c.fetchone()[0]
-    conn.close()
+    name, weight, balance, rank = profile
     text = (
         f"📋 <b>Ваш профиль:</b>\n"
         f"🐳 Питомец: <b>{name}</b>\n"
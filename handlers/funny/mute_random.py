@@ -1,13 +1,108 @@
+import logging
 import random
-from asyncio import sleep
+import threading
+import time
 from telegram import Update, ChatPermissions
+from telegram.constants import ParseMode
 from telegram.ext import ContextTypes
+from core.check_group_chat import only_group_chats
+from handlers.funny.feed_the_pet import is_game_admin
+from utils.chat_members import get_chat_member, invalidate_chat_member
+from utils.db import MODERATION_DB, transaction, fetchall, execute, run_db
+from utils.rate_limiter import send_priority, PRIORITY_GAME
+from utils.durations import tokenize, to_seconds, format_seconds
 
-# Настройки
+# Настройки по умолчанию (в группе меняются командой !mute-set)
 MUTE_CHANCE = 0.005   # 0.01 = это 1% шанс / 0.1 = 10% шанс / 0.005 = 0.5% шанс
 MUTE_DURATION = 60   # в секундах
 
+# Telegram считает ограничение короче 30 секунд бессрочным, поэтому меньше нельзя
+MIN_MUTE_DURATION = 30
+MAX_MUTE_DURATION = 24 * 3600
 
+# Настройки групп в памяти: chat_id -> (шанс, длительность) — хэндлер срабатывает на каждое сообщение
+_settings: dict[int, tuple] = {}
+_settings_lock = threading.Lock()
+
+
+# 📌 Таблицы настроек и запланированных размутов, загрузка настроек в память
+def init_mute_db():
+    with transaction(MODERATION_DB) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS random_mute_settings (
+                chat_id INTEGER PRIMARY KEY,
+                chance REAL,
+                duration INTEGER
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_unmutes (
+                chat_id INTEGER,
+                user_id INTEGER,
+                until REAL,
+                PRIMARY KEY (chat_id, user_id)
+            )
+        """)
+    rows = fetchall(MODERATION_DB, "SELECT chat_id, chance, duration FROM random_mute_settings")
+    with _settings_lock:
+        _settings.clear()
+        _settings.update({chat_id: (chance, duration) for chat_id, chance, duration in rows})
+
+
+def get_mute_settings(chat_id: int) -> tuple:
+    """(шанс 0..1, длительность в секундах) для группы."""
+    return _settings.get(chat_id, (MUTE_CHANCE, MUTE_DURATION))
+
+
+def set_mute_settings(chat_id: int, chance: float = None, duration: int = None):
+    with _settings_lock:
+        current_chance, current_duration = get_mute_settings(chat_id)
+        chance = current_chance if chance is None else chance
+        duration = current_duration if duration is None else duration
+        execute(MODERATION_DB, "REPLACE INTO random_mute_settings (chat_id, chance, duration) VALUES (?, ?, ?)",
+                (chat_id, chance, duration))
+        _settings[chat_id] = (chance, duration)
+
+
+def save_pending_unmute(chat_id: int, user_id: int, until: float):
+    execute(MODERATION_DB, "REPLACE INTO pending_unmutes (chat_id, user_id, until) VALUES (?, ?, ?)",
+            (chat_id, user_id, until))
+
+
+def delete_pending_unmute(chat_id: int, user_id: int):
+    execute(MODERATION_DB, "DELETE FROM pending_unmutes WHERE chat_id = ? AND user_id = ?", (chat_id, user_id))
+
+
+def get_pending_unmutes() -> list[tuple]:
+    return fetchall(MODERATION_DB, "SELECT chat_id, user_id, until FROM pending_unmutes")
+
+
+# ⏰ Задача JobQueue: снять мут
+async def unmute_job(context: ContextTypes.DEFAULT_TYPE):
+    chat_id, user_id = context.job.chat_id, context.job.user_id
+    try:
+        await context.bot.restrict_chat_member(
+            chat_id,
+            user_id,
+            permissions=ChatPermissions(can_send_messages=True)
+        )
+        invalidate_chat_member(chat_id, user_id)
+    except Exception as e:
+        logging.warning(f"[unmute_job] Не удалось снять мут {user_id} в {chat_id}: {e}")
+    await run_db(delete_pending_unmute, chat_id, user_id)
+
+
+def schedule_unmute(job_queue, chat_id: int, user_id: int, until: float):
+    """
+    Ставит (или переставляет) размут пользователя на момент until (unix-время).
+    """
+    name = f"unmute:{chat_id}:{user_id}"
+    for job in job_queue.get_jobs_by_name(name):
+        job.schedule_removal()
+    job_queue.run_once(unmute_job, when=max(0.0, until - time.time()), chat_id=chat_id, user_id=user_id, name=name)
+
+
+@send_priority(PRIORITY_GAME)
 async def mute_random_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     if not message or not message.text or not update.effective_user:
@@ -15,26 +110,67 @@ async def mute_random_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     chat_id = message.chat_id
     user_id = message.from_user.id
+    chance, duration = get_mute_settings(chat_id)
 
     # Рандомный шанс
-    if random.random() < MUTE_CHANCE:
+    if random.random() < chance:
         try:
-            # Мут на 1 минуту
+            until = message.date.timestamp() + duration
             await context.bot.restrict_chat_member(
                 chat_id,
                 user_id,
                 permissions=ChatPermissions(can_send_messages=False),
-                until_date=message.date.timestamp() + MUTE_DURATION
+                until_date=until
             )
+            invalidate_chat_member(chat_id, user_id)
 
-            await message.reply_text("Лошарам слово не давали :D")
+            # Размут — отдельной задачей, которая переживёт перезапуск бота; хэндлер не ждёт
+            await run_db(save_pending_unmute, chat_id, user_id, until)
+            if context.job_queue is not None:
+                schedule_unmute(context.job_queue, chat_id, user_id, until)
 
-            # Через минуту снимаем мут
-            await sleep(MUTE_DURATION)
-            await context.bot.restrict_chat_member(
-                chat_id,
-                user_id,
-                permissions=ChatPermissions(can_send_messages=True)
-            )
+            await message.reply_text("Лошарам слово не давали :D")
         except Exception as e:
             print(f"[mute_random_handler] Ошибка: {e}")
+
+
+# === Настройка через !mute-set chance <0–100> | duration <секунды> ===
+@only_group_chats
+async def mute_set_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    msg = update.message
+    parts = msg.text.strip().split()
+    chat_id = update.effective_chat.id
+    user_id = update.effective_user.id
+
+    if len(parts) != 3:
+        chance, duration = get_mute_settings(chat_id)
+        return await msg.reply_text(
+            f"🎲 Шанс мута: <b>{chance * 100:g}%</b>, длительность: <b>{format_seconds(duration)}</b>\n"
+            "❔ Использование: !mute-set chance &lt;0–100&gt; | !mute-set duration &lt;срок: 90, 5m, 1h30m&gt;",
+            parse_mode=ParseMode.HTML
+        )
+
+    member = await get_chat_member(context.bot, chat_id, user_id)
+    if member.status != 'creator' and not await run_db(is_game_admin, chat_id, user_id):
+        return await msg.reply_text("⛔ Нет прав менять настройки мута.")
+
+    key, value = parts[1].lower(), parts[2]
+    try:
+        if key == "chance":
+            percent = float(value.rstrip("%").replace(",", "."))
+            if not 0 <= percent <= 100:
+                return await msg.reply_text("❗ chance должен быть от 0 до 100.")
+            await run_db(set_mute_settings, chat_id, chance=percent / 100)
+            return await msg.reply_text(f"⚙️ Шанс мута: <b>{percent:g}%</b>", parse_mode=ParseMode.HTML)
+        if key == "duration":
+            # Число без единицы — секунды
+            seconds = to_seconds(tokenize(value, bare_unit="s"))
+            if not MIN_MUTE_DURATION <= seconds <= MAX_MUTE_DURATION:
+                return await msg.reply_text(
+                    f"❗ duration должен быть от {format_seconds(MIN_MUTE_DURATION)} до {format_seconds(MAX_MUTE_DURATION)}."
+                )
+            await run_db(set_mute_settings, chat_id, duration=seconds)
+            return await msg.reply_text(f"⚙️ Длительность мута: <b>{format_seconds(seconds)}</b>", parse_mode=ParseMode.HTML)
+    except ValueError:
+        return await msg.reply_text("❗ Значение должно быть числом или сроком (например 90, 5m, 1h30m).")
+    await msg.reply_text("❌ Неверный ключ. Допустимые: chance, duration")
@@ -8,24 +8,63 @@ from telegram.ext import ContextTypes
 from datetime import datetime
 
 from utils.users import get_user_id_by_username
+from utils.db import run_db
 from core.check_group_chat import only_group_chats
+from utils.rate_limiter import send_priority, PRIORITY_GAME
 
 LOBBY_DB = "database/roulette_lobbies.json"
 SETTINGS_DB = "database/roulette_settings.json"
 
 
+# Сколько последних событий игры показывать на табло
+BOARD_LOG_SIZE = 4
+
+# Лобби, которое так и не запустили, удаляется через столько секунд (регистрация — 2 минуты)
+LOBBY_TTL = 600
+# Как часто (в секундах) фоновая задача ищет брошенные лобби
+LOBBY_CLEANUP_INTERVAL = 60
+
+
+def _mention(lobby, user_id):
+    return f"<a href='tg://user?id={user_id}'>@{lobby['player_names'].get(user_id, user_id)}</a>"
+
+
+# === Табло игры: одно сообщение на лобби, редактируется на каждом ходу ===
+async def render_board(chat_id, context, lobby, footer):
+    """
+    Собирает последние события, статус и подсказку хода в один текст и
+    редактирует табло лобби (или отправляет его, если табло ещё нет или оно удалено).
+    Так каждый ход стоит одного запроса к API вместо трёх отдельных сообщений.
+    """
+    text = "\n".join(lobby.get("log", [])) + "\n\n" + status_text(lobby) + "\n\n" + footer
+
+    board_id = lobby.get("board_message_id")
+    if board_id:
+        try:
+            await context.bot.edit_message_text(chat_id=chat_id, message_id=board_id, text=text, parse_mode="HTML")
+            return
+        except Exception:
+            pass  # табло удалили или его уже нельзя редактировать — отправим новое
+
+    sent = await context.bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+    lobby["board_message_id"] = sent.message_id
+
+
+def add_event(lobby, text):
+    log = lobby.setdefault("log", [])
+    log.append(text)
+    del log[:-BOARD_LOG_SIZE]
+
+
 # === Авто-таймер хода ===
-async def auto_shoot_timeout(chat_id, context, player_id):
+async def auto_shoot_timeout(chat_id, context, player_id, turn):
     await asyncio.sleep(60)
     lobby = context.chat_data.get(chat_id)
-    if not lobby or lobby.get("waiting") != player_id:
+    # Ход уже сделан (или игрок стреляет повторно — у этого хода свой таймер)
+    if not lobby or lobby.get("waiting") != player_id or lobby.get("turn") != turn:
         return
 
-    await context.bot.send_message(
-        chat_id=chat_id,
-        text=f"⏱ Время вышло! Игрок <a href='tg://user?id={player_id}'>@{lobby['player_names'][player_id]}</a> сам стреляет в себя",
-        parse_mode="HTML"
-    )
+    add_event(lobby, f"⏱ Время вышло! Игрок {_mention(lobby, player_id)} сам стреляет в себя")
     await shootme_forced(chat_id, context, player_id)
 
 
@@ -41,14 +80,9 @@ async def shootme_forced(chat_id, context, user_id):
     lobby["waiting"] = None
     result = lobby["bullets"].pop(0)
     if result == "blank":
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=f"🔫 <a href='tg://user?id={user_id}'>@{lobby['player_names'][user_id]}</a> стреляет в себя — <b>Промах!</b>",
-            parse_mode="HTML"
-        )
-        await show_status(chat_id, context, lobby)
-        lobby["waiting"] = user_id
-        asyncio.create_task(auto_shoot_timeout(chat_id, context, user_id))
+        add_event(lobby, f"🔫 {_mention(lobby, user_id)} стреляет в себя — <b>Промах!</b>")
+        # После промаха в себя игрок ходит ещё раз
+        await prompt_turn(chat_id, context, lobby, user_id)
     else:
         lobby["dead"].append(user_id)
         lobby["alive"].remove(user_id)
@@ -57,17 +91,13 @@ async def shootme_forced(chat_id, context, user_id):
         if lobby["current_index"] >= len(lobby["alive"]):
             lobby["current_index"] = 0
 
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=f"💥 <a href='tg://user?id={user_id}'>@{lobby['player_names'][user_id]}</a> убит!",
-            parse_mode="HTML"
-        )
-        await show_status(chat_id, context, lobby)
+        add_event(lobby, f"💥 {_mention(lobby, user_id)} убит!")
         await next_turn_or_end(chat_id, context, lobby)
 
 
 # === Завершение игры ===
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def endgame_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     chat_id = str(message.chat_id)
@@ -93,54 +123,47 @@ def is_player_turn(chat_id, context, user_id):
     )
 
 
-# === Показ статуса игры ===
-async def show_status(chat_id, context, lobby):
-    alive = [f"<a href='tg://user?id={pid}'>@{lobby['player_names'][pid]}</a>" for pid in lobby['alive']]
-    dead = [f"<a href='tg://user?id={pid}'>@{lobby['player_names'][pid]}</a>" for pid in lobby['dead']]
+# === Статус игры (часть табло) ===
+def status_text(lobby):
+    alive = [_mention(lobby, pid) for pid in lobby['alive']]
+    dead = [_mention(lobby, pid) for pid in lobby['dead']]
     bullets = lobby.get("bullets", [])
     blanks = bullets.count("blank")
     live = bullets.count("live")
 
-    await context.bot.send_message(
-        chat_id=chat_id,
-        text=(
-            f"💥 Патроны: {blanks} холостых, {live} боевых\n"
-            f"🙂 Живые: {len(alive)} — {', '.join(alive)}\n"
-            f"☠️ Мертвые: {len(dead)} — {', '.join(dead) if dead else '—'}"
-        ),
-        parse_mode="HTML"
+    return (
+        f"💥 Патроны: {blanks} холостых, {live} боевых\n"
+        f"🙂 Живые: {len(alive)} — {', '.join(alive)}\n"
+        f"☠️ Мертвые: {len(dead)} — {', '.join(dead) if dead else '—'}"
     )
 
 
+# === Передача хода игроку: табло + таймер ===
+async def prompt_turn(chat_id, context, lobby, player_id):
+    lobby["waiting"] = player_id
+    lobby["turn"] = lobby.get("turn", 0) + 1
+    await render_board(
+        chat_id, context, lobby,
+        f"🔁 Сейчас ходит: {_mention(lobby, player_id)}\n"
+        f"Команды: \n<code>!shootme</code> или <code>!shoot @username</code> или ответом на сообщение\n"
+        f"⏳ У тебя 60 секунд на ход!"
+    )
+    asyncio.create_task(auto_shoot_timeout(chat_id, context, player_id, lobby["turn"]))
+
+
 # === Следующий ход или конец игры ===
 async def next_turn_or_end(chat_id, context, lobby):
     if len(lobby["alive"]) == 1:
         winner_id = lobby["alive"][0]
-        winner_name = lobby["player_names"].get(winner_id, winner_id)
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=f"🏆 Победитель: <a href='tg://user?id={winner_id}'>@{winner_name}</a>",
-            parse_mode="HTML"
-        )
         del context.chat_data[chat_id]
+        await render_board(chat_id, context, lobby, f"🏆 Победитель: {_mention(lobby, winner_id)}")
     else:
-        current_player = lobby["alive"][lobby["current_index"]]
-        lobby["waiting"] = current_player
-        current_name = lobby["player_names"].get(current_player, "Игрок")
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=(
-                f"🔁 Сейчас ходит: <a href='tg://user?id={current_player}'>@{current_name}</a>\n"
-                f"Команды: \n<code>!shootme</code> или <code>!shoot @username</code> или ответом на сообщение\n"
-                f"⏳ У тебя 60 секунд на ход!"
-            ),
-            parse_mode="HTML"
-        )
-        asyncio.create_task(auto_shoot_timeout(chat_id, context, current_player))
+        await prompt_turn(chat_id, context, lobby, lobby["alive"][lobby["current_index"]])
 
 
 # === Ход: выстрел в себя ===
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def shootme_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     chat_id = str(message.chat_id)
@@ -156,6 +179,7 @@ async def shootme_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # === Ход: выстрел в другого ===
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def shoot_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     chat_id = str(message.chat_id)
@@ -176,44 +200,48 @@ async def shoot_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return await message.reply_text("Укажите цель через @username или ответом на сообщение.")
 
         username = parts[1][1:]
-        target_user_id = get_user_id_by_username(username)
+        target_user_id = await run_db(get_user_id_by_username, username)
         if not target_user_id:
             return await message.reply_text("❌ Игрок с таким именем не найден среди живых участников.")
+        target_user_id = str(target_user_id)  # id игроков в лобби хранятся строками
 
     if target_user_id not in lobby["alive"]:
         return await message.reply_text("Игрок уже мертв или не участвует в игре.")
 
     result = lobby["bullets"].pop(0)
     if result == "blank":
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=(
-                f"🔫 <a href='tg://user?id={user_id}'>@{lobby['player_names'][user_id]}</a> выстрелил в <a href='tg://user?id={target_user_id}'>@{lobby['player_names'][target_user_id]}</a> — <b>Промах!</b>"
-            ),
-            parse_mode="HTML"
-        )
+        add_event(lobby, f"🔫 {_mention(lobby, user_id)} выстрелил в {_mention(lobby, target_user_id)} — <b>Промах!</b>")
         lobby["current_index"] = (lobby["current_index"] + 1) % len(lobby["alive"])
     else:
         lobby["dead"].append(target_user_id)
         lobby["alive"].remove(target_user_id)
         lobby["bullets"] = lobby["original_bullets"].copy()
         random.shuffle(lobby["bullets"])
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=(
-                f"🔫 <a href='tg://user?id={user_id}'>@{lobby['player_names'][user_id]}</a> выстрелил в <a href='tg://user?id={target_user_id}'>@{lobby['player_names'][target_user_id]}</a> — 💀 <b>Убит!</b>"
-            ),
-            parse_mode="HTML"
-        )
+        add_event(lobby, f"🔫 {_mention(lobby, user_id)} выстрелил в {_mention(lobby, target_user_id)} — 💀 <b>Убит!</b>")
         if lobby["current_index"] >= len(lobby["alive"]):
             lobby["current_index"] = 0
 
-    await show_status(chat_id, context, lobby)
     await next_turn_or_end(chat_id, context, lobby)
 
 
+# === Очистка брошенных лобби (фоновая задача) ===
+def cleanup_stale_lobbies(chat_data_by_chat) -> int:
+    """
+    Удаляет лобби, которые дольше LOBBY_TTL ждут !startgame. Возвращает число удалённых.
+    """
+    deadline = datetime.now().timestamp() - LOBBY_TTL
+    removed = 0
+    for chat_data in chat_data_by_chat.values():
+        for key, lobby in list(chat_data.items()):
+            if isinstance(lobby, dict) and lobby.get("state") == "lobby" and lobby.get("joined_time", 0) < deadline:
+                del chat_data[key]
+                removed += 1
+    return removed
+
+
 # === Хендлер начала игры !roulette ===
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def roulette_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     chat_id = str(message.chat_id)
@@ -240,6 +268,7 @@ async def roulette_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # === Хендлер подключения к игре !join ===
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def join_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     chat_id = str(message.chat_id)
@@ -261,6 +290,7 @@ async def join_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # === Хендлер запуска игры !startgame ===
 @only_group_chats
+@send_priority(PRIORITY_GAME)
 async def start_game_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     chat_id = str(message.chat_id)
@@ -290,9 +320,11 @@ async def start_game_handler(update: Update, context: ContextTypes.DEFAULT_TYPE)
         "bullets": bullets,
         "original_bullets": bullets.copy(),
         "current_index": 0,
-        "waiting": None
+        "waiting": None,
+        "turn": 0,
+        "log": ["💥 Игра начинается!"],
+        "board_message_id": None
     })
 
-    await message.reply_text("💥 Игра начинается!")
-    await show_status(chat_id, context, lobby)
+    # Первое табло отправляется новым сообщением, дальше оно только редактируется
     await next_turn_or_end(chat_id, context, lobby)
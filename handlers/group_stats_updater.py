@@ -1,146 +1,274 @@
-import json
-import os
+import logging
+import threading
 from datetime import datetime, timedelta
-from collections import defaultdict
 
-STATS_PATH = "database/group_stats.json"
+from utils.db import STATS_DB, transaction, fetchall
+from utils.distinct_counter import DistinctCounter
+from utils.panel_cache import PANEL_GROUP, bump
+from utils.top_k import TopK
 
+# Как часто (в секундах) накопленная статистика сбрасывается в базу
+STATS_FLUSH_INTERVAL = 60
 
-def load_stats():
-    if not os.path.exists(STATS_PATH):
-        return {}
-    with open(STATS_PATH, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+# Окна статистики в днях (включая сегодняшний)
+MESSAGE_WINDOW_DAYS = 3
+BAN_WINDOW_DAYS = 7
 
+# Размеры лидербордов
+TOP_USERS = 10
+TOP_BANNERS = 5
 
-def save_stats(stats):
-    with open(STATS_PATH, "w", encoding="utf-8") as f:
-        json.dump(stats, f, indent=2, ensure_ascii=False)
 
+class _ChatStats:
+    """
+    Счётчики одной группы в памяти.
+    """
 
-def get_today_date():
-    return datetime.utcnow().strftime("%Y-%m-%d")
-
-
-def rotate_blocks(block_list, max_blocks=3):
-    if len(block_list) > max_blocks:
-        block_list.pop(0)
-    return block_list
-
-
-def update_message_stat(chat_id, user_id, username=None):
-    stats = load_stats()
-    chat_id = str(chat_id)
-    today = get_today_date()
+    def __init__(self):
+        self.messages: dict[str, int] = {}                # дата -> сообщений
+        self.bans: dict[str, int] = {}                    # дата -> банов
+        self.active: dict[str, DistinctCounter] = {}      # дата -> уникальные писавшие
+        self.message_counters: dict[int, list] = {}       # user_id -> [сообщений, username]
+        self.ban_counters: dict[int, list] = {}           # admin_id -> [банов, username]
+        # Топы обновляются вместе со счётчиками, без сортировки всех участников
+        self.top_users = TopK(TOP_USERS)
+        self.top_banners = TopK(TOP_BANNERS)
 
-    if chat_id not in stats:
-        stats[chat_id] = {
-            "message_blocks": [],
-            "active_blocks": [],
-            "ban_blocks": [],
-            "message_counters": {},
-            "ban_counters": {}
-        }
 
-    chat = stats[chat_id]
+# Статистика всех групп: chat_id -> _ChatStats
+_stats: dict[int, _ChatStats] = {}
 
-    # === Message block ===
-    if not chat["message_blocks"] or chat["message_blocks"][-1]["date"] != today:
-        chat["message_blocks"].append({"date": today, "count": 0})
-        chat["message_blocks"] = rotate_blocks(chat["message_blocks"], 3)
+# Что изменилось с последнего сброса в базу
+_dirty_days: set[tuple] = set()        # (chat_id, дата)
+_dirty_active: set[tuple] = set()      # (chat_id, дата)
+_dirty_counters: set[tuple] = set()    # (chat_id, kind, user_id), kind: 'msg' | 'ban'
+_lock = threading.Lock()
 
-    chat["message_blocks"][-1]["count"] += 1
 
-    # === Active users block ===
-    if not chat["active_blocks"] or chat["active_blocks"][-1]["date"] != today:
-        chat["active_blocks"].append({"date": today, "users": []})
-        chat["active_blocks"] = rotate_blocks(chat["active_blocks"], 3)
+def get_today_date():
+    return datetime.utcnow().strftime("%Y-%m-%d")
 
-    if user_id not in chat["active_blocks"][-1]["users"]:
-        chat["active_blocks"][-1]["users"].append(user_id)
 
-    # === User weekly message counter ===
-    uid = str(user_id)
-    if "message_counters" not in chat:
-        chat["message_counters"] = {}
-    if uid not in chat["message_counters"]:
-        chat["message_counters"][uid] = {"count": 0, "username": username or ""}
+def _window_start(days: int) -> str:
+    return (datetime.utcnow() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+
+
+def _chat(chat_id: int) -> _ChatStats:
+    chat = _stats.get(chat_id)
+    if chat is None:
+        chat = _stats[chat_id] = _ChatStats()
+    return chat
+
+
+def _prune(chat: _ChatStats):
+    # Старые дни больше не попадают ни в одно окно — убираем их из памяти
+    message_start = _window_start(MESSAGE_WINDOW_DAYS)
+    ban_start = _window_start(BAN_WINDOW_DAYS)
+    for day in [d for d in chat.messages if d < message_start]:
+        del chat.messages[day]
+    for day in [d for d in chat.active if d < message_start]:
+        del chat.active[day]
+    for day in [d for d in chat.bans if d < ban_start]:
+        del chat.bans[day]
+
+
+# 📌 Инициализация таблиц и загрузка статистики в память
+def init_stats_db():
+    with transaction(STATS_DB) as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS daily_stats (
+                chat_id INTEGER,
+                date TEXT,
+                messages INTEGER DEFAULT 0,
+                bans INTEGER DEFAULT 0,
+                PRIMARY KEY (chat_id, date)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS daily_active (
+                chat_id INTEGER,
+                date TEXT,
+                users BLOB,
+                PRIMARY KEY (chat_id, date)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS user_counters (
+                chat_id INTEGER,
+                kind TEXT,
+                user_id INTEGER,
+                count INTEGER DEFAULT 0,
+                username TEXT,
+                PRIMARY KEY (chat_id, kind, user_id)
+            )
+        """)
+
+    ban_start = _window_start(BAN_WINDOW_DAYS)
+    message_start = _window_start(MESSAGE_WINDOW_DAYS)
+    days = fetchall(STATS_DB, "SELECT chat_id, date, messages, bans FROM daily_stats WHERE date >= ?", (ban_start,))
+    active = fetchall(STATS_DB, "SELECT chat_id, date, users FROM daily_active WHERE date >= ?", (message_start,))
+    counters = fetchall(STATS_DB, "SELECT chat_id, kind, user_id, count, username FROM user_counters")
+
+    with _lock:
+        for chat_id, day, messages, bans in days:
+            chat = _chat(chat_id)
+            if day >= message_start:
+                chat.messages.setdefault(day, messages)
+            chat.bans.setdefault(day, bans)
+        for chat_id, day, users in active:
+            _chat(chat_id).active.setdefault(day, DistinctCounter.from_bytes(users))
+        for chat_id, kind, user_id, count, username in counters:
+            chat = _chat(chat_id)
+            if kind == "msg":
+                chat.message_counters.setdefault(user_id, [count, username or ""])
+                chat.top_users.offer(user_id, count)
+            else:
+                chat.ban_counters.setdefault(user_id, [count, username or ""])
+                chat.top_banners.offer(user_id, count)
+
+
+# 📌 Обновление счётчиков (только память, без обращения к диску)
+def update_message_stat(chat_id, user_id, username=None):
+    today = get_today_date()
+    with _lock:
+        chat = _chat(chat_id)
+        chat.messages[today] = chat.messages.get(today, 0) + 1
+        _dirty_days.add((chat_id, today))
 
-    chat["message_counters"][uid]["count"] += 1
-    if username:
-        chat["message_counters"][uid]["username"] = username
+        users = chat.active.get(today)
+        if users is None:
+            users = chat.active[today] = DistinctCounter()
+        if users.add(user_id):
+            _dirty_active.add((chat_id, today))
 
-    save_stats(stats)
+        counter = chat.message_counters.setdefault(user_id, [0, username or ""])
+        counter[0] += 1
+        if username:
+            counter[1] = username
+        chat.top_users.offer(user_id, counter[0])
+        _dirty_counters.add((chat_id, "msg", user_id))
 
 
 def update_ban_stat(chat_id, admin_id, admin_username=None):
-    stats = load_stats()
-    chat_id = str(chat_id)
     today = get_today_date()
-
-    if chat_id not in stats:
-        stats[chat_id] = {
-            "message_blocks": [],
-            "active_blocks": [],
-            "ban_blocks": [],
-            "message_counters": {},
-            "ban_counters": {}
-        }
-
-    chat = stats[chat_id]
-
-    # === Ban block ===
-    if not chat["ban_blocks"] or chat["ban_blocks"][-1]["date"] != today:
-        chat["ban_blocks"].append({"date": today, "count": 0})
-        chat["ban_blocks"] = rotate_blocks(chat["ban_blocks"], 7)
-
-    chat["ban_blocks"][-1]["count"] += 1
-
-    # === Admin ban counter ===
-    aid = str(admin_id)
-    if aid not in chat["ban_counters"]:
-        chat["ban_counters"][aid] = {"count": 0, "username": admin_username or ""}
-
-    chat["ban_counters"][aid]["count"] += 1
-    if admin_username:
-        chat["ban_counters"][aid]["username"] = admin_username
-
-    save_stats(stats)
-
-
+    with _lock:
+        chat = _chat(chat_id)
+        chat.bans[today] = chat.bans.get(today, 0) + 1
+        _dirty_days.add((chat_id, today))
+
+        counter = chat.ban_counters.setdefault(admin_id, [0, admin_username or ""])
+        counter[0] += 1
+        if admin_username:
+            counter[1] = admin_username
+        chat.top_banners.offer(admin_id, counter[0])
+        _dirty_counters.add((chat_id, "ban", admin_id))
+
+
+# 📌 Пакетная запись изменений в базу (по таймеру и при остановке)
+def flush_stats() -> int:
+    """
+    Записывает изменённые счётчики в group_stats.db одной транзакцией
+    и удаляет дни, вышедшие из окон статистики. Возвращает число записанных строк.
+    """
+    with _lock:
+        if not (_dirty_days or _dirty_active or _dirty_counters):
+            return 0
+        day_rows = []
+        for chat_id, day in _dirty_days:
+            chat = _stats[chat_id]
+            day_rows.append((chat_id, day, chat.messages.get(day, 0), chat.bans.get(day, 0)))
+        active_rows = []
+        for chat_id, day in _dirty_active:
+            users = _stats[chat_id].active.get(day)
+            if users is not None:
+                active_rows.append((chat_id, day, users.to_bytes()))
+        counter_rows = []
+        for chat_id, kind, user_id in _dirty_counters:
+            chat = _stats[chat_id]
+            count, username = (chat.message_counters if kind == "msg" else chat.ban_counters)[user_id]
+            counter_rows.append((chat_id, kind, user_id, count, username))
+        _dirty_days.clear()
+        _dirty_active.clear()
+        _dirty_counters.clear()
+        for chat in _stats.values():
+            _prune(chat)
+
+    try:
+        with transaction(STATS_DB) as conn:
+            # В памяти хранятся итоговые значения, поэтому в базу пишутся они, а не приращения
+            conn.executemany("""
+                INSERT INTO daily_stats (chat_id, date, messages, bans) VALUES (?, ?, ?, ?)
+                ON CONFLICT(chat_id, date) DO UPDATE SET messages=excluded.messages, bans=excluded.bans
+            """, day_rows)
+            conn.executemany("""
+                INSERT INTO daily_active (chat_id, date, users) VALUES (?, ?, ?)
+                ON CONFLICT(chat_id, date) DO UPDATE SET users=excluded.users
+            """, active_rows)
+            conn.executemany("""
+                INSERT INTO user_counters (chat_id, kind, user_id, count, username) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(chat_id, kind, user_id) DO UPDATE SET count=excluded.count, username=excluded.username
+            """, counter_rows)
+            conn.execute("DELETE FROM daily_stats WHERE date < ?", (_window_start(BAN_WINDOW_DAYS),))
+            conn.execute("DELETE FROM daily_active WHERE date < ?", (_window_start(MESSAGE_WINDOW_DAYS),))
+    except Exception:
+        # Помечаем строки снова изменёнными — запишутся при следующем сбросе
+        with _lock:
+            _dirty_days.update((chat_id, day) for chat_id, day, _, _ in day_rows)
+            _dirty_active.update((chat_id, day) for chat_id, day, _ in active_rows)
+            _dirty_counters.update((chat_id, kind, user_id) for chat_id, kind, user_id, _, _ in counter_rows)
+        logging.exception("Не удалось сохранить статистику групп")
+        return 0
+
+    # Страница статистики в панели группы перерисуется при следующем «Обновить»
+    for chat_id in {row[0] for rows in (day_rows, active_rows, counter_rows) for row in rows}:
+        bump(chat_id, PANEL_GROUP)
+    return len(day_rows) + len(active_rows) + len(counter_rows)
+
+
+# 📌 Чтение статистики (из памяти)
 def get_3day_message_count(chat_id):
-    stats = load_stats()
-    blocks = stats.get(str(chat_id), {}).get("message_blocks", [])
-    return sum(block["count"] for block in blocks)
+    start = _window_start(MESSAGE_WINDOW_DAYS)
+    with _lock:
+        chat = _stats.get(chat_id)
+        if chat is None:
+            return 0
+        return sum(count for day, count in chat.messages.items() if day >= start)
 
 
 def get_3day_active_users(chat_id):
-    stats = load_stats()
-    blocks = stats.get(str(chat_id), {}).get("active_blocks", [])
-    users = set()
-    for block in blocks:
-        users.update(block["users"])
-    return len(users)
+    start = _window_start(MESSAGE_WINDOW_DAYS)
+    with _lock:
+        chat = _stats.get(chat_id)
+        if chat is None:
+            return 0
+        # Объединение дневных счётчиков: точное для малых групп, оценка HyperLogLog для больших
+        users = DistinctCounter()
+        for day, day_users in chat.active.items():
+            if day >= start:
+                users.update(day_users)
+        return len(users)
 
 
 def get_7day_bans(chat_id):
-    stats = load_stats()
-    blocks = stats.get(str(chat_id), {}).get("ban_blocks", [])
-    return sum(block["count"] for block in blocks)
+    start = _window_start(BAN_WINDOW_DAYS)
+    with _lock:
+        chat = _stats.get(chat_id)
+        if chat is None:
+            return 0
+        return sum(count for day, count in chat.bans.items() if day >= start)
+
+
+def _top(top: TopK, counters: dict):
+    return [(i + 1, counters[uid][1], count) for i, (uid, count) in enumerate(top.items())]
 
 
 def get_top10_users(chat_id):
-    stats = load_stats()
-    counters = stats.get(str(chat_id), {}).get("message_counters", {})
-    top = sorted(counters.items(), key=lambda x: x[1]["count"], reverse=True)[:10]
-    return [(i + 1, v["username"], v["count"]) for i, (uid, v) in enumerate(top)]
+    with _lock:
+        chat = _stats.get(chat_id)
+        return _top(chat.top_users, chat.message_counters) if chat else []
 
 
 def get_top5_banners(chat_id):
-    stats = load_stats()
-    counters = stats.get(str(chat_id), {}).get("ban_counters", {})
-    top = sorted(counters.items(), key=lambda x: x[1]["count"], reverse=True)[:5]
-    return [(i + 1, v["username"], v["count"]) for i, (uid, v) in enumerate(top)]
+    with _lock:
+        chat = _stats.get(chat_id)
+        return _top(chat.top_banners, chat.ban_counters) if chat else []
@@ -1,5 +1,4 @@
 import logging
-import json
 from datetime import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.helpers import mention_html
@@ -11,10 +10,10 @@ from handlers.admin.moderation_db import (
     get_all_roles_with_levels,
     get_admin_permissions_for_role
 )
-
-# Статические пути к базам данных
-ADMIN_DB = "database/admin_db.json"
-STATS_DB = "database/group_stats.json"
+from handlers.group_stats_updater import get_3day_message_count, get_3day_active_users, get_7day_bans
+from utils.db import run_db
+from utils.chat_members import get_chat_member_count, resolve_names
+from utils.panel_cache import PANEL_GROUP, render_cached, coalesce_clicks, edit_panel, remember_shown
 
 # Полный список приватных команд для контроля прав
 # Не забываем про edit_admin.py
@@ -32,7 +31,7 @@ async def group_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     chat = update.effective_chat
     try:
-        member_count = await context.bot.get_chat_member_count(chat.id)
+        member_count = await get_chat_member_count(context.bot, chat.id)
     except Exception as e:
         logging.error(f"Ошибка при получении количества участников: {type(e).__name__} - {e}")
         member_count = "не удалось получить"
@@ -62,9 +61,11 @@ async def group_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await message.reply_text(info_page1, reply_markup=reply_markup, parse_mode="HTML")
+    sent = await message.reply_text(info_page1, reply_markup=reply_markup, parse_mode="HTML")
+    remember_shown(sent, info_page1, reply_markup)
 
 
+@coalesce_clicks
 async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -111,16 +112,37 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         next_page = current_page
 
     chat = update.effective_chat
-    text_content = ""
 
-    # ========== Page 1 ==========
+    # Количество участников и название чата меняются без записей в базу бота — входят в отметку версии страницы 1
+    stamp = None
     if next_page == "page1":
         try:
-            member_count = await context.bot.get_chat_member_count(chat.id)
+            member_count = await get_chat_member_count(context.bot, chat.id)
         except Exception as e:
             logging.error(f"Ошибка при получении количества участников: {type(e).__name__} - {e}")
             member_count = "не удалось получить"
+        stamp = (member_count, chat.title, chat.username)
+
+    # Страница перестраивается только после изменений ролей, прав или сброса статистики группы
+    text_content, reply_markup = await render_cached(
+        PANEL_GROUP, chat.id, (next_page, caller_id),
+        lambda: _build_group_page(next_page, chat, context, caller_id, stamp),
+        stamp=stamp
+    )
+
+    suffix = ""
+    if action == "group_refresh":
+        # Текст страницы 4 уже заканчивается переводом строки
+        suffix = "" if next_page == "page4" else "\n"
+        suffix += f"🔄 Обновлено! {datetime.now().strftime('%H:%M:%S')}"
+
+    await edit_panel(query, text_content, reply_markup, suffix=suffix)
 
+
+async def _build_group_page(next_page, chat, context, caller_id, stamp):
+    # ========== Page 1 ==========
+    if next_page == "page1":
+        member_count = stamp[0]
         text_content = (
             f"📊 <b>Информация о группе:</b>\n"
             f"🏷 Название: {chat.title}\n"
@@ -130,13 +152,11 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
         if chat.username:
             text_content += f"👤 Юзернейм: @{chat.username}\n"
         text_content += f"👥 Количество участников: {member_count}"
-        if action == "group_refresh":
-            text_content += f"\n🔄 Обновлено! {datetime.now().strftime('%H:%M:%S')}"
 
     # ========== Page 2 ==========
     elif next_page == "page2":
-        user_roles = get_all_user_roles(chat.id)
-        all_roles = get_all_roles_with_levels(chat.id)
+        user_roles = await run_db(get_all_user_roles, chat.id)
+        all_roles = await run_db(get_all_roles_with_levels, chat.id)
         if not user_roles or not all_roles:
             text_content = "❌ В этой группе пока нет кастомных админов."
         else:
@@ -145,28 +165,25 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
             for uid, role in user_roles:
                 role_to_users.setdefault(role, []).append(uid)
 
+            names = await resolve_names(context.bot, chat.id, [uid for uid, _ in user_roles])
+
             lines = ["📋 <b>Кастомные роли:</b>"]
             for role, level in sorted_roles:
                 users = role_to_users.get(role, [])
                 if not users: continue
                 mentions = []
                 for uid in users:
-                    try:
-                        member = await context.bot.get_chat_member(chat.id, uid)
-                        if member and member.user.username:
-                            mentions.append(f"@{member.user.username}")
-                        else:
-                            mentions.append(mention_html(uid, f"@id{uid}"))
-                    except:
+                    username = names.get(uid, (None, None))[0]
+                    if username:
+                        mentions.append(f"@{username}")
+                    else:
                         mentions.append(mention_html(uid, f"@id{uid}"))
                 lines.append(f"• <b>{role}</b> (lvl {level}) — {', '.join(mentions)}")
             text_content = "\n".join(lines)
-        if action == "group_refresh":
-            text_content += f"\n🔄 Обновлено! {datetime.now().strftime('%H:%M:%S')}"
 
     # ========== Page 3 ==========
     elif next_page == "page3":
-        roles = get_all_roles_with_levels(chat.id)
+        roles = await run_db(get_all_roles_with_levels, chat.id)
         if not roles:
             text_content = "❌ Роли не найдены"
         else:
@@ -174,7 +191,7 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
             lines = ["📖 <b>Список ролей, и их разрешения:</b>\n"]
             for role, lvl in sorted_roles:
                 lines.append(f"• <b>{role}</b> — уровень доступа <b>{lvl}</b>\n")
-                allowed = get_admin_permissions_for_role(chat.id, role)
+                allowed = await run_db(get_admin_permissions_for_role, chat.id, role)
                 denied = [cmd for cmd in ALL_COMMANDS if cmd not in allowed]
                 # Разрешённые
                 if allowed:
@@ -187,30 +204,20 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
                 #else:
                 #    lines.append("<b>❌ Запрещенных прав:</b> нету\n")
             text_content = "\n".join(lines)
-        if action == "group_refresh":
-            text_content += f"\n🔄 Обновлено! {datetime.now().strftime('%H:%M:%S')}"
 
     # ========== Page 4 ==========
     else:  # page4
-        try:
-            with open(STATS_DB, "r", encoding="utf-8") as f:
-                stats_data = json.load(f)
-            group_stats = stats_data.get(str(chat.id), {})
-            messages = group_stats.get("messages", 0)
-            active = group_stats.get("active_users", 0)
-            bans = group_stats.get("bans", 0)
-        except Exception as e:
-            logging.error(f"Ошибка чтения {STATS_DB}: {e}")
-            messages, active, bans = 0, 0, 0
+        # Счётчики хранятся в памяти (handlers/group_stats_updater.py)
+        messages = get_3day_message_count(chat.id)
+        active = get_3day_active_users(chat.id)
+        bans = get_7day_bans(chat.id)
 
         text_content = (
             "📈 <b>Статистика группы:</b>\n\n"
-            f"✉️ Сообщений за сутки: <b>{messages}</b>\n"
-            f"👥 Активных участников: <b>{active}</b>\n"
+            f"✉️ Сообщений за 3 дня: <b>{messages}</b>\n"
+            f"👥 Активных участников за 3 дня: <b>{active}</b>\n"
             f"⛔️ Бан(ов) за неделю: <b>{bans}</b>\n"
         )
-        if action == "group_refresh":
-            text_content += f"🔄 Обновлено! {datetime.now().strftime('%H:%M:%S')}"
 
     # Навигационная клавиатура (для всех страниц)
     page_num = next_page[-1]
@@ -226,4 +233,4 @@ async def group_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    await query.edit_message_text(text=text_content, parse_mode="HTML", reply_markup=reply_markup)
+    return text_content, reply_markup
@@ -2,6 +2,9 @@ from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes
 from datetime import datetime
 from core.check_group_chat import only_group_chats
+from utils.panel_cache import PANEL_HELP, render_cached, coalesce_clicks, edit_panel, remember_shown
+from utils.durations import format_seconds
+from handlers.funny.mute_random import get_mute_settings
 
 # ✅ ID Администраторов, которым доступна Дополнительная Информация в команде !help (доверенные пользователи)
 TRUSTED_USERS = [5403794760]  # Добавь нужные ID
@@ -16,14 +19,14 @@ async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     available_pages = get_available_help_pages(user_id)
     page = available_pages[0]
-    await update.message.reply_text(
-        text=generate_help_page(page),
-        reply_markup=generate_help_keyboard(user_id, page, available_pages),
-        parse_mode="HTML"
-    )
+    text = generate_help_page(page, update.effective_chat.id)
+    keyboard = generate_help_keyboard(user_id, page, available_pages)
+    message = await update.message.reply_text(text=text, reply_markup=keyboard, parse_mode="HTML")
+    remember_shown(message, text, keyboard)
 
 
 # === Обработка нажатий на кнопки ===
+@coalesce_clicks
 async def help_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -56,20 +59,23 @@ async def help_callback_handler(update: Update, context: ContextTypes.DEFAULT_TY
     else:
         next_page = current_page
 
-    # Текст и кнопки
-    text_content = generate_help_page(next_page)
-    if action == "help_refresh":
-        text_content += f"\n\n🔄 Обновлено: {datetime.now().strftime('%H:%M:%S')}"
-
-    await query.edit_message_text(
-        text=text_content,
-        reply_markup=generate_help_keyboard(sender_id, next_page, available_pages),
-        parse_mode="HTML"
+    # Текст и кнопки строятся один раз для страницы и пользователя;
+    # настройки мута группы (страница 3) — в stamp, после !mute-set справка перестраивается
+    chat_id = query.message.chat.id
+    text_content, keyboard = await render_cached(
+        PANEL_HELP, chat_id, (next_page, sender_id),
+        lambda: (generate_help_page(next_page, chat_id), generate_help_keyboard(sender_id, next_page, available_pages)),
+        stamp=get_mute_settings(chat_id)
     )
+    suffix = f"\n\n🔄 Обновлено: {datetime.now().strftime('%H:%M:%S')}" if action == "help_refresh" else ""
+
+    # Если на экране уже то же самое — запрос на редактирование не отправляется
+    await edit_panel(query, text_content, keyboard, suffix=suffix)
 
 
 # === Содержимое страниц ===
-def generate_help_page(page: str) -> str:
+def generate_help_page(page: str, chat_id: int) -> str:
+    mute_chance, mute_duration = get_mute_settings(chat_id)
     help_texts = {
         "page1": (
             "📘 <b>Доступные команды:</b>\n\n"
@@ -94,7 +100,8 @@ def generate_help_page(page: str) -> str:
         "page3": (
             "🎮 <b>Развлечения:</b>\n\n"
             
-            "⚠️ Есть 0.5% шанс получить блокировку чата на 1 минуту :D\n\n"
+            f"⚠️ Есть {mute_chance * 100:g}% шанс получить блокировку чата, длительность: {format_seconds(mute_duration)} :D\n"
+            "🎲 <code>!mute-set</code> chance &lt;0–100&gt; | duration &lt;срок: 90, 5m&gt; — Настроить шанс и длительность\n\n"
             
             "🎯 <b>Русская рулетка:</b>\n"
             "🔫 <code>!roulette</code> — Создать игровое лобби\n"
@@ -137,6 +144,7 @@ def generate_help_page(page: str) -> str:
             "🔐 <b>Команды Админов Бота:</b>\n\n"
             "📊 <code>!status</code> — Показать нагрузку системы\n"
             "🐞 <code>!debug-all</code> — Вывести подробную диагностику\n"
+            "🐢 <code>!perf</code> — Самые медленные хэндлеры\n"
             "💾 <code>!export_db</code> — Экспорт базы данных бота\n\n"
             "📤 <b>Команды в ЛС:</b>\n"
             "↩️ <code>/reply</code> — Ответ пользователю\n"
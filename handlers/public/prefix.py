@@ -6,6 +6,8 @@ from core.check_group_chat import only_group_chats
 from utils.users import get_user_id_by_username, register_user
 from handlers.admin.admin_access import has_access
 from handlers.admin.moderation_db import get_all_user_roles, get_user_max_role_level
+from utils.db import run_db
+from utils.chat_members import get_chat_member
 
 DEBUG_LOG = True
 
@@ -23,7 +25,7 @@ async def prefix_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Проверяем статус инициатора
     try:
-        initiator_member = await context.bot.get_chat_member(chat_id, user_id)
+        initiator_member = await get_chat_member(context.bot, chat_id, user_id)
         is_owner = (initiator_member.status == 'creator')
     except Exception as e:
         logging.error(f"Ошибка проверки статуса инициатора: {e}")
@@ -53,7 +55,7 @@ async def prefix_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             arg = parts[1]
             prefix = parts[2].strip()
             if arg.startswith('@'):
-                uid = get_user_id_by_username(arg[1:])
+                uid = await run_db(get_user_id_by_username, arg[1:])
                 if not uid:
                     await message.reply_text("Пользователь не найден.")
                     return
@@ -74,15 +76,15 @@ async def prefix_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Проверяем смену чужого префикса (игнор для владельца)
     if target_id != user_id and not is_owner:
-        if not has_access(chat_id, user_id, "!prefix"):
+        if not await run_db(has_access, chat_id, user_id, "!prefix"):
             await message.reply_text("⛔ У вас нет права использовать !prefix для других.")
             return
-        roles = get_all_user_roles(chat_id)
+        roles = await run_db(get_all_user_roles, chat_id)
         if not any(uid == user_id for uid, _ in roles):
             await message.reply_text("⛔ У вас должна быть кастомная роль, чтобы менять префикс другим.")
             return
-        initiator_level = get_user_max_role_level(chat_id, user_id)
-        target_level = get_user_max_role_level(chat_id, target_id)
+        initiator_level = await run_db(get_user_max_role_level, chat_id, user_id)
+        target_level = await run_db(get_user_max_role_level, chat_id, target_id)
         if initiator_level >= target_level:
             await message.reply_text(
                 "⛔ Вы не можете менять префикс пользователю с более высоким или равным уровнем доступа."
@@ -4,7 +4,10 @@ import json
 import os
 
 from handlers.admin.admin_access import has_access
+from utils.db import run_db
 from core.check_group_chat import only_group_chats
+from utils.chat_members import get_chat_member
+from utils.panel_cache import PANEL_RULES, bump, render_cached, coalesce_clicks, edit_panel, remember_shown
 
 RULES_DB = "database/rules_db.json"
 MAX_RULES_PAGES = 10
@@ -12,24 +15,33 @@ MAX_RULES_PAGES = 10
 # Conversation states for ConversationHandler
 ASK_PAGE, ASK_TEXT = range(2)
 
+# Правила в памяти: файл читается один раз, дальше обновляется вместе с save_rules
+_rules_data = None
+
 # Загружаем правила из файла
 
 
 def load_rules():
-    if not os.path.exists(RULES_DB):
-        return {}
-    with open(RULES_DB, 'r', encoding='utf-8') as f:
-        try:
-            return json.load(f)
-        except json.JSONDecodeError:
-            return {}
+    global _rules_data
+    if _rules_data is None:
+        _rules_data = {}
+        if os.path.exists(RULES_DB):
+            with open(RULES_DB, 'r', encoding='utf-8') as f:
+                try:
+                    _rules_data = json.load(f)
+                except json.JSONDecodeError:
+                    pass
+    # Копия, чтобы вызывающий код мог менять её до save_rules
+    return {chat_id: list(pages) for chat_id, pages in _rules_data.items()}
 
 # Сохраняем правила в файл
 
 
 def save_rules(data):
+    global _rules_data
     with open(RULES_DB, 'w', encoding='utf-8') as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
+    _rules_data = {chat_id: list(pages) for chat_id, pages in data.items()}
 
 # Получаем текст правил для нужной страницы
 
@@ -66,15 +78,14 @@ async def rules_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     page = 1
     total = max(1, len(rules))
     text = get_rules_for_page(chat_id, page)
+    keyboard = generate_rules_keyboard(user_id, page, total)
 
-    await update.message.reply_text(
-        text=text,
-        reply_markup=generate_rules_keyboard(user_id, page, total),
-        parse_mode="HTML"
-    )
+    message = await update.message.reply_text(text=text, reply_markup=keyboard, parse_mode="HTML")
+    remember_shown(message, text, keyboard)
 
 
 # Обработка нажатий на кнопки (переключение страниц)
+@coalesce_clicks
 async def rules_callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -102,16 +113,17 @@ async def rules_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
     else:
         return
 
-    text = get_rules_for_page(chat_id, next_page)
+    # Страница перестраивается только после !set-rules / !del-rules в этой группе
+    text, keyboard = await render_cached(
+        PANEL_RULES, update.effective_chat.id, (next_page, sender_id),
+        lambda: (get_rules_for_page(chat_id, next_page), generate_rules_keyboard(sender_id, next_page, total_pages))
+    )
+    suffix = ""
     if action == "rules_refresh":
         from datetime import datetime
-        text += f"\n🔄 Обновлено: {datetime.now().strftime('%H:%M:%S')}"
+        suffix = f"\n🔄 Обновлено: {datetime.now().strftime('%H:%M:%S')}"
 
-    await query.edit_message_text(
-        text=text,
-        reply_markup=generate_rules_keyboard(sender_id, next_page, total_pages),
-        parse_mode="HTML"
-    )
+    await edit_panel(query, text, keyboard, suffix=suffix)
 
 
 # === Установка правил через !set-rules ===
@@ -119,11 +131,11 @@ async def rules_callback_handler(update: Update, context: ContextTypes.DEFAULT_T
 async def set_rules_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     user = update.effective_user
-    member = await context.bot.get_chat_member(chat.id, user.id)
+    member = await get_chat_member(context.bot, chat.id, user.id)
 
     # Теперь разрешаем не только создателю, но и администраторам с правом !set-rules
     if not (member.status == ChatMember.OWNER or member.status == "creator"
-            or has_access(chat.id, user.id, "!set-rules")):
+            or await run_db(has_access, chat.id, user.id, "!set-rules")):
         await update.message.reply_text("⛔ У вас нет прав для установки правил.")
         return ConversationHandler.END
 
@@ -182,6 +194,7 @@ async def set_rules_receive_text(update: Update, context: ContextTypes.DEFAULT_T
     rules[page - 1] = update.message.text.strip()
     rules_data[chat_id] = rules
     save_rules(rules_data)
+    bump(update.effective_chat.id, PANEL_RULES)
 
     await update.message.reply_text(f"✅ Правила для страницы {page} сохранены!")
     return ConversationHandler.END
@@ -197,11 +210,11 @@ async def set_rules_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def delete_rules_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat = update.effective_chat
     user = update.effective_user
-    member = await context.bot.get_chat_member(chat.id, user.id)
+    member = await get_chat_member(context.bot, chat.id, user.id)
 
     # Разрешаем владельцу и администраторам с правом !del-rules
     if not (member.status == ChatMember.OWNER or member.status == "creator"
-            or has_access(chat.id, user.id, "!del-rules")):
+            or await run_db(has_access, chat.id, user.id, "!del-rules")):
         await update.message.reply_text("⛔ У вас нет прав для удаления правил.")
         return
 
@@ -223,5 +236,6 @@ async def delete_rules_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     del rules[page_to_delete - 1]
     rules_data[chat_id] = rules
     save_rules(rules_data)
+    bump(chat.id, PANEL_RULES)
 
     await update.message.reply_text(f"🗑 Страница {page_to_delete} успешно удалена и порядок обновлён.")
\ No newline at end of file
@@ -1,24 +1,19 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.constants import ParseMode
 from telegram.helpers import mention_html
-from telegram.ext import ContextTypes, MessageHandler, CallbackQueryHandler, filters
+from telegram.ext import ContextTypes, CallbackQueryHandler
 
 from handlers.admin.moderation_db import get_all_user_roles, get_all_roles_with_levels
+from utils.db import run_db
 from core.check_group_chat import only_group_chats
-
-
-# 📌 Получить объект ChatMember или None
-async def get_user_or_none(chat_id: int, user_id: int, context: ContextTypes.DEFAULT_TYPE):
-    try:
-        return await context.bot.get_chat_member(chat_id, user_id)
-    except Exception:
-        return None
+from utils.chat_members import resolve_names
+from utils.panel_cache import PANEL_VIEW_ADMINS, render_cached, edit_panel, remember_shown
 
 
 # 📋 Генерация страницы с кастомными админами
 async def build_admins_page(chat_id: int, context: ContextTypes.DEFAULT_TYPE, owner_id: int):
-    user_roles = get_all_user_roles(chat_id)
-    all_roles = get_all_roles_with_levels(chat_id)
+    user_roles = await run_db(get_all_user_roles, chat_id)
+    all_roles = await run_db(get_all_roles_with_levels, chat_id)
 
     if not user_roles or not all_roles:
         return "❌ В этой группе пока нет кастомных админов.", None
@@ -28,15 +23,18 @@ async def build_admins_page(chat_id: int, context: ContextTypes.DEFAULT_TYPE, ow
     for user_id, role in user_roles:
         role_to_users.setdefault(role, []).append(user_id)
 
+    # Имена всех админов одним пакетом: из users.db, недостающие — параллельно у Telegram
+    names = await resolve_names(context.bot, chat_id, [uid for uid, _ in user_roles])
+
     lines = ["📋 <b>Кастомные роли:</b>"]
     for role, level in sorted_roles:
         users = role_to_users.get(role, [])
         if users:
             mentions = []
             for uid in users:
-                member = await get_user_or_none(chat_id, uid, context)
-                if member and member.user.username:
-                    mentions.append(f"@{member.user.username}")
+                username = names.get(uid, (None, None))[0]
+                if username:
+                    mentions.append(f"@{username}")
                 else:
                     mentions.append(mention_html(uid, f"@id{uid}"))
             lines.append(f"• <b>{role}</b> (lvl {level}) — {', '.join(mentions)}")
@@ -49,7 +47,7 @@ async def build_admins_page(chat_id: int, context: ContextTypes.DEFAULT_TYPE, ow
 
 # 📜 Генерация страницы с ролями
 async def build_roles_page(chat_id: int, owner_id: int):
-    roles = get_all_roles_with_levels(chat_id)
+    roles = await run_db(get_all_roles_with_levels, chat_id)
     if not roles:
         return "❌ Роли не найдены", None
 
@@ -73,8 +71,12 @@ async def view_admins_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
-    text, keyboard = await build_admins_page(chat_id, context, user_id)
-    await message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+    text, keyboard = await render_cached(
+        PANEL_VIEW_ADMINS, chat_id, ("view_admins", user_id),
+        lambda: build_admins_page(chat_id, context, user_id)
+    )
+    sent = await message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+    remember_shown(sent, text, keyboard)
 
 
 # 🔁 Обработка переключений между страницами
@@ -96,21 +98,19 @@ async def view_admins_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         await query.answer("⛔ Только вызывающий может управлять панелью.", show_alert=True)
         return
 
+    # Страницы перестраиваются только после изменения ролей в этой группе
     if action == "view_roles":
-        text, keyboard = await build_roles_page(chat_id, owner_id)
+        build = lambda: build_roles_page(chat_id, owner_id)
     elif action == "view_admins":
-        text, keyboard = await build_admins_page(chat_id, context, owner_id)
+        build = lambda: build_admins_page(chat_id, context, owner_id)
     else:
         return
 
-    await query.edit_message_text(text=text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+    text, keyboard = await render_cached(PANEL_VIEW_ADMINS, chat_id, (action, owner_id), build)
+    await edit_panel(query, text, keyboard, parse_mode=ParseMode.HTML)
 
 
 # 📦 Регистрация хэндлеров
-view_admins_handler_obj = MessageHandler(
-    filters.TEXT & filters.Regex(r"^!view-admins"), view_admins_handler
-)
-
 view_admins_callback_obj = CallbackQueryHandler(
-    view_admins_callback, pattern=r"^view_.*\\|"
+    view_admins_callback, pattern=r"^view_.*\|"
 )
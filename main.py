@@ -1,10 +1,23 @@
+from utils import startup_profile  # первым: момент запуска процесса для аптайма и профиля запуска
+import asyncio
 import logging
 import sys
+from telegram import Update
 from telegram.ext import Application
-from core.config import TOKEN
-from utils.setup_jobqueue import setup_jobqueue  # заглушка или реальная инициализация
+from core.config import TOKEN, BOT_MODE
+from core.update_processor import ChatOrderedUpdateProcessor
+from utils.setup_jobqueue import setup_jobqueue, shutdown_jobs  # фоновые задачи (сброс буферов, очистка, чекпоинты)
 from core.setup_handlers import setup_all_handlers  # всё подключение хэндлеров здесь
 from utils.users import init_db
+from utils.db import close_all, run_db
+from utils.rate_limiter import PriorityRateLimiter
+from handlers.group_stats_updater import init_stats_db
+from handlers.bot_administrators.chat_bot import init_chat_history_db
+from handlers.funny.mute_random import init_mute_db
+from handlers.funny.feed_the_pet import init_whale_db
+from handlers.admin.moderation_db import init_moderation_db, init_user_roles_db
+from handlers.admin.ban_user import init_bans_db
+from handlers.admin.ban_scheduler import init_unban_db
 
 # Логирование
 logging.basicConfig(
@@ -16,17 +29,61 @@ logging.basicConfig(
 logging.getLogger("telegram.ext").setLevel(logging.INFO)
 logging.getLogger("telegram.bot").setLevel(logging.INFO)
 
+startup_profile.step("импорты")
 
-# 🚀 post_init: вызывается после запуска — инициализирует очередь и пишет сообщение о перезапуске
-async def post_init(app):
+
+# 🗄️ Вся схема баз (CREATE TABLE, индексы, миграции) — здесь, а не при импорте модулей хэндлеров
+def init_databases():
     init_db()
+    init_stats_db()
+    init_chat_history_db()
+    init_moderation_db()
+    init_user_roles_db()
+    init_mute_db()
+    init_whale_db()
+    # Порядок важен: init_bans_db вливает баны из старого handlers/database/bans.db,
+    # а init_unban_db при первом запуске ставит в очередь неистёкшие сроки уже из объединённой таблицы bans
+    init_bans_db()
+    init_unban_db()
+
+
+# 🚀 post_init: вызывается после запуска — создаёт схему баз, запускает фоновые задачи и пишет профиль запуска
+async def post_init(app):
+    await run_db(init_databases)
+    startup_profile.step("схема баз")
     await setup_jobqueue(app)
+    startup_profile.step("фоновые задачи")
+    startup_profile.log_report()
+
+
+# 🛑 post_shutdown: вызывается при остановке — дописывает буферы и закрывает соединения с базами
+async def post_shutdown(app):
+    await shutdown_jobs(app)
+    close_all()
 
 
 def main():
-    app = Application.builder().token(TOKEN).post_init(post_init).build()
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        .rate_limiter(PriorityRateLimiter())  # очередь отправки с учётом лимитов Telegram и приоритетов
+        .concurrent_updates(ChatOrderedUpdateProcessor())  # чаты параллельно, внутри чата — по порядку
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+    startup_profile.step("Application")
     setup_all_handlers(app)
-    app.run_polling()
+    startup_profile.step("хэндлеры")
+    if BOT_MODE == "webhook":
+        # Апдейты приходят на локальный HTTP-сервер (обычно за reverse proxy) — без задержки long polling.
+        # aiohttp нужен только в этом режиме
+        from core.webhook import run_webhook
+        asyncio.run(run_webhook(app))
+        return
+    # chat_member апдейты Telegram присылает только по явному запросу — без них не работают
+    # on_user_join и инвалидация кэша участников (utils/chat_members.py)
+    app.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == '__main__':
@@ -37,27 +94,37 @@ if __name__ == '__main__':
 ==============================================
 
 📌 Этот файл `main.py` — точка входа в Telegram-бота. Он отвечает за:
-- Инициализацию Telegram Application
+- Инициализацию Telegram Application (очередь отправки, параллельная обработка чатов)
 - Настройку логирования
 - Запуск всех хэндлеров (команд, callback-кнопок, сообщений и т.д.)
-- Обработку событий при старте (например, сообщение после перезапуска)
-- Подключение JobQueue (если понадобится в будущем для фоновых задач)
+- Создание схемы всех баз одним шагом при старте
+- Запуск фоновых задач JobQueue и их последний прогон при остановке
 
 🧩 Основные этапы запуска:
 --------------------------
-1. 🔐 Импортируется токен из `utils/config.py`, полученный из `.env`.
+1. 🔐 Импортируется токен из `core/config.py`, полученный из `.env`.
+   Модули хэндлеров при импорте ничего не пишут в базы, тяжёлые библиотеки
+   (matplotlib, psutil, aiohttp) загружаются только там, где нужны.
 2. 🧱 Создаётся Telegram-приложение с помощью:
-       `Application.builder().token(TOKEN).post_init(post_init).build()`
-   - `post_init` — функция, вызываемая сразу после старта (подключает `JobQueue` и `on_bot_start`).
+       `Application.builder().token(TOKEN).post_init(post_init).post_shutdown(post_shutdown).build()`
 3. 🔌 В `setup_handlers.py` происходит регистрация всех хэндлеров (по группам, ролям, ЛС и т.д.)
-4. 📬 Включается режим `run_polling()` — бот начинает слушать сообщения.
+4. ⚙️ `post_init` — вызывается сразу после старта:
+   - `init_databases()` — вся схема баз и миграции (в т.ч. перенос старого handlers/database/bans.db);
+   - `setup_jobqueue()` — периодические задачи: сброс буферов пользователей и статистики,
+     очистка кэшей и лобби, сохранение метрик, WAL-чекпоинты, восстановление разбанов и размутов;
+   - профиль запуска пишется в лог.
+5. 📬 Включается режим `run_polling()` — бот начинает слушать сообщения.
+   При `BOT_MODE=webhook` вместо него запускается HTTP-сервер из `core/webhook.py`
+   (настройки `WEBHOOK_*` в `core/config.py`).
+6. 🛑 `post_shutdown` — последний сброс буферов и метрик, чекпоинт и закрытие соединений с базами.
 
 📂 Модули, участвующие в запуске:
 ---------------------------------
 - `main.py`                — основной файл, точка входа.
-- `utils/config.py`        — загрузка токена и логирования.
-- `setup_handlers.py`      — регистрирует все команды, callback'и и ConversationHandler.
-- `setup_jobqueue.py`      — заглушка для JobQueue (можно использовать позже для автоочистки, напоминаний).
+- `core/config.py`         — загрузка токена и настроек из `.env`.
+- `core/setup_handlers.py` — регистрирует все команды (роутер !-команд), callback'и и ConversationHandler.
+- `utils/setup_jobqueue.py` — фоновые задачи JobQueue и их статистика (показывается в `!debug-all`).
+- `utils/startup_profile.py` — профиль запуска: длительность этапов и время до первого апдейта
+  (пишется в лог и показывается в `!debug-all`).
 - `handlers/...`           — директория со всеми обработчиками (команды, callback, утилиты, игры, роли).
-- `creator_bot/restart_bot.py` — поддержка команды `!restart` и вывод инфо после перезапуска.
 """
\ No newline at end of file
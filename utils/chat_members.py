@@ -0,0 +1,113 @@
+import asyncio
+import time
+
+from telegram import Bot, ChatMember
+
+from utils.users import get_known_names, register_user
+
+# Сколько секунд ответы Telegram считаются актуальными
+MEMBER_TTL = 300
+MEMBER_COUNT_TTL = 60
+
+# При превышении размера кэша из него вычищаются устаревшие записи
+MAX_CACHED_MEMBERS = 10000
+
+# Как часто (в секундах) фоновая задача удаляет устаревшие записи кэша
+CACHE_EXPIRY_INTERVAL = 300
+
+# Сколько запросов get_chat_member одновременно делает resolve_names
+NAME_FETCH_CONCURRENCY = 8
+
+# (chat_id, user_id) -> (момент истечения, ChatMember)
+_members: dict[tuple, tuple] = {}
+# chat_id -> (момент истечения, количество участников)
+_member_counts: dict[int, tuple] = {}
+
+
+def _sweep():
+    now = time.monotonic()
+    for key in [k for k, (expires, _) in _members.items() if expires <= now]:
+        del _members[key]
+
+
+def expire_cache() -> int:
+    """
+    Удаляет из кэша истёкшие записи (фоновая задача). Возвращает, сколько осталось.
+    """
+    _sweep()
+    now = time.monotonic()
+    for chat_id in [c for c, (expires, _) in _member_counts.items() if expires <= now]:
+        del _member_counts[chat_id]
+    return len(_members)
+
+
+async def get_chat_member(bot: Bot, chat_id: int, user_id: int) -> ChatMember:
+    """
+    ChatMember из кэша (живёт MEMBER_TTL секунд) или запросом к Telegram.
+    Ошибки (пользователь не найден и т.п.) не кэшируются и пробрасываются как раньше.
+    """
+    key = (chat_id, user_id)
+    cached = _members.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    member = await bot.get_chat_member(chat_id, user_id)
+    remember_chat_member(chat_id, member)
+    return member
+
+
+async def get_chat_member_count(bot: Bot, chat_id: int) -> int:
+    cached = _member_counts.get(chat_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    count = await bot.get_chat_member_count(chat_id)
+    _member_counts[chat_id] = (time.monotonic() + MEMBER_COUNT_TTL, count)
+    return count
+
+
+def remember_chat_member(chat_id: int, member: ChatMember):
+    """
+    Кладёт в кэш свежий ChatMember (например, new_chat_member из апдейта chat_member).
+    """
+    if len(_members) >= MAX_CACHED_MEMBERS:
+        _sweep()
+    _members[(chat_id, member.user.id)] = (time.monotonic() + MEMBER_TTL, member)
+
+
+def invalidate_chat_member(chat_id: int, user_id: int):
+    """
+    Сбрасывает запись после действий бота, меняющих статус участника (бан, мут, разбан).
+    """
+    _members.pop((chat_id, user_id), None)
+    _member_counts.pop(chat_id, None)
+
+
+async def resolve_names(bot: Bot, chat_id: int, user_ids) -> dict:
+    """
+    Имена для панелей и рейтингов: {user_id: (username, first_name)}.
+    Сначала берутся из users.db (кэш utils/users.py), недостающие запрашиваются у Telegram
+    параллельно (не больше NAME_FETCH_CONCURRENCY одновременно) и сохраняются через register_user,
+    чтобы следующая отрисовка обошлась без запросов. Кого не удалось найти — в результате нет.
+    """
+    user_ids = list(dict.fromkeys(user_ids))
+    names = get_known_names(user_ids)
+    misses = [uid for uid in user_ids if uid not in names]
+    if not misses:
+        return names
+
+    semaphore = asyncio.Semaphore(NAME_FETCH_CONCURRENCY)
+
+    async def fetch(uid: int):
+        async with semaphore:
+            try:
+                return await get_chat_member(bot, chat_id, uid)
+            except Exception:
+                return None
+
+    for member in await asyncio.gather(*(fetch(uid) for uid in misses)):
+        if member is None:
+            continue
+        register_user(member.user)
+        names[member.user.id] = (member.user.username, member.user.first_name)
+    return names
@@ -0,0 +1,175 @@
+import asyncio
+import functools
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from utils.metrics import db_timer
+
+# Определяем корневой каталог проекта: поднимаемся на один уровень от каталога utils
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# BOT_DB_DIR — другой каталог баз (например, временный в benchmarks/replay_bench.py)
+DB_DIR = os.getenv("BOT_DB_DIR") or os.path.join(PROJECT_ROOT, "database")
+
+# Файлы баз данных бота
+USERS_DB = "users.db"
+MODERATION_DB = "moderation.db"
+BANS_DB = "bans.db"
+WHALE_DB = "whale_game.db"
+STATS_DB = "group_stats.db"
+CHAT_HISTORY_DB = "chat_history.db"
+
+# Сколько подготовленных выражений sqlite3 держит в кэше на одно соединение
+STATEMENT_CACHE_SIZE = 256
+
+# Как часто (в секундах) WAL-журналы переносятся в основные файлы баз
+WAL_CHECKPOINT_INTERVAL = 600
+
+# Долгоживущие соединения: одно на файл базы, плюс блокировка на каждое соединение
+_connections: dict[str, sqlite3.Connection] = {}
+_locks: dict[str, threading.RLock] = {}
+_registry_lock = threading.Lock()
+
+# Отдельный поток для всей работы с SQLite, чтобы запросы не блокировали event loop
+_executor: ThreadPoolExecutor | None = None
+
+
+def get_db_path(db_name: str) -> str:
+    """
+    Возвращает полный путь к файлу базы данных в каталоге database/.
+    """
+    return os.path.join(DB_DIR, db_name)
+
+
+def get_connection(db_name: str) -> sqlite3.Connection:
+    """
+    Возвращает общее соединение с базой (создаёт его при первом обращении).
+    Соединение живёт всё время работы бота, поэтому sqlite3 переиспользует
+    закэшированные подготовленные выражения вместо повторного разбора SQL.
+    """
+    conn = _connections.get(db_name)
+    if conn is not None:
+        return conn
+
+    with _registry_lock:
+        conn = _connections.get(db_name)
+        if conn is None:
+            os.makedirs(DB_DIR, exist_ok=True)
+            conn = sqlite3.connect(
+                get_db_path(db_name),
+                check_same_thread=False,
+                cached_statements=STATEMENT_CACHE_SIZE
+            )
+            # WAL-режим + NORMAL: запись без fsync на каждый commit, чтение не блокирует запись
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("PRAGMA busy_timeout=5000;")
+            _locks[db_name] = threading.RLock()
+            _connections[db_name] = conn
+    return conn
+
+
+@contextmanager
+def transaction(db_name: str):
+    """
+    Контекст для нескольких запросов в одной транзакции:
+    commit при успешном выходе, rollback при исключении.
+    """
+    conn = get_connection(db_name)
+    with _locks[db_name]:
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def fetchone(db_name: str, sql: str, params=()):
+    """
+    Выполняет SELECT и возвращает первую строку (или None).
+    """
+    conn = get_connection(db_name)
+    with _locks[db_name]:
+        return conn.execute(sql, params).fetchone()
+
+
+def fetchall(db_name: str, sql: str, params=()) -> list:
+    """
+    Выполняет SELECT и возвращает все строки.
+    """
+    conn = get_connection(db_name)
+    with _locks[db_name]:
+        return conn.execute(sql, params).fetchall()
+
+
+def execute(db_name: str, sql: str, params=()) -> int:
+    """
+    Выполняет изменяющий запрос и сразу фиксирует его.
+    Возвращает количество затронутых строк.
+    """
+    with transaction(db_name) as conn:
+        return conn.execute(sql, params).rowcount
+
+
+def executemany(db_name: str, sql: str, seq_of_params) -> int:
+    """
+    Выполняет один запрос для набора параметров в одной транзакции.
+    """
+    with transaction(db_name) as conn:
+        return conn.executemany(sql, seq_of_params).rowcount
+
+
+def checkpoint_all() -> int:
+    """
+    Переносит WAL-журналы открытых баз в основные файлы и обрезает их,
+    чтобы -wal файлы не росли между перезапусками. Возвращает число баз.
+    """
+    with _registry_lock:
+        names = list(_connections)
+    for db_name in names:
+        with _locks[db_name]:
+            _connections[db_name].execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    return len(names)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _registry_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+    return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Асинхронный доступ к базе: выполняет синхронную функцию работы с SQLite
+    в выделенном потоке и возвращает её результат.
+    Медленный диск или блокировка базы больше не останавливают обработку апдейтов.
+
+        roles = await run_db(get_user_roles, chat_id, user_id)
+    """
+    loop = asyncio.get_running_loop()
+    # Ожидание очереди тоже время хэндлера в базе (метрики !perf)
+    with db_timer():
+        return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+def close_all():
+    """
+    Дожидается очереди запросов и закрывает все открытые соединения (вызывается при остановке бота).
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+    with _registry_lock:
+        for db_name, conn in list(_connections.items()):
+            with _locks[db_name]:
+                conn.close()
+        _connections.clear()
+        _locks.clear()
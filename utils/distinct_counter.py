@@ -0,0 +1,122 @@
+import math
+import struct
+
+# Пока уникальных значений не больше порога — считаем точно (обычное множество)
+EXACT_THRESHOLD = 1024
+
+# Параметры HyperLogLog: 2^12 регистров по байту (~4 КБ), стандартная ошибка ~1.6%
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+_MASK64 = (1 << 64) - 1
+_EXACT, _HLL = b"E", b"H"
+
+
+def _hash64(value: int) -> int:
+    """
+    splitmix64: быстрое перемешивание целого числа (user_id) в 64-битный хэш.
+    """
+    z = (value + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return z ^ (z >> 31)
+
+
+class DistinctCounter:
+    """
+    Счётчик уникальных id с ограниченной памятью.
+    До EXACT_THRESHOLD значений хранит точное множество, затем переходит
+    на HyperLogLog (фиксированные ~4 КБ, добавление и оценка за O(1) по числу пользователей).
+
+        counter = DistinctCounter()
+        counter.add(user_id)
+        len(counter)
+    """
+
+    __slots__ = ("_exact", "_registers")
+
+    def __init__(self):
+        self._exact: set[int] | None = set()
+        self._registers: bytearray | None = None
+
+    @property
+    def is_exact(self) -> bool:
+        return self._exact is not None
+
+    def add(self, value: int) -> bool:
+        """
+        Добавляет значение. Возвращает True, если состояние счётчика изменилось.
+        """
+        if self._exact is not None:
+            if value in self._exact:
+                return False
+            self._exact.add(value)
+            if len(self._exact) > EXACT_THRESHOLD:
+                self._to_hll()
+            return True
+        return self._add_hash(_hash64(value))
+
+    def _add_hash(self, h: int) -> bool:
+        index = h >> (64 - HLL_PRECISION)
+        rest = (h << HLL_PRECISION) & _MASK64
+        # Позиция первой единицы в оставшихся битах (1..65-p)
+        rank = 64 - rest.bit_length() + 1 if rest else 64 - HLL_PRECISION + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+            return True
+        return False
+
+    def _to_hll(self):
+        values = self._exact
+        self._exact = None
+        self._registers = bytearray(HLL_REGISTERS)
+        for value in values:
+            self._add_hash(_hash64(value))
+
+    def update(self, other: "DistinctCounter"):
+        """
+        Объединяет другой счётчик с этим (для подсчёта уникальных за несколько дней).
+        """
+        if other._exact is not None:
+            for value in other._exact:
+                self.add(value)
+            return
+        if self._exact is not None:
+            self._to_hll()
+        registers = self._registers
+        for i, rank in enumerate(other._registers):
+            if rank > registers[i]:
+                registers[i] = rank
+
+    def __len__(self) -> int:
+        if self._exact is not None:
+            return len(self._exact)
+
+        m = HLL_REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -rank for rank in self._registers)
+        zeros = self._registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Поправка для малых значений: линейный подсчёт по пустым регистрам
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    # 📌 Сериализация для хранения в SQLite (BLOB)
+
+    def to_bytes(self) -> bytes:
+        if self._exact is not None:
+            return _EXACT + struct.pack(f"<{len(self._exact)}q", *sorted(self._exact))
+        return _HLL + bytes(self._registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DistinctCounter":
+        counter = cls()
+        kind, payload = data[:1], data[1:]
+        if kind == _HLL and len(payload) == HLL_REGISTERS:
+            counter._exact = None
+            counter._registers = bytearray(payload)
+        elif kind == _EXACT:
+            counter._exact = set(struct.unpack(f"<{len(payload) // 8}q", payload))
+        else:
+            raise ValueError("Неизвестный формат счётчика уникальных значений")
+        return counter
@@ -0,0 +1,105 @@
+import datetime
+import re
+from functools import lru_cache
+
+# Единицы срока: суффикс -> (секунд, формы для 1 / 2–4 / 5+)
+UNITS = {
+    "r": (365 * 86400, ("год", "года", "лет")),
+    "mo": (32 * 86400, ("месяц", "месяца", "месяцев")),
+    "d": (86400, ("день", "дня", "дней")),
+    "h": (3600, ("час", "часа", "часов")),
+    "m": (60, ("минута", "минуты", "минут")),
+    "s": (1, ("секунда", "секунды", "секунд")),
+}
+
+# 'mo' раньше 'm', иначе «2mo» разберётся как 2 минуты и мусор «o»
+_UNIT = r"(mo|r|d|h|m|s)"
+
+# Строгий разбор всей строки за один проход: пробелы + токен или недопустимый символ
+_SCANNER = re.compile(r"\s*(?:(\d+)" + _UNIT + r"?|(\S))", re.IGNORECASE)
+# Срок внутри произвольного текста: слово из токенов («7d», «1r2mo», «3h30m,»).
+# Начинается с цифры, чтобы поиск не проверял каждую позицию; границу слова слева проверяет find_duration
+_DURATION_WORD = re.compile(r"(?:\d+" + _UNIT + r")+(?=[\s.,;:!?]|$)", re.IGNORECASE)
+_TOKEN = re.compile(r"(\d+)" + _UNIT, re.IGNORECASE)
+
+
+def plural(n: int, forms: tuple) -> str:
+    """Форма слова для числа: plural(21, ('день', 'дня', 'дней')) -> 'день'."""
+    n = abs(n)
+    if n % 10 == 1 and n % 100 != 11:
+        return forms[0]
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return forms[1]
+    return forms[2]
+
+
+def tokenize(text: str, bare_unit: str = None) -> list[tuple]:
+    """
+    '1r 2mo 3h30m' -> [(1, 'r'), (2, 'mo'), (3, 'h'), (30, 'm')].
+    Число без единицы допускается только с bare_unit. ValueError — строка не срок.
+    """
+    tokens = []
+    for amount, unit, junk in _SCANNER.findall(text):
+        if junk:
+            raise ValueError(f"Неверная единица времени: {junk!r}")
+        if not unit:
+            if bare_unit is None:
+                raise ValueError(f"Не указана единица времени у числа {amount}")
+            unit = bare_unit
+        tokens.append((int(amount), unit.lower()))
+    if not tokens:
+        raise ValueError("Не указан срок")
+    return tokens
+
+
+def to_seconds(tokens: list[tuple]) -> int:
+    return sum(amount * UNITS[unit][0] for amount, unit in tokens)
+
+
+@lru_cache(maxsize=256)
+def parse_duration(text: str, bare_unit: str = None) -> datetime.timedelta:
+    """'10h 45m' -> timedelta. Одинаковые строки (настройки групп) разбираются один раз."""
+    return datetime.timedelta(seconds=to_seconds(tokenize(text, bare_unit)))
+
+
+def find_duration(text: str):
+    """
+    Выделяет срок из свободного текста: 'Оскорбления 7d' -> ('Оскорбления', [(7, 'd')]).
+    Срок — отдельные слова из токенов, числа внутри других слов не трогаются.
+    Возвращает (текст без срока, токены); токенов нет — пустой список.
+    """
+    tokens = []
+    rest = []
+    pos = 0
+    for word in _DURATION_WORD.finditer(text):
+        start = word.start()
+        if start and not text[start - 1].isspace():
+            continue
+        tokens.extend((int(amount), unit.lower()) for amount, unit in _TOKEN.findall(word.group()))
+        rest.append(text[pos:start])
+        pos = word.end()
+    if not tokens:
+        return text.strip(), tokens
+    rest.append(text[pos:])
+    return " ".join("".join(rest).split()), tokens
+
+
+def format_tokens(tokens: list[tuple]) -> str:
+    """[(1, 'd'), (2, 'h')] -> '1 день 2 часа'."""
+    return " ".join(f"{amount} {plural(amount, UNITS[unit][1])}" for amount, unit in tokens)
+
+
+def compact_tokens(tokens: list[tuple]) -> str:
+    """[(1, 'd'), (2, 'h')] -> '1d 2h' — каноническая запись для хранения."""
+    return " ".join(f"{amount}{unit}" for amount, unit in tokens)
+
+
+def format_seconds(seconds: float) -> str:
+    """Длительность по дням/часам/минутам/секундам: 90061 -> '1 день 1 час 1 минута 1 секунда'."""
+    rest = int(seconds)
+    tokens = []
+    for unit in ("d", "h", "m", "s"):
+        amount, rest = divmod(rest, UNITS[unit][0])
+        if amount:
+            tokens.append((amount, unit))
+    return format_tokens(tokens or [(0, "s")])
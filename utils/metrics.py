@@ -0,0 +1,212 @@
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ConversationHandler
+
+# Сколько последних вызовов каждого хэндлера учитывается в перцентилях
+WINDOW = 1000
+
+# Сколько чатов помнить (давно не писавшие вытесняются)
+MAX_TRACKED_CHATS = 5000
+
+# Как часто (в секундах) метрики сохраняются в файл
+METRICS_DUMP_INTERVAL = 60
+# Рядом с базами (utils/db.py импортирует этот модуль, поэтому путь собирается здесь, как DB_DIR)
+METRICS_FILE = os.path.join(
+    os.getenv("BOT_DB_DIR") or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database"),
+    "metrics.json"
+)
+
+
+class _Sample:
+    """Время текущего вызова хэндлера, потраченное на SQLite и Telegram API."""
+
+    __slots__ = ("db", "api")
+
+    def __init__(self):
+        self.db = 0.0
+        self.api = 0.0
+
+
+class HandlerStats:
+    """
+    Скользящее окно последних WINDOW вызовов хэндлера: (всего, SQLite, API) в секундах.
+    """
+
+    __slots__ = ("name", "calls", "errors", "samples")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.errors = 0
+        self.samples = deque(maxlen=WINDOW)
+
+    def summary(self) -> dict:
+        walls = sorted(s[0] for s in self.samples)
+        total = sum(walls) or 1e-9
+        return {
+            "name": self.name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "p50_ms": _percentile(walls, 0.50) * 1000,
+            "p95_ms": _percentile(walls, 0.95) * 1000,
+            "p99_ms": _percentile(walls, 0.99) * 1000,
+            "db_share": sum(s[1] for s in self.samples) / total,
+            "api_share": sum(s[2] for s in self.samples) / total,
+        }
+
+
+class ChatStats:
+    """Суммарное время хэндлеров в чате и самый медленный вызов."""
+
+    __slots__ = ("calls", "total", "slowest", "slowest_handler")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_handler = None
+
+
+# Имя хэндлера -> HandlerStats
+_handlers: dict[str, HandlerStats] = {}
+# chat_id -> ChatStats (порядок — давность последнего вызова)
+_chats: OrderedDict[int, ChatStats] = OrderedDict()
+# Замер вызова, в котором выполняется текущий код (наследуется задачами, созданными из хэндлера)
+_current: ContextVar = ContextVar("handler_sample", default=None)
+
+
+def _percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+@contextmanager
+def _measure(field: str):
+    sample = _current.get()
+    if sample is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(sample, field, getattr(sample, field) + time.perf_counter() - started)
+
+
+def db_timer():
+    """Время внутри блока засчитывается текущему хэндлеру как работа с SQLite (см. run_db)."""
+    return _measure("db")
+
+
+def api_timer():
+    """Время внутри блока засчитывается текущему хэндлеру как запрос к Telegram API."""
+    return _measure("api")
+
+
+def _record(name: str, chat_id, wall: float, sample: _Sample, failed: bool):
+    stats = _handlers.get(name)
+    if stats is None:
+        stats = _handlers[name] = HandlerStats(name)
+    stats.calls += 1
+    stats.errors += failed
+    stats.samples.append((wall, sample.db, sample.api))
+
+    if chat_id is None:
+        return
+    chat = _chats.pop(chat_id, None) or ChatStats()
+    _chats[chat_id] = chat
+    chat.calls += 1
+    chat.total += wall
+    if wall > chat.slowest:
+        chat.slowest, chat.slowest_handler = wall, name
+    if len(_chats) > MAX_TRACKED_CHATS:
+        _chats.popitem(last=False)
+
+
+def timed(name: str, callback):
+    """Обёртка колбэка хэндлера: замеряет общее время вызова и его части в SQLite и API."""
+    @wraps(callback)
+    async def wrapper(update, context, *args, **kwargs):
+        sample = _Sample()
+        token = _current.set(sample)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return await callback(update, context, *args, **kwargs)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            failed = True
+            raise
+        finally:
+            _current.reset(token)
+            chat = update.effective_chat if isinstance(update, Update) else None
+            _record(name, chat.id if chat else None, time.perf_counter() - started, sample, failed)
+    return wrapper
+
+
+def _instrument(handler):
+    if isinstance(handler, ConversationHandler):
+        inner = [*handler.entry_points, *handler.fallbacks]
+        for state_handlers in handler.states.values():
+            inner.extend(state_handlers)
+        for h in inner:
+            _instrument(h)
+    elif hasattr(handler, "wrap_callbacks"):
+        # CommandRouter: у каждой команды свой колбэк
+        handler.wrap_callbacks(timed)
+    elif handler.callback is not None:
+        handler.callback = timed(handler.callback.__name__, handler.callback)
+
+
+def instrument_handlers(app):
+    """Оборачивает колбэки всех зарегистрированных хэндлеров замером времени."""
+    for handlers in app.handlers.values():
+        for handler in handlers:
+            _instrument(handler)
+
+
+def slowest_handlers(limit: int = 10) -> list[dict]:
+    """Хэндлеры по убыванию p95."""
+    summaries = [stats.summary() for stats in list(_handlers.values())]
+    return sorted(summaries, key=lambda s: s["p95_ms"], reverse=True)[:limit]
+
+
+def slowest_chats(limit: int = 5) -> list[tuple]:
+    """(chat_id, ChatStats) по убыванию среднего времени вызова."""
+    chats = list(_chats.items())
+    return sorted(chats, key=lambda item: item[1].total / item[1].calls, reverse=True)[:limit]
+
+
+def snapshot() -> dict:
+    return {
+        "time": time.time(),
+        "handlers": slowest_handlers(limit=len(_handlers)),
+        "chats": [
+            {
+                "chat_id": chat_id,
+                "calls": chat.calls,
+                "avg_ms": chat.total / chat.calls * 1000,
+                "slowest_ms": chat.slowest * 1000,
+                "slowest_handler": chat.slowest_handler,
+            }
+            for chat_id, chat in slowest_chats(limit=50)
+        ],
+    }
+
+
+def dump_metrics(data: dict, path: str = METRICS_FILE):
+    """Атомарная запись метрик: читатель файла не увидит его наполовину записанным."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
@@ -0,0 +1,126 @@
+import inspect
+from collections import OrderedDict
+from functools import wraps
+
+from telegram.error import BadRequest
+
+# Панели с inline-кнопками
+PANEL_GROUP = "group"
+PANEL_HELP = "help"
+PANEL_RULES = "rules"
+PANEL_VIEW_ADMINS = "view_admins"
+PANEL_EDIT_ADMIN = "edit_admin"
+
+# Панели, которые показывают роли и права (сбрасываются при любых изменениях ролей)
+ROLE_PANELS = (PANEL_GROUP, PANEL_VIEW_ADMINS, PANEL_EDIT_ADMIN)
+
+# Сколько отрисовок и показанных сообщений держать в памяти
+MAX_RENDERS = 2000
+MAX_SHOWN = 2000
+
+# (panel, chat_id) -> версия данных панели
+_versions: dict[tuple, int] = {}
+# (panel, chat_id, page) -> (версия, текст, клавиатура)
+_renders: OrderedDict = OrderedDict()
+# (chat_id, message_id) -> (текст, клавиатура), которые сейчас показаны в сообщении
+_shown: OrderedDict = OrderedDict()
+# (chat_id, message_id, user_id) -> последний отложенный клик (update, context) или None
+_in_flight: dict[tuple, tuple | None] = {}
+
+
+def _put(cache: OrderedDict, key, value, limit: int):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > limit:
+        cache.popitem(last=False)
+
+
+def bump(chat_id, *panels):
+    """
+    Данные панелей группы изменились: следующая отрисовка построит их заново.
+    """
+    for panel in panels:
+        key = (panel, chat_id)
+        _versions[key] = _versions.get(key, 0) + 1
+
+
+async def render_cached(panel: str, chat_id, page, build, stamp=None):
+    """
+    Текст и клавиатура страницы панели из кэша, пока версия данных (и stamp) не изменились.
+    build() — функция (обычная или async), которая строит (text, reply_markup).
+    page должен включать всё, от чего зависит клавиатура (например, id вызвавшего).
+    """
+    key = (panel, chat_id, page)
+    version = (_versions.get((panel, chat_id), 0), stamp)
+    cached = _renders.get(key)
+    if cached and cached[0] == version:
+        _renders.move_to_end(key)
+        return cached[1], cached[2]
+
+    result = build()
+    if inspect.isawaitable(result):
+        result = await result
+    text, markup = result
+    _put(_renders, key, (version, text, markup), MAX_RENDERS)
+    return text, markup
+
+
+def remember_shown(message, text, reply_markup):
+    """
+    Запоминает содержимое только что отправленной панели, чтобы первое «Обновить» не редактировало её зря.
+    """
+    if message is not None:
+        _put(_shown, (message.chat.id, message.message_id), (text, reply_markup), MAX_SHOWN)
+
+
+async def edit_panel(query, text, reply_markup=None, parse_mode="HTML", suffix="") -> bool:
+    """
+    Редактирует сообщение панели, только если содержимое отличается от показанного.
+    suffix (например, «🔄 Обновлено: …») добавляется к тексту и участвует в сравнении:
+    «Обновить» без новых данных всё равно обновляет время, иначе кажется, что кнопка не сработала.
+    Возвращает True, если запрос на редактирование был отправлен.
+    """
+    key = (query.message.chat.id, query.message.message_id)
+    text = text + suffix
+    if _shown.get(key) == (text, reply_markup):
+        return False
+
+    try:
+        await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+    _put(_shown, key, (text, reply_markup), MAX_SHOWN)
+    return True
+
+
+def coalesce_clicks(handler):
+    """
+    Декоратор callback-хэндлера панели: пока клик по сообщению обрабатывается,
+    следующие клики того же пользователя по нему не запускают отрисовку, а копятся —
+    после завершения выполняется только последний из них (итоговая запрошенная страница).
+    Хэндлер нужно регистрировать с block=False, иначе клики и так идут строго по одному.
+    """
+    @wraps(handler)
+    async def wrapper(update, context):
+        query = update.callback_query
+        key = (query.message.chat.id, query.message.message_id, query.from_user.id)
+        if key in _in_flight:
+            superseded = _in_flight[key]
+            _in_flight[key] = (update, context)
+            # Вытесненный клик уже не будет обработан — просто гасим «часики» на кнопке
+            if superseded is not None:
+                await superseded[0].callback_query.answer()
+            return
+
+        _in_flight[key] = None
+        try:
+            await handler(update, context)
+            while (pending := _in_flight[key]) is not None:
+                _in_flight[key] = None
+                await handler(*pending)
+        finally:
+            pending = _in_flight.pop(key)
+            if pending is not None:
+                await pending[0].callback_query.answer()
+    return wrapper
@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+from functools import wraps
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from utils.metrics import api_timer
+
+# Приоритеты исходящих сообщений: меньше — важнее
+PRIORITY_MODERATION = 0
+PRIORITY_NORMAL = 1
+PRIORITY_GAME = 2
+
+# Лимиты Telegram (https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this)
+GLOBAL_RATE = 30            # сообщений в секунду на весь бот
+PRIVATE_CHAT_RATE = 1       # сообщение в секунду в личке
+GROUP_CHAT_RATE = 20 / 60   # 20 сообщений в минуту в группе
+GROUP_CHAT_BURST = 3        # столько сообщений в группу можно отправить подряд без ожидания
+
+# Сколько раз повторять запрос после ответа 429 (RetryAfter)
+MAX_RETRIES = 3
+
+# Методы API, на которые распространяются лимиты отправки
+LIMITED_ENDPOINTS = ("send", "edit", "forward", "copy")
+# Правки уже отправленных сообщений (панели с кнопками) не тратят токены чата: лимит 20 в минуту
+# относится к новым сообщениям в группе. Общий лимит бота и пауза чата после 429 на них действуют
+CHAT_EXEMPT_ENDPOINTS = ("edit",)
+
+# Приоритет текущего хэндлера (наследуется задачами, созданными из него)
+_current_priority: ContextVar[int] = ContextVar("outbound_priority", default=PRIORITY_NORMAL)
+
+
+def send_priority(priority: int):
+    """
+    Декоратор хэндлера: все сообщения, отправленные внутри него, получают указанный приоритет.
+
+        @send_priority(PRIORITY_MODERATION)
+        async def ban_handler(update, context): ...
+    """
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = _current_priority.set(priority)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _current_priority.reset(token)
+        return wrapper
+    return decorator
+
+
+class _TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "paused_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready(self, now: float) -> bool:
+        return now >= self.paused_until and self.tokens >= 1
+
+    def wait_time(self, now: float) -> float:
+        return max(self.paused_until - now, (1 - self.tokens) / self.rate, 0.0)
+
+    def pause(self, now: float, seconds: float):
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """
+    Очередь исходящих запросов: общий token bucket на весь бот и отдельный на каждый чат.
+    Ожидающие запросы обслуживаются по приоритету (модерация раньше игр),
+    а внутри приоритета — по порядку поступления. Ответ 429 ставит на паузу
+    только свой чат (или весь бот, если чата у запроса нет), и запрос повторяется сам.
+
+    Приоритет берётся из rate_limit_args (int), иначе из декоратора send_priority.
+
+    Ожидание в очереди происходит внутри хэндлера, а хэндлер держит очередь своего чата
+    (core/update_processor.py): пока ответ ждёт токен чата, следующие апдейты этого чата
+    не обрабатываются. Поэтому правки панелей (CHAT_EXEMPT_ENDPOINTS) токены чата не тратят —
+    серия кликов по кнопкам не задерживает команды чата на десятки секунд. Новые сообщения
+    в группу сверх GROUP_CHAT_BURST по-прежнему ждут, и вместе с ними ждёт весь чат.
+    """
+
+    def __init__(self, max_retries: int = MAX_RETRIES):
+        self.max_retries = max_retries
+        self._global = _TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self._chats: dict = {}
+        self._waiting: list = []
+        self._sequence = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for *_, future in self._waiting:
+            if not future.done():
+                future.cancel()
+        self._waiting.clear()
+
+    def _chat_bucket(self, chat_id) -> _TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = _TokenBucket(PRIVATE_CHAT_RATE, 1)
+            else:
+                bucket = _TokenBucket(GROUP_CHAT_RATE, GROUP_CHAT_BURST)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _dispatch(self):
+        """
+        Выдаёт разрешения ожидающим запросам, пока есть токены, и планирует следующий проход.
+        """
+        self._timer = None
+        now = time.monotonic()
+        self._global.refill(now)
+
+        remaining = []
+        next_wake = None
+        for entry in sorted(self._waiting):
+            _, _, chat_id, charge_chat, future = entry
+            if future.done():
+                continue
+            bucket = self._chat_bucket(chat_id) if chat_id is not None else None
+            if bucket is not None:
+                bucket.refill(now)
+            if bucket is None:
+                chat_ready, chat_wait = True, 0.0
+            elif charge_chat:
+                chat_ready, chat_wait = bucket.ready(now), bucket.wait_time(now)
+            else:
+                # Без токена чата, но с учётом паузы после 429
+                chat_ready, chat_wait = now >= bucket.paused_until, max(bucket.paused_until - now, 0.0)
+
+            if self._global.ready(now) and chat_ready:
+                self._global.tokens -= 1
+                if bucket is not None and charge_chat:
+                    bucket.tokens -= 1
+                future.set_result(None)
+                continue
+
+            remaining.append(entry)
+            wait = max(self._global.wait_time(now), chat_wait)
+            next_wake = wait if next_wake is None else min(next_wake, wait)
+
+        self._waiting = remaining
+        heapq.heapify(self._waiting)
+        if next_wake is not None:
+            self._timer = asyncio.get_running_loop().call_later(next_wake, self._dispatch)
+
+        # Полные бакеты простаивающих чатов ничего не ограничивают — не держим их в памяти
+        if len(self._chats) > 1000:
+            busy = {entry[2] for entry in self._waiting}
+            for chat_id in [c for c, b in self._chats.items() if c not in busy and b.tokens >= b.capacity]:
+                del self._chats[chat_id]
+
+    async def _acquire(self, chat_id, priority: int, charge_chat: bool = True):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (priority, next(self._sequence), chat_id, charge_chat, future))
+        if self._timer is not None:
+            self._timer.cancel()
+        self._dispatch()
+        await future
+
+    def _pause(self, chat_id, seconds: float):
+        now = time.monotonic()
+        if chat_id is None:
+            self._global.pause(now, seconds)
+        else:
+            self._chat_bucket(chat_id).pause(now, seconds)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        # Все запросы к API проходят здесь — время (с ожиданием в очереди) засчитывается хэндлеру (!perf)
+        with api_timer():
+            return await self._process_request(callback, args, kwargs, endpoint, data, rate_limit_args)
+
+    async def _process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if not endpoint.startswith(LIMITED_ENDPOINTS):
+            return await callback(*args, **kwargs)
+
+        priority = rate_limit_args if isinstance(rate_limit_args, int) else _current_priority.get()
+        chat_id = data.get("chat_id")
+        charge_chat = not endpoint.startswith(CHAT_EXEMPT_ENDPOINTS)
+
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(chat_id, priority, charge_chat)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                if attempt == self.max_retries:
+                    raise
+                retry_after = e.retry_after
+                seconds = retry_after.total_seconds() if isinstance(retry_after, timedelta) else float(retry_after)
+                logging.warning(f"Flood control в чате {chat_id}: пауза {seconds} с, повтор {endpoint}")
+                self._pause(chat_id, seconds)
+        return None
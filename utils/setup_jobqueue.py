@@ -1,3 +1,161 @@
-# Пока заглушка — для совместимости с post_init
+import inspect
+import logging
+import time
+
+from telegram.ext import ContextTypes
+
+from utils.users import flush_pending_users, USER_FLUSH_INTERVAL
+from utils.db import run_db, checkpoint_all, WAL_CHECKPOINT_INTERVAL
+from utils.chat_members import expire_cache, CACHE_EXPIRY_INTERVAL
+from utils.metrics import snapshot, dump_metrics, METRICS_DUMP_INTERVAL
+from handlers.group_stats_updater import flush_stats, STATS_FLUSH_INTERVAL
+from handlers.funny.mute_random import get_pending_unmutes, schedule_unmute
+from handlers.funny.russian_roulette import cleanup_stale_lobbies, LOBBY_CLEANUP_INTERVAL
+from handlers.admin.ban_scheduler import start_ban_scheduler
+
+# Случайный сдвиг каждого запуска (доля интервала), чтобы задачи не срабатывали одновременно
+JOB_JITTER = 0.1
+
+
+class JobStats:
+    """
+    Статистика периодической задачи (показывается в !debug-all).
+    """
+
+    __slots__ = ("name", "interval", "runs", "failures", "last_run", "last_duration", "last_error")
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self.runs = 0
+        self.failures = 0
+        self.last_run = None          # unix-время последнего запуска
+        self.last_duration = None     # секунды
+        self.last_error = None
+
+
+# Статистика всех периодических задач: имя -> JobStats
+_stats: dict[str, JobStats] = {}
+# Задачи, которые выполняются ещё раз при остановке бота (в порядке регистрации): имя -> обёртка
+_shutdown_jobs: dict = {}
+
+
+# 💾 Периодический сброс буфера регистраций пользователей в users.db
+async def flush_users_job(context: ContextTypes.DEFAULT_TYPE):
+    await run_db(flush_pending_users)
+
+
+# 📈 Периодический сброс статистики групп в group_stats.db
+async def flush_stats_job(context: ContextTypes.DEFAULT_TYPE):
+    await run_db(flush_stats)
+
+
+# 🧹 Удаление истёкших записей кэша участников чатов
+async def expire_caches_job(context: ContextTypes.DEFAULT_TYPE):
+    expire_cache()
+
+
+# 🗄 Перенос WAL-журналов в основные файлы баз
+async def wal_checkpoint_job(context: ContextTypes.DEFAULT_TYPE):
+    await run_db(checkpoint_all)
+
+
+# 🐢 Сохранение метрик хэндлеров в database/metrics.json
+async def dump_metrics_job(context: ContextTypes.DEFAULT_TYPE):
+    await run_db(dump_metrics, snapshot())
+
+
+# 🎲 Удаление брошенных лобби русской рулетки
+async def cleanup_lobbies_job(context: ContextTypes.DEFAULT_TYPE):
+    removed = cleanup_stale_lobbies(context.application.chat_data)
+    if removed:
+        logging.info(f"Удалено брошенных лобби рулетки: {removed}")
+
+
+def _tracked(name: str, func):
+    """
+    Обёртка задачи: замеряет время, считает запуски и ошибки. Ошибка задачи
+    логируется и не мешает следующим запускам.
+    """
+    async def callback(context):
+        stats = _stats[name]
+        started = time.monotonic()
+        try:
+            result = func(context)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            stats.failures += 1
+            stats.last_error = f"{type(e).__name__}: {e}"
+            logging.exception(f"Фоновая задача {name} завершилась с ошибкой")
+        finally:
+            stats.runs += 1
+            stats.last_run = time.time()
+            stats.last_duration = time.monotonic() - started
+    return callback
+
+
+def add_periodic_job(job_queue, name: str, func, interval: float, run_on_shutdown: bool = False, jitter: float = JOB_JITTER):
+    """
+    Регистрирует именованную периодическую задачу. Первый запуск — через interval,
+    дальше каждые interval ± jitter * interval секунд. Пропущенные запуски не копятся.
+    run_on_shutdown — выполнить задачу ещё раз при остановке бота (сброс буферов).
+    Без JobQueue задача только регистрируется для запуска при остановке.
+    """
+    _stats[name] = JobStats(name, interval)
+    callback = _tracked(name, func)
+    if run_on_shutdown:
+        _shutdown_jobs[name] = callback
+    if job_queue is None:
+        return
+    job_queue.run_repeating(
+        callback,
+        interval=interval,
+        first=interval,
+        name=name,
+        job_kwargs={"jitter": interval * jitter, "coalesce": True, "max_instances": 1}
+    )
+
+
+def get_job_stats() -> list[JobStats]:
+    return list(_stats.values())
+
+
+async def shutdown_jobs(app):
+    """
+    Вызывается из post_shutdown, когда JobQueue уже остановлена (текущие запуски дождались):
+    последний раз сбрасывает буферы в базы.
+    """
+    for callback in _shutdown_jobs.values():
+        await callback(None)
+
+
 async def setup_jobqueue(app):
-    pass
+    job_queue = app.job_queue
+    if job_queue is None:
+        logging.warning("JobQueue недоступна (нужен python-telegram-bot[job-queue]) — фоновые задачи не запущены")
+        # Сроки банов и мутов по-прежнему сохраняются в базах, но сами по себе не снимаются
+        logging.error(
+            "Автоматические разбаны и размуты ОТКЛЮЧЕНЫ: без JobQueue сроки !ban и мутов не истекают. "
+            "Установите python-telegram-bot[job-queue] — сохранённые сроки выполнятся при следующем запуске"
+        )
+
+    add_periodic_job(job_queue, "flush_users", flush_users_job, USER_FLUSH_INTERVAL, run_on_shutdown=True)
+    add_periodic_job(job_queue, "flush_stats", flush_stats_job, STATS_FLUSH_INTERVAL, run_on_shutdown=True)
+    add_periodic_job(job_queue, "expire_caches", expire_caches_job, CACHE_EXPIRY_INTERVAL)
+    add_periodic_job(job_queue, "cleanup_lobbies", cleanup_lobbies_job, LOBBY_CLEANUP_INTERVAL)
+    add_periodic_job(job_queue, "dump_metrics", dump_metrics_job, METRICS_DUMP_INTERVAL, run_on_shutdown=True)
+    # Чекпоинт последним — после финального сброса буферов при остановке
+    add_periodic_job(job_queue, "wal_checkpoint", wal_checkpoint_job, WAL_CHECKPOINT_INTERVAL, run_on_shutdown=True)
+    if job_queue is None:
+        return
+
+    # 🔇 Размуты, запланированные до перезапуска (просроченные выполнятся сразу)
+    pending = await run_db(get_pending_unmutes)
+    for chat_id, user_id, until in pending:
+        schedule_unmute(job_queue, chat_id, user_id, until)
+    if pending:
+        logging.info(f"Восстановлено запланированных размутов: {len(pending)}")
+
+    # ⛔ Автоматические разбаны: один таймер на все сроки, пропущенные за время простоя выполнятся сразу
+    await start_ban_scheduler(job_queue)
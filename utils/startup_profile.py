@@ -0,0 +1,41 @@
+import logging
+import time
+
+# Момент запуска процесса: main.py импортирует этот модуль первым (аптайм в !status считается отсюда)
+STARTED_AT = time.time()
+_started = time.perf_counter()
+
+# Этапы запуска: (название, секунд от запуска процесса до конца этапа)
+_steps: list[tuple] = []
+# Секунд от запуска процесса до конца обработки первого апдейта (None — апдейтов ещё не было)
+_first_update = None
+
+
+def step(name: str):
+    """Отмечает конец этапа запуска (импорты, хэндлеры, схема баз, ...)."""
+    _steps.append((name, time.perf_counter() - _started))
+
+
+def first_update_done():
+    """Вызывается после каждого апдейта (core/update_processor.py); срабатывает только на первом."""
+    global _first_update
+    if _first_update is not None:
+        return
+    _first_update = time.perf_counter() - _started
+    logging.info(f"[startup] Первый апдейт обработан через {_first_update:.2f} с после запуска")
+
+
+def report() -> str:
+    """'импорты 0.31 с · хэндлеры 0.01 с · ... · первый апдейт 1.20 с' — длительность каждого этапа."""
+    parts = []
+    previous = 0.0
+    for name, at in _steps:
+        parts.append(f"{name} {at - previous:.2f} с")
+        previous = at
+    if _first_update is not None:
+        parts.append(f"первый апдейт {_first_update:.2f} с")
+    return " · ".join(parts)
+
+
+def log_report():
+    logging.info(f"[startup] {report()}")
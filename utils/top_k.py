@@ -0,0 +1,50 @@
+class TopK:
+    """
+    Лидерборд из K элементов, поддерживаемый на лету.
+    Рассчитан на счётчики, которые только растут: элемент вне топа может попасть
+    в него, лишь обогнав последнего, поэтому топ всегда точный, а обновление и
+    чтение стоят O(K) вместо сортировки всех участников.
+
+        top = TopK(10)
+        top.offer(user_id, new_count)
+        top.items()  # [(user_id, count), ...] по убыванию
+    """
+
+    __slots__ = ("k", "_ids", "_counts")
+
+    def __init__(self, k: int):
+        self.k = k
+        self._ids: list = []        # id по убыванию счётчика
+        self._counts: dict = {}     # id -> счётчик (только для элементов топа)
+
+    def offer(self, key, count: int):
+        """
+        Сообщает новое значение счётчика элемента.
+        """
+        ids, counts = self._ids, self._counts
+        if key in counts:
+            counts[key] = count
+            i = ids.index(key)
+            # Поднимаем элемент вверх, пока он больше соседа
+            while i > 0 and counts[ids[i - 1]] < count:
+                ids[i] = ids[i - 1]
+                i -= 1
+            ids[i] = key
+            return
+
+        if len(ids) >= self.k and count <= counts[ids[-1]]:
+            return
+
+        i = len(ids)
+        while i > 0 and counts[ids[i - 1]] < count:
+            i -= 1
+        ids.insert(i, key)
+        counts[key] = count
+        if len(ids) > self.k:
+            del counts[ids.pop()]
+
+    def items(self) -> list[tuple]:
+        return [(key, self._counts[key]) for key in self._ids]
+
+    def __len__(self) -> int:
+        return len(self._ids)
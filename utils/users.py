@@ -1,67 +1,164 @@
-import sqlite3
-import os
+import logging
+import threading
 from telegram import User
 
-# Определяем корневой каталог проекта: поднимаемся на один уровень от каталога utils
-PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-DB_DIR = os.path.join(PROJECT_ROOT, "database")
-DB_PATH = os.path.join(DB_DIR, "users.db")
+from utils.db import USERS_DB, get_db_path, transaction, fetchone, fetchall, executemany
+
+DB_PATH = get_db_path(USERS_DB)
+
+# Как часто (в секундах) буфер регистраций сбрасывается в базу
+USER_FLUSH_INTERVAL = 30
+
+# Последние известные данные пользователей: user_id -> (username, first_name, last_name, is_bot)
+_known_users: dict[int, tuple] = {}
+# Изменённые строки, ожидающие записи в базу (дедупликация по user_id)
+_pending_users: dict[int, tuple] = {}
+# Индекс username (нормализованный) -> user_id, обновляется на месте при переименованиях
+_username_index: dict[str, int] = {}
+_pending_lock = threading.Lock()
+
+
+def normalize_username(username: str | None) -> str | None:
+    """
+    Приводит username к виду для поиска: без '@', пробелов и регистра.
+    """
+    if not username:
+        return None
+    return username.strip().lstrip("@").lower() or None
 
 
 def init_db():
     """
     Инициализирует базу данных и создаёт таблицу пользователей, если она не существует.
-    Также включает WAL-режим для улучшения конкурентного доступа.
+    WAL-режим включается при открытии общего соединения (utils/db.py).
+    Колонка username_lc хранит нормализованный username и проиндексирована для поиска.
     """
-    os.makedirs(DB_DIR, exist_ok=True)
-    with sqlite3.connect(DB_PATH) as conn:
-        # Включаем WAL-режим для повышения производительности при многопоточном доступе
-        conn.execute("PRAGMA journal_mode=WAL;")
+    with transaction(USERS_DB) as conn:
         conn.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER PRIMARY KEY,
                 username TEXT,
                 first_name TEXT,
                 last_name TEXT,
-                is_bot BOOLEAN
+                is_bot BOOLEAN,
+                username_lc TEXT
             )
         """)
-        conn.commit()
+
+        # Миграция старых баз: добавляем и заполняем нормализованную колонку
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(users)")}
+        if "username_lc" not in columns:
+            conn.execute("ALTER TABLE users ADD COLUMN username_lc TEXT")
+            conn.execute("UPDATE users SET username_lc = LOWER(username) WHERE username IS NOT NULL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username_lc ON users(username_lc)")
+
+        rows = conn.execute("SELECT user_id, username, first_name, last_name, is_bot FROM users").fetchall()
+
+    # Прогреваем кэш и индекс username, чтобы поиск по @username не ходил в базу,
+    # а после перезапуска не перезаписывались неизменившиеся пользователи
+    with _pending_lock:
+        for user_id, username, first_name, last_name, is_bot in rows:
+            _known_users.setdefault(user_id, (username, first_name, last_name, bool(is_bot)))
+            username_lc = normalize_username(username)
+            if username_lc:
+                _username_index.setdefault(username_lc, user_id)
 
 
 def register_user(user: User):
     """
-    Регистрирует пользователя или обновляет его данные в базе.
+    Регистрирует пользователя или обновляет его данные.
+    Запись откладывается: изменённые строки копятся в буфере и сбрасываются
+    в базу одной транзакцией (flush_pending_users) по таймеру и при остановке.
     """
     if not user:
         return
-    with sqlite3.connect(DB_PATH) as conn:
-        # Приводим username к нижнему регистру для единообразия
-        username = user.username.lower() if user.username else None
-        conn.execute("""
-            INSERT INTO users (user_id, username, first_name, last_name, is_bot)
-            VALUES (?, ?, ?, ?, ?)
+    # Приводим username к нижнему регистру для единообразия
+    username = normalize_username(user.username)
+    row = (username, user.first_name, user.last_name, bool(user.is_bot))
+
+    # Данные не изменились — писать нечего
+    previous = _known_users.get(user.id)
+    if previous == row:
+        return
+
+    with _pending_lock:
+        # Переименование: старый username больше не указывает на этого пользователя
+        old_username = normalize_username(previous[0]) if previous else None
+        if old_username and old_username != username and _username_index.get(old_username) == user.id:
+            del _username_index[old_username]
+        if username:
+            _username_index[username] = user.id
+
+        _known_users[user.id] = row
+        _pending_users[user.id] = row
+
+
+def flush_pending_users() -> int:
+    """
+    Записывает накопленные регистрации в базу одним executemany.
+    Возвращает количество записанных строк.
+    """
+    with _pending_lock:
+        if not _pending_users:
+            return 0
+        batch = dict(_pending_users)
+        _pending_users.clear()
+
+    try:
+        executemany(USERS_DB, """
+            INSERT INTO users (user_id, username, first_name, last_name, is_bot, username_lc)
+            VALUES (?, ?, ?, ?, ?, ?)
             ON CONFLICT(user_id) DO UPDATE SET
                 username=excluded.username,
                 first_name=excluded.first_name,
                 last_name=excluded.last_name,
-                is_bot=excluded.is_bot
-        """, (user.id, username, user.first_name, user.last_name, user.is_bot))
-        conn.commit()
+                is_bot=excluded.is_bot,
+                username_lc=excluded.username_lc
+        """, [(user_id, *row, row[0]) for user_id, row in batch.items()])
+    except Exception:
+        # Возвращаем строки в буфер (если за это время не пришли более свежие данные)
+        with _pending_lock:
+            for user_id, row in batch.items():
+                _pending_users.setdefault(user_id, row)
+        logging.exception("Не удалось сохранить буфер регистраций пользователей")
+        return 0
+    return len(batch)
 
 
 def get_user_id_by_username(username: str):
     """
     Поиск и возврат user_id по username (без '@').
-    Поиск производится без учёта регистра.
+    Поиск производится без учёта регистра: сначала по индексу в памяти,
+    затем по индексированной колонке username_lc.
     Если пользователь не найден, возвращает None.
     """
-    username = username.strip().lower()  # удаляем лишние пробелы и приводим к нижнему регистру
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.execute("SELECT user_id FROM users WHERE LOWER(username) = ?", (username,))
-        row = cur.fetchone()
-    return row["user_id"] if row else None
+    username = normalize_username(username)  # удаляем '@', лишние пробелы и приводим к нижнему регистру
+    if not username:
+        return None
+
+    user_id = _username_index.get(username)
+    if user_id is not None:
+        return user_id
+
+    row = fetchone(USERS_DB, "SELECT user_id FROM users WHERE username_lc = ?", (username,))
+    if not row:
+        return None
+    with _pending_lock:
+        _username_index.setdefault(username, row[0])
+    return row[0]
+
+
+def get_known_names(user_ids) -> dict:
+    """
+    Имена известных боту пользователей без обращения к базе (кэш прогревается из users.db в init_db):
+    {user_id: (username, first_name)}. Неизвестные id в результат не попадают.
+    """
+    names = {}
+    for user_id in user_ids:
+        known = _known_users.get(user_id)
+        if known:
+            names[user_id] = (known[0], known[1])
+    return names
 
 
 def get_user_info_by_id(user_id: int):
@@ -69,17 +166,30 @@ def get_user_info_by_id(user_id: int):
     Возвращает словарь с данными пользователя по его ID.
     Если пользователь не найден, возвращает None.
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        conn.row_factory = sqlite3.Row
-        cur = conn.execute("SELECT user_id, username, first_name, last_name, is_bot FROM users WHERE user_id = ?", (user_id,))
-        row = cur.fetchone()
+    with _pending_lock:
+        pending = _pending_users.get(user_id)
+    if pending:
+        username, first_name, last_name, is_bot = pending
+        return {
+            "user_id": user_id,
+            "username": username,
+            "first_name": first_name,
+            "last_name": last_name,
+            "is_bot": is_bot
+        }
+
+    row = fetchone(
+        USERS_DB,
+        "SELECT user_id, username, first_name, last_name, is_bot FROM users WHERE user_id = ?",
+        (user_id,)
+    )
     if row:
         return {
-            "user_id": row["user_id"],
-            "username": row["username"],
-            "first_name": row["first_name"],
-            "last_name": row["last_name"],
-            "is_bot": bool(row["is_bot"])
+            "user_id": row[0],
+            "username": row[1],
+            "first_name": row[2],
+            "last_name": row[3],
+            "is_bot": bool(row[4])
         }
     return None
 
@@ -88,7 +198,5 @@ def get_all_users():
     """
     Возвращает список всех пользователей из базы данных.
     """
-    with sqlite3.connect(DB_PATH) as conn:
-        cur = conn.execute("SELECT * FROM users")
-        rows = cur.fetchall()
-    return rows
+    flush_pending_users()
+    return fetchall(USERS_DB, "SELECT user_id, username, first_name, last_name, is_bot FROM users")